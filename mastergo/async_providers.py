@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from clients import ARK_BASE_URL, ARK_EXTRA_HEADERS, QIANFAN_CHAT_URL, get_client, registry
+from token_manager import qianfan_token_rejected, qianfan_tokens
+from llm_cache import cached_chat
+from tracing import tracer
+
+
+ARK_MODEL = "ep-20250329165324-l8vxt"
+
+# 异步客户端绑定在后台事件循环上，和同步客户端一样只创建一次
+def _create_qianfan_async():
+    import httpx
+    return httpx.AsyncClient(timeout=60.0)
+
+
+def _create_ark_async(key_env: str):
+    from volcenginesdkarkruntime import AsyncArk
+    return AsyncArk(base_url=ARK_BASE_URL, api_key=os.environ.get(key_env))
+
+
+registry.register('qianfan_async', _create_qianfan_async)
+registry.register('doubao_async', lambda: _create_ark_async("ARK_API_KEY"))
+registry.register('deepseek_async', lambda: _create_ark_async("DS_API_KEY"))
+
+# 星火SDK只提供同步接口，放到线程池中执行
+_spark_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='spark')
+
+
+@cached_chat('qianfan', 'completions_pro', 0.5)
+async def achat_qianfan(content: str, temperature: float = 0.5) -> str:
+    """异步调用百度千帆，单轮对话，不写入对话历史"""
+    loop = asyncio.get_running_loop()
+    payload = json.dumps({
+        "messages": [{"role": "user", "content": content}],
+        "temperature": temperature
+    })
+    for attempt in range(2):
+        token = await loop.run_in_executor(None, tracer.wrap(qianfan_tokens.get_token))
+        response = await get_client('qianfan_async').post(
+            f"{QIANFAN_CHAT_URL}?access_token={token}",
+            headers={'Content-Type': 'application/json'},
+            content=payload
+        )
+        if attempt or not qianfan_token_rejected(response):
+            break
+        # 令牌被服务端拒绝，作废后换新令牌重试一次
+        qianfan_tokens.invalidate(token)
+    return response.json()['result']
+
+
+@cached_chat('spark', 'lite')
+async def achat_spark(content: str) -> str:
+    """异步调用讯飞星火"""
+    def call():
+        from sparkai.core.messages import ChatMessage
+        messages = [ChatMessage(role="user", content=content)]
+        return get_client('spark').generate([messages]).generations[0][0].message.content
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_spark_executor, tracer.wrap(call))
+
+
+async def _achat_ark(client_name: str, content: str) -> str:
+    completion = await get_client(client_name).chat.completions.create(
+        model=ARK_MODEL,
+        messages=[
+            {"role": "system", "content": "你是前端UI生成师."},
+            {"role": "user", "content": f"{content}"},
+        ],
+        extra_headers=ARK_EXTRA_HEADERS,
+    )
+    return completion.choices[0].message.content
+
+
+@cached_chat('doubao', ARK_MODEL)
+async def achat_doubao(content: str) -> str:
+    """异步调用豆包"""
+    return await _achat_ark('doubao_async', content)
+
+
+@cached_chat('deepseek', ARK_MODEL)
+async def achat_deepseek(content: str) -> str:
+    """异步调用DeepSeek"""
+    return await _achat_ark('deepseek_async', content)
+
+
+ASYNC_BACKENDS: Dict[str, Callable[[str], Awaitable[str]]] = {
+    'qianfan': achat_qianfan,
+    'spark': achat_spark,
+    'doubao': achat_doubao,
+    'deepseek': achat_deepseek,
+}
+
+
+async def fan_out(prompts: Sequence[str], provider: str = 'spark',
+                  limit: int = 4) -> List[Union[str, Exception]]:
+    """并发发送多个相互独立的请求，同时进行的请求数不超过limit
+
+    Returns:
+        与prompts顺序一致的结果列表，失败的请求对应位置为异常对象
+    """
+    chat = ASYNC_BACKENDS[provider]
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def one(prompt: str) -> str:
+        async with semaphore:
+            return await chat(prompt)
+
+    return await asyncio.gather(*(one(p) for p in prompts), return_exceptions=True)
+
+
+async def race(prompt: str, providers: Sequence[str],
+               validate: Optional[Callable[[str], bool]] = None,
+               timeout: Optional[float] = None) -> Tuple[str, str]:
+    """将同一请求同时发给多个后端，返回第一个通过验证的结果
+
+    Returns:
+        (后端名称, 响应文本)
+    """
+    tasks = {asyncio.ensure_future(ASYNC_BACKENDS[name](prompt)): name for name in providers}
+    errors = []
+    try:
+        pending = set(tasks)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+        while pending:
+            remaining = deadline - loop.time() if deadline else None
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = tasks[task]
+                if task.exception() is not None:
+                    errors.append(f"{name}: {task.exception()}")
+                    continue
+                result = task.result()
+                if validate is None or validate(result):
+                    return name, result
+                errors.append(f"{name}: 响应未通过验证")
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    raise TimeoutError(f"没有后端返回有效结果: {'; '.join(errors) or '请求超时'}")
+
+
+class _LoopRunner:
+    """在后台线程中运行常驻事件循环，供同步代码提交协程"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True,
+                                 name='async-providers').start()
+            return self._loop
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        # 协程在事件循环线程中执行，显式带上调用方的span
+        future = asyncio.run_coroutine_threadsafe(tracer.bind(coro), self._ensure_loop())
+        return future.result(timeout)
+
+
+_runner = _LoopRunner()
+
+
+def run(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """在共享事件循环上执行协程并阻塞等待结果，异步客户端因此可以跨调用复用"""
+    return _runner.run(coro, timeout)
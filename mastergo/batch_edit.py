@@ -0,0 +1,82 @@
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+
+BATCH_EDIT_PROMPT = """根据指令'{request}'分别修改下面的{count}个HTML片段。
+每个片段以<<<FRAGMENT 编号>>>开始、以<<<END 编号>>>结束。
+请按相同格式、相同编号逐个返回修改后的片段，不要遗漏、合并或增加片段，不要输出其他解释。
+
+{fragments}
+"""
+
+SINGLE_EDIT_PROMPT = "根据指令'{request}'修改以下HTML片段:\n{fragment}"
+
+_FRAGMENT_RE = re.compile(r"<<<FRAGMENT\s+(\w+)>>>\s*\n?(.*?)\n?\s*<<<END\s+\1>>>", re.S)
+
+
+def build_batch_prompt(request: str, fragments: Dict[str, str]) -> str:
+    """把多个片段打包进一个提示词，片段编号保持稳定以便解析回复"""
+    body = "\n\n".join(
+        f"<<<FRAGMENT {fid}>>>\n{fragment}\n<<<END {fid}>>>" for fid, fragment in fragments.items()
+    )
+    return BATCH_EDIT_PROMPT.format(request=request, count=len(fragments), fragments=body)
+
+
+def parse_batch_response(response: str, expected_ids: Sequence[str]) -> Optional[Dict[str, str]]:
+    """解析批量修改的回复，缺少任一片段时返回None"""
+    found = {fid: fragment.strip() for fid, fragment in _FRAGMENT_RE.findall(response)}
+    if any(fid not in found or not found[fid] for fid in expected_ids):
+        return None
+    return {fid: found[fid] for fid in expected_ids}
+
+
+class BatchEditor:
+    """将所有待修改片段合并为少量请求，回复格式错误时拆成更小的批次重试"""
+
+    def __init__(self, chat_many: Callable[[List[str]], List[Union[str, Exception]]],
+                 parse_single: Callable[[str], str], max_batch_size: int = 20):
+        """
+        Args:
+            chat_many: 并发发送一组提示词并按顺序返回结果（失败时为异常对象）
+            parse_single: 单片段请求的回复解析函数
+            max_batch_size: 单个请求最多包含的片段数
+        """
+        self.chat_many = chat_many
+        self.parse_single = parse_single
+        self.max_batch_size = max(1, max_batch_size)
+        self.request_count = 0
+
+    def edit(self, request: str, fragments: List[str]) -> List[str]:
+        """返回与fragments顺序一致的修改结果"""
+        ids = [f"f{i}" for i in range(len(fragments))]
+        by_id = dict(zip(ids, fragments))
+        results: Dict[str, str] = {}
+
+        pending = [ids[i:i + self.max_batch_size] for i in range(0, len(ids), self.max_batch_size)]
+        while pending:
+            prompts = []
+            for batch in pending:
+                if len(batch) == 1:
+                    prompts.append(SINGLE_EDIT_PROMPT.format(request=request, fragment=by_id[batch[0]]))
+                else:
+                    prompts.append(build_batch_prompt(request, {fid: by_id[fid] for fid in batch}))
+            responses = self.chat_many(prompts)
+            self.request_count += len(prompts)
+
+            retry = []
+            for batch, response in zip(pending, responses):
+                if len(batch) == 1:
+                    if isinstance(response, Exception):
+                        raise response
+                    results[batch[0]] = self.parse_single(response)
+                    continue
+                parsed = None if isinstance(response, Exception) else parse_batch_response(response, batch)
+                if parsed is None:
+                    # 回复格式错误，对半拆分后重试
+                    middle = len(batch) // 2
+                    retry.extend([batch[:middle], batch[middle:]])
+                else:
+                    results.update(parsed)
+            pending = retry
+
+        return [results[fid] for fid in ids]
@@ -0,0 +1,253 @@
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from prompt import PROMPT
+from device_classifier import DeviceClassifier
+from async_providers import fan_out, run as run_async
+
+
+# 复用单条识别提示词中的设备列表和规则，指令部分换成带编号的多条指令
+# 规则部分用“1. ”编号，指令用“[1]”编号，避免模型把两者混淆
+BATCH_DEVICE_PROMPT = PROMPT.split("用户指令")[0] + """
+以下是{count}条相互独立的用户指令，每条以方括号中的编号开头，请分别识别。
+每条指令输出一行，格式为“[编号] 设备名称”，不要遗漏编号，不要输出其他内容：
+{commands}
+"""
+
+_ANSWER_RE = re.compile(r"^\s*\[(\d+)\]\s*[:：]?\s*(.+?)\s*$", re.M)
+_NORMALIZE_RE = re.compile(r"[\s，。！？、,.!?；;：:\"'“”‘’]")
+
+Record = Tuple[int, Optional[str], str]
+
+
+def normalize_command(text: str) -> str:
+    """去掉空白和标点，相同含义的重复指令只识别一次"""
+    return _NORMALIZE_RE.sub('', text).lower()
+
+
+def read_commands(path: str, field: str = 'text', id_field: str = 'id') -> Iterator[Record]:
+    """逐条读取JSONL或CSV中的指令，返回(序号, ID, 指令)"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for number, row in enumerate(rows):
+            yield number, row.get(id_field), row.get(field) or ''
+
+
+def build_batch_prompt(commands: List[str]) -> str:
+    body = "\n".join(f"[{i + 1}] {command}" for i, command in enumerate(commands))
+    return BATCH_DEVICE_PROMPT.format(count=len(commands), commands=body)
+
+
+def parse_batch_answer(response: str, count: int) -> Dict[int, str]:
+    """解析批量识别的回复，返回{从0开始的序号: 设备}"""
+    answers = {}
+    for number, device in _ANSWER_RE.findall(response):
+        index = int(number) - 1
+        if 0 <= index < count and index not in answers:
+            answers[index] = device.strip('「」"')
+    return answers
+
+
+class BatchIdentifier:
+    """离线批量识别指令中的设备
+
+    先按规范化后的指令去重，再由本地规则识别，剩余指令每batch_size条合并成一个请求，
+    最多concurrency个请求并发。结果按输入顺序逐窗口写出，每个窗口写完后记录断点。
+    去重表只保留最近用到的max_memo条指令，超出后很久没出现的指令再次出现时会重新识别。
+
+    Args:
+        provider: 调用的大模型后端
+        batch_size: 单个请求包含的指令数
+        concurrency: 同时进行的请求数
+        window: 每次读入、处理并写出的记录数
+        max_memo: 去重表最多保留的指令数
+    """
+
+    def __init__(self, provider: str = 'qianfan', batch_size: int = 20, concurrency: int = 4,
+                 window: int = 1000, classifier: Optional[DeviceClassifier] = None,
+                 max_memo: int = 100000):
+        self.provider = provider
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.window = max(1, window)
+        self.classifier = classifier or DeviceClassifier()
+        self.max_memo = max(1, max_memo)
+        # 规范化指令 -> (设备, 来源)，按最近使用排序
+        self.memo: 'OrderedDict[str, Tuple[str, str]]' = OrderedDict()
+        self.stats = {'records': 0, 'unique': 0, 'rule': 0, 'llm': 0, 'llm_requests': 0, 'retried': 0,
+                      'failed': 0}
+
+    def _chat_many(self, prompts: List[str]) -> List[Union[str, Exception]]:
+        self.stats['llm_requests'] += len(prompts)
+        return run_async(fan_out(prompts, provider=self.provider, limit=self.concurrency))
+
+    def _remember(self, key: str, result: Tuple[str, str]):
+        self.memo[key] = result
+        self.memo.move_to_end(key)
+        if len(self.memo) > self.max_memo:
+            self.memo.popitem(last=False)
+
+    def identify_unique(self, commands: Dict[str, str]) -> Dict[str, Tuple[str, str]]:
+        """识别尚未出现过的指令，commands为{规范化指令: 原始指令}
+
+        Returns:
+            {规范化指令: (设备, 来源)}
+        """
+        results = {}
+        pending = []
+        for key, text in commands.items():
+            device = self.classifier.predict(text)
+            if device is not None:
+                results[key] = (device, 'rule')
+                self.stats['rule'] += 1
+            else:
+                pending.append(key)
+
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        responses = self._chat_many([build_batch_prompt([commands[k] for k in batch]) for batch in batches])
+        missing = []
+        for batch, response in zip(batches, responses):
+            # 请求失败的批次和回复中缺失的指令一样逐条重试
+            answers = {} if isinstance(response, Exception) else parse_batch_answer(response, len(batch))
+            for i, key in enumerate(batch):
+                if i in answers:
+                    results[key] = (answers[i], 'llm')
+                    self.stats['llm'] += 1
+                else:
+                    missing.append(key)
+
+        errors = []
+        if missing:
+            # 批量回复中缺失的指令逐条使用原提示词重试
+            self.stats['retried'] += len(missing)
+            prompts = [PROMPT.format(user_input=commands[k], history="") for k in missing]
+            for key, response in zip(missing, self._chat_many(prompts)):
+                if isinstance(response, Exception):
+                    errors.append(response)
+                    continue
+                results[key] = (response.strip() or "未知设备", 'llm')
+                self.stats['llm'] += 1
+
+        # 成功的结果先记下，从断点继续时不必重新调用
+        for key, result in results.items():
+            self._remember(key, result)
+        if errors:
+            # 调用失败不能记为“未知设备”，否则写入结果和断点后续跑也不会再识别
+            self.stats['failed'] += len(errors)
+            raise ConnectionError(f"{len(errors)}条指令调用{self.provider}失败: {errors[0]}，"
+                                  f"本窗口未写入，可稍后从断点继续")
+        return results
+
+    def _process_window(self, records: List[Record], out):
+        # 本窗口用到的结果单独保存，识别新指令时去重表淘汰旧条目也不影响写出
+        resolved: Dict[str, Tuple[str, str]] = {}
+        new = {}
+        for _, _, text in records:
+            key = normalize_command(text)
+            if key in resolved or key in new:
+                continue
+            if key in self.memo:
+                self.memo.move_to_end(key)
+                resolved[key] = self.memo[key]
+            else:
+                new[key] = text
+        self.stats['unique'] += len(new)
+        if new:
+            resolved.update(self.identify_unique(new))
+        for number, record_id, text in records:
+            device, source = resolved[normalize_command(text)]
+            out.write(json.dumps({'line': number, 'id': record_id, 'text': text,
+                                  'device': device, 'source': source}, ensure_ascii=False) + "\n")
+        self.stats['records'] += len(records)
+
+    def run(self, input_path: str, output_path: str, checkpoint_path: Optional[str] = None,
+            field: str = 'text', id_field: str = 'id', overwrite: bool = False) -> dict:
+        """处理整个文件，存在断点时从断点继续
+
+        大模型调用失败时抛出ConnectionError，失败所在的窗口不写入也不记录断点。
+
+        Args:
+            overwrite: 输出文件已存在但没有断点时是否覆盖，为False时拒绝运行
+        """
+        checkpoint_path = checkpoint_path or output_path + '.checkpoint'
+        done, offset = self._load_checkpoint(checkpoint_path, output_path, overwrite)
+        started = time.perf_counter()
+
+        with open(output_path, 'a+', encoding='utf-8') as out:
+            # 丢弃断点之后写了一半的内容
+            out.truncate(offset)
+            records: List[Record] = []
+            for record in read_commands(input_path, field, id_field):
+                if record[0] < done:
+                    continue
+                records.append(record)
+                if len(records) >= self.window:
+                    self._flush(records, out, checkpoint_path)
+                    records = []
+            if records:
+                self._flush(records, out, checkpoint_path)
+
+        elapsed = time.perf_counter() - started
+        return dict(self.stats, seconds=elapsed,
+                    records_per_second=self.stats['records'] / elapsed if elapsed else 0.0)
+
+    def _flush(self, records: List[Record], out, checkpoint_path: str):
+        self._process_window(records, out)
+        out.flush()
+        os.fsync(out.fileno())
+        state = {'records_done': records[-1][0] + 1, 'output_bytes': os.fstat(out.fileno()).st_size}
+        tmp = checkpoint_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, checkpoint_path)
+        print(f"已处理{state['records_done']}条")
+
+    def _load_checkpoint(self, checkpoint_path: str, output_path: str,
+                         overwrite: bool = False) -> Tuple[int, int]:
+        """读取断点，并用已写出的结果预热去重表（逐行读取，不把整个输出文件读入内存）"""
+        if not os.path.exists(checkpoint_path):
+            # 空文件可能是第一个窗口就失败时留下的，可以直接覆盖
+            if os.path.exists(output_path) and os.path.getsize(output_path) and not overwrite:
+                raise FileExistsError(f"输出文件已存在且没有断点: {output_path}，确认覆盖请使用--overwrite")
+            return 0, 0
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        position = 0
+        with open(output_path, 'rb') as f:
+            for line in f:
+                position += len(line)
+                # 断点之后是写了一半的内容
+                if position > state['output_bytes']:
+                    break
+                item = json.loads(line)
+                self._remember(normalize_command(item['text']), (item['device'], item['source']))
+        return state['records_done'], state['output_bytes']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量识别日志中的设备指令")
+    parser.add_argument('input', help="JSONL或CSV文件")
+    parser.add_argument('output', help="结果JSONL文件")
+    parser.add_argument('--field', default='text', help="指令所在字段")
+    parser.add_argument('--id-field', default='id')
+    parser.add_argument('--provider', default='qianfan')
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--window', type=int, default=1000)
+    parser.add_argument('--overwrite', action='store_true', help="没有断点时覆盖已存在的输出文件")
+    args = parser.parse_args()
+
+    identifier = BatchIdentifier(args.provider, args.batch_size, args.concurrency, args.window)
+    try:
+        print(identifier.run(args.input, args.output, field=args.field, id_field=args.id_field,
+                             overwrite=args.overwrite))
+    except (ConnectionError, FileExistsError) as e:
+        raise SystemExit(str(e))
@@ -0,0 +1,291 @@
+import argparse
+import fnmatch
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from mock_llm_server import Cassette, MockBehavior, MockLLMServer, SyntheticResponder
+from voice_device import percentile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+DEVICE_COMMANDS = [
+    '打开空调', '我有点热', '把灯关了', '帮我拉上窗帘', '来点娱乐', '今天好闷啊', '放一部电影',
+    '热水器调到50度', '地板有点脏', '帮我热一下饭', '门锁上了吗', '客厅太干了', '我要睡觉了',
+    '衣服洗好了吗', '空气不太好', '把风扇开到三档', '有人按门铃', '浴室太冷了', '水有点怪味', '被窝好冷',
+]
+
+GENERATE_REQUEST = "生成一个智能家居产品展示页面，包含导航、产品列表和页脚"
+
+# 纯文字替换在本地完成，两条指令交替执行使文档保持不变
+LOCAL_MODIFY_COMMANDS = ["将'智能家居商城'改为'智慧家居商城'", "将'智慧家居商城'改为'智能家居商城'"]
+# 涉及样式，需要把相关片段发给大模型
+LLM_MODIFY_COMMANDS = ["将灯光 1号改为红色"]
+
+PROVIDERS = ['qianfan', 'spark', 'doubao', 'deepseek']
+
+
+@dataclass
+class Scenario:
+    """一个基准场景
+
+    Args:
+        name: 场景名称
+        setup: 每个工作线程调用一次，返回执行第i次操作的函数
+        size: 生成或修改的HTML大小，与大小无关的场景为None
+    """
+    name: str
+    setup: Callable[[], Callable[[int], object]]
+    size: Optional[int] = None
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    size: Optional[int]
+    concurrency: int
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    seconds: float = 0.0
+    peak_memory: int = 0
+    error_samples: List[str] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        count = len(self.latencies) + self.errors
+        return {
+            'scenario': self.name,
+            'size': self.size,
+            'count': count,
+            'errors': self.errors,
+            'concurrency': self.concurrency,
+            'p50_ms': percentile(self.latencies, 50) * 1000,
+            'p95_ms': percentile(self.latencies, 95) * 1000,
+            'p99_ms': percentile(self.latencies, 99) * 1000,
+            'mean_ms': sum(self.latencies) / len(self.latencies) * 1000 if self.latencies else 0.0,
+            'throughput': count / self.seconds if self.seconds else 0.0,
+            'peak_memory_kb': self.peak_memory / 1024,
+            'error_samples': self.error_samples,
+        }
+
+
+def _device_scenario() -> Scenario:
+    def setup():
+        from main import get_device
+        return lambda i: get_device(DEVICE_COMMANDS[i % len(DEVICE_COMMANDS)])
+    return Scenario('get_device', setup)
+
+
+def _generate_scenario(server: MockLLMServer, provider: str, size: int, stream: bool) -> Scenario:
+    def setup():
+        from html_modifier import HTMLModifier
+        modifier = HTMLModifier(output_path=None)
+
+        def op(i: int):
+            server.responder.html_bytes = size
+            if stream:
+                for _ in modifier.generate_html_stream(GENERATE_REQUEST, provider):
+                    pass
+            else:
+                getattr(modifier, f"generate_html_{provider}")(GENERATE_REQUEST)
+        return op
+
+    name = f"generate_html_stream:{provider}" if stream else f"generate_html_{provider}"
+    return Scenario(name, setup, size)
+
+
+def _modify_scenario(server: MockLLMServer, name: str, commands: List[str], size: int) -> Scenario:
+    def setup():
+        from html_modifier import HTMLModifier
+        modifier = HTMLModifier(output_path=None)
+        # 先生成指定大小的文档，生成耗时不计入修改场景
+        server.responder.html_bytes = size
+        modifier.generate_html_spark(GENERATE_REQUEST)
+
+        counter = itertools.count()
+
+        def op(i: int):
+            # 按本线程的执行次数轮换指令，保证替换指令成对执行
+            result = modifier.modify_html(commands[next(counter) % len(commands)])
+            if "出错" in result:
+                raise RuntimeError(result)
+        return op
+
+    return Scenario(name, setup, size)
+
+
+def build_scenarios(server: MockLLMServer, sizes: List[int]) -> List[Scenario]:
+    """所有公开入口的基准场景，与HTML大小有关的场景对每个大小各生成一个"""
+    scenarios = [_device_scenario()]
+    for size in sizes:
+        for provider in PROVIDERS:
+            scenarios.append(_generate_scenario(server, provider, size, stream=False))
+        for provider in PROVIDERS:
+            scenarios.append(_generate_scenario(server, provider, size, stream=True))
+        scenarios.append(_modify_scenario(server, 'modify_html:local', LOCAL_MODIFY_COMMANDS, size))
+        scenarios.append(_modify_scenario(server, 'modify_html:llm', LLM_MODIFY_COMMANDS, size))
+    return scenarios
+
+
+def run_scenario(scenario: Scenario, iterations: int = 20, concurrency: int = 1,
+                 memory_iterations: int = 3) -> ScenarioResult:
+    """先单线程测量单次操作的内存峰值，再用concurrency个线程执行iterations次并记录每次的延迟
+
+    内存用tracemalloc单独测量，避免其开销影响延迟数据；每个线程的准备工作和首次调用不计入结果。
+    """
+    result = ScenarioResult(scenario.name, scenario.size, concurrency)
+
+    # 导入模块、建立连接等一次性开销不计入内存峰值
+    op = scenario.setup()
+    try:
+        op(0)
+    except Exception:
+        pass
+    tracemalloc.start()
+    try:
+        for i in range(1, memory_iterations + 1):
+            try:
+                op(i)
+            except Exception:
+                pass
+        result.peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    local = threading.local()
+    lock = threading.Lock()
+
+    def worker_op() -> Callable[[int], object]:
+        if not hasattr(local, 'op'):
+            local.op = scenario.setup()
+            try:
+                local.op(0)
+            except Exception:
+                pass
+        return local.op
+
+    def one(i: int):
+        op = worker_op()
+        start = time.perf_counter()
+        try:
+            op(i)
+        except Exception as e:
+            with lock:
+                result.errors += 1
+                if len(result.error_samples) < 3:
+                    result.error_samples.append(f"{type(e).__name__}: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            result.latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # 每个线程先完成准备，避免准备时间计入吞吐量
+        list(executor.map(lambda _: worker_op(), range(concurrency)))
+        started = time.perf_counter()
+        list(executor.map(one, range(iterations)))
+        result.seconds = time.perf_counter() - started
+    return result
+
+
+def format_table(summaries: List[dict]) -> str:
+    header = f"{'场景':<32}{'大小':>8}{'次数':>6}{'失败':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}" \
+             f"{'吞吐(次/秒)':>12}{'内存峰值(KB)':>14}"
+    lines = [header]
+    for s in summaries:
+        lines.append(
+            f"{s['scenario']:<32}{s['size'] or '-':>8}{s['count']:>6}{s['errors']:>6}"
+            f"{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}"
+            f"{s['throughput']:>12.2f}{s['peak_memory_kb']:>14.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> List[dict]:
+    parser = argparse.ArgumentParser(description="在本地模拟服务上测量设备识别、HTML生成和修改的性能")
+    parser.add_argument('--scenarios', default='*', help="要运行的场景，逗号分隔，支持通配符，如generate_html_*")
+    parser.add_argument('--sizes', default='4000,32000,128000', help="HTML大小（字符数），逗号分隔")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--memory-iterations', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.05, help="模拟服务的首字延迟（秒）")
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--chars-per-second', type=float, default=200000.0, help="模拟的生成速度，0表示不限")
+    parser.add_argument('--chunk-chars', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cassette', help="录制或回放的记录文件")
+    parser.add_argument('--cassette-mode', choices=['record', 'replay'], default='replay')
+    parser.add_argument('--cassette-speed', type=float, default=1.0)
+    parser.add_argument('--keep-cache', action='store_true', help="保留响应缓存（默认关闭以测量真实调用）")
+    parser.add_argument('--json', help="把结果写入JSON文件")
+    parser.add_argument('--metrics', help="开启阶段追踪，把各阶段指标写入文件（.prom为Prometheus格式，其余为JSON）")
+    args = parser.parse_args(argv)
+
+    behavior = MockBehavior(args.latency, args.jitter, args.error_rate, args.chars_per_second, args.chunk_chars)
+    cassette = Cassette(args.cassette, args.cassette_mode, args.cassette_speed) if args.cassette else None
+    server = MockLLMServer(default=behavior, responder=SyntheticResponder(), cassette=cassette, seed=args.seed)
+    server.start()
+    # 必须在导入clients之前设置，各后端客户端才会连到模拟服务
+    os.environ.update(server.env())
+    os.environ.pop('LLM_CACHE_PATH', None)
+    if not args.keep_cache:
+        from llm_cache import llm_cache
+        llm_cache.max_entries = 0
+    if args.metrics:
+        from tracing import tracer
+        tracer.enable()
+
+    patterns = [p.strip() for p in args.scenarios.split(',') if p.strip()]
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    scenarios = [s for s in build_scenarios(server, sizes)
+                 if any(fnmatch.fnmatch(s.name, p) for p in patterns)]
+
+    summaries = []
+    try:
+        for scenario in scenarios:
+            try:
+                result = run_scenario(scenario, args.iterations, args.concurrency, args.memory_iterations)
+            except Exception as e:
+                # 场景无法准备（例如缺少依赖）时记录原因，继续其他场景
+                print(f"场景{scenario.name}无法运行: {type(e).__name__}: {e}")
+                continue
+            summary = result.summary()
+            summaries.append(summary)
+            print(format_table([summary]).splitlines()[-1], flush=True)
+            for sample in summary['error_samples']:
+                print(f"    {sample}")
+    finally:
+        server.stop()
+
+    print()
+    print(format_table(summaries))
+    # Linux上ru_maxrss的单位为KB
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+    print(f"进程最大常驻内存: {max_rss / 1024:.1f} MB，模拟服务发送 {server.bytes_sent / 1024:.0f} KB")
+    print(f"模拟服务请求统计: {server.stats}")
+
+    if args.metrics:
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            if args.metrics.endswith('.prom'):
+                f.write(tracer.metrics.to_prometheus())
+            else:
+                json.dump(tracer.metrics.to_json(), f, ensure_ascii=False, indent=2)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'results': summaries, 'server': server.stats, 'max_rss_kb': max_rss,
+                       'args': vars(args)}, f, ensure_ascii=False, indent=2)
+    return summaries
+
+
+if __name__ == "__main__":
+    main()
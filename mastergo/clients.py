@@ -0,0 +1,120 @@
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict
+
+if TYPE_CHECKING:
+    import requests
+    from sparkai.llm.llm import ChatSparkLLM
+    from volcenginesdkarkruntime import Ark
+
+
+# 各后端的服务地址，设置对应环境变量可指向本地模拟服务（见mock_llm_server.py）
+QIANFAN_BASE_URL = os.environ.get("QIANFAN_BASE_URL", "https://aip.baidubce.com")
+QIANFAN_TOKEN_URL = f"{QIANFAN_BASE_URL}/oauth/2.0/token"
+QIANFAN_CHAT_URL = f"{QIANFAN_BASE_URL}/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions_pro"
+ARK_BASE_URL = os.environ.get("ARK_BASE_URL", "https://ark.cn-beijing.volces.com/api/v3")
+SPARK_API_URL = os.environ.get("SPARK_API_URL", "wss://spark-api.xf-yun.com/v1.1/chat")
+# 方舟请求默认启用端到端加密，模拟服务不支持加密时设置ARK_ENCRYPTED=false
+ARK_EXTRA_HEADERS = {} if os.environ.get("ARK_ENCRYPTED", "true").lower() == "false" else {'x-is-encrypted': 'true'}
+
+
+class ClientRegistry:
+    """按后端名称缓存长连接客户端，在多次调用和多个线程之间复用"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._clients: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """注册后端客户端的创建函数，已创建的同名客户端会被丢弃"""
+        with self._lock:
+            self._factories[name] = factory
+            self._clients.pop(name, None)
+            self._stats.setdefault(name, {'hits': 0, 'misses': 0})
+
+    def get(self, name: str) -> Any:
+        """获取后端客户端，首次使用时创建"""
+        client = self._clients.get(name)
+        if client is not None:
+            with self._lock:
+                self._stats[name]['hits'] += 1
+            return client
+
+        with self._lock:
+            # 双重检查，避免多个线程同时创建同一个客户端
+            client = self._clients.get(name)
+            if client is not None:
+                self._stats[name]['hits'] += 1
+                return client
+            if name not in self._factories:
+                raise KeyError(f"未注册的后端: {name}")
+            client = self._factories[name]()
+            self._clients[name] = client
+            self._stats[name]['misses'] += 1
+            return client
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """返回各后端连接池的命中与未命中次数"""
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def close_all(self):
+        """关闭所有已创建的客户端"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            close = getattr(client, 'close', None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:
+                    pass
+
+
+# 各后端的SDK在创建客户端时才导入，只用到其中一个后端时不必加载其余SDK
+def _create_spark_client() -> 'ChatSparkLLM':
+    from sparkai.llm.llm import ChatSparkLLM
+    return ChatSparkLLM(
+        spark_api_url=SPARK_API_URL,
+        spark_app_id='54f0b31e',
+        spark_api_key=os.environ.get("SPARK_API_KEY"),
+        spark_api_secret=os.environ.get("SPARK_SECRET_KEY"),
+        spark_llm_domain='lite',
+        streaming=False,
+    )
+
+
+def _create_qianfan_session() -> 'requests.Session':
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Content-Type': 'application/json'})
+    return session
+
+
+def _create_doubao_client() -> 'Ark':
+    from volcenginesdkarkruntime import Ark
+    return Ark(base_url=ARK_BASE_URL, api_key=os.environ.get("ARK_API_KEY"))
+
+
+def _create_deepseek_client() -> 'Ark':
+    from volcenginesdkarkruntime import Ark
+    return Ark(base_url=ARK_BASE_URL, api_key=os.environ.get("DS_API_KEY"))
+
+
+registry = ClientRegistry()
+registry.register('spark', _create_spark_client)
+registry.register('qianfan', _create_qianfan_session)
+registry.register('doubao', _create_doubao_client)
+registry.register('deepseek', _create_deepseek_client)
+
+
+def get_client(name: str) -> Any:
+    """从全局注册表获取后端客户端"""
+    return registry.get(name)
@@ -0,0 +1,176 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from prompt import PROMPT
+
+
+def parse_device_prompt(prompt: str = PROMPT) -> Tuple[List[str], Dict[str, List[str]]]:
+    """从识别提示词中解析设备列表和分类规则，保证本地分类器与大模型使用同一份词表
+
+    Returns:
+        (设备列表, {类别: [设备, ...]})
+    """
+    device_block = re.search(r"\[(.*?)\]", prompt, re.S).group(1)
+    devices = [d.strip() for d in device_block.replace("\n", " ").split(",") if d.strip()]
+
+    categories = {}
+    for name, targets in re.findall(r"^\s*\d+\.\s*(\S+)\s*→\s*(\S+)\s*$", prompt, re.M):
+        categories[name] = [t for t in targets.split("/") if t in devices]
+    return devices, categories
+
+
+DEVICES, CATEGORIES = parse_device_prompt()
+
+# 设备的常见叫法
+SYNONYMS: Dict[str, str] = {
+    '冷气': '空调', '空调机': '空调',
+    '灯': '灯光', '电灯': '灯光', '台灯': '灯光', '吊灯': '灯光', '开灯': '灯光', '关灯': '灯光',
+    '窗帘布': '窗帘', '帘子': '窗帘',
+    '电视机': '电视',
+    '热水': '热水器',
+    '除湿器': '除湿机', '抽湿机': '除湿机',
+    '扫地机': '扫地机器人', '扫地': '扫地机器人', '拖地': '扫地机器人',
+    '洗衣': '洗衣机', '干衣机': '烘干机',
+    '烤炉': '烤箱', '电饭锅': '电饭煲', '煮饭': '电饭煲',
+    '净化器': '空气净化器', '新风': '新风系统',
+    '门锁': '智能门锁', '锁门': '智能门锁', '开门': '智能门锁',
+    '监控': '摄像头',
+    '排插': '插座', '插排': '插座',
+    '风扇': '电风扇', '电扇': '电风扇',
+    '暖气片': '暖气', '地暖': '暖气',
+    '马桶': '智能马桶',
+    '投影': '投影仪',
+}
+
+# 明确指向一组设备的意图关键词: 关键词 -> (提示词中的类别, 只取类别中的这些设备)，为None时取整个类别
+INTENT_RULES: Dict[str, Tuple[str, Optional[Tuple[str, ...]]]] = {
+    '热': ('温度调节', ('空调', '电风扇')),
+    '太热': ('温度调节', ('空调', '电风扇')),
+    '好热': ('温度调节', ('空调', '电风扇')),
+    '闷': ('温度调节', ('空调', '电风扇')),
+    '太闷': ('温度调节', ('空调', '电风扇')),
+    '好闷': ('温度调节', ('空调', '电风扇')),
+    '闷热': ('温度调节', ('空调', '电风扇')),
+    '冷': ('温度调节', ('空调', '暖气')),
+    '太冷': ('温度调节', ('空调', '暖气')),
+    '好冷': ('温度调节', ('空调', '暖气')),
+    '干燥': ('空气管理', ('加湿器',)),
+    '太干': ('空气管理', ('加湿器',)),
+    '潮湿': ('空气管理', ('除湿机',)),
+    '太潮': ('空气管理', ('除湿机',)),
+    '雾霾': ('空气管理', ('空气净化器',)),
+    '空气不好': ('空气管理', ('空气净化器', '新风系统')),
+    '洗澡': ('用水相关', ('热水器',)),
+    '喝水': ('用水相关', ('净水器',)),
+    '太暗': ('睡眠场景', ('灯光',)),
+    '太亮': ('睡眠场景', ('灯光',)),
+    '睡觉': ('睡眠场景', None),
+    '看电影': ('影音娱乐', None),
+    '有人': ('安防相关', ('摄像头',)),
+}
+
+
+def build_intent_keywords(rules: Dict[str, Tuple[str, Optional[Tuple[str, ...]]]] = INTENT_RULES,
+                          categories: Dict[str, List[str]] = CATEGORIES) -> Dict[str, Tuple[str, List[str]]]:
+    """从提示词的分类规则得到每个意图关键词对应的设备，类别之外的设备不会被选中
+
+    Returns:
+        {关键词: (类别, [设备, ...])}，设备按提示词中的顺序排列
+    """
+    keywords = {}
+    for keyword, (category, only) in rules.items():
+        if category not in categories:
+            raise ValueError(f"意图关键词'{keyword}'的类别'{category}'不在提示词的分类规则中")
+        targets = [d for d in categories[category] if only is None or d in only]
+        if not targets:
+            raise ValueError(f"意图关键词'{keyword}'在类别'{category}'中没有对应的设备")
+        keywords[keyword] = (category, targets)
+    return keywords
+
+
+INTENT_KEYWORDS = build_intent_keywords()
+
+# 出现这些词说明指令依赖上下文，交给大模型结合历史对话判断
+CONTEXT_WORDS = ('它', '这个', '那个', '刚才', '上一个', '再')
+
+
+@dataclass
+class ClassifierResult:
+    devices: List[str] = field(default_factory=list)
+    confidence: float = 0.0
+    reason: str = ""
+
+    @property
+    def answer(self) -> str:
+        """与大模型返回格式一致的设备名称字符串"""
+        return " ".join(self.devices) if self.devices else "未知设备"
+
+
+class DeviceClassifier:
+    """基于设备词表、同义词和分类规则的本地设备识别
+
+    分词器在第一次识别时才加载，使用预构建的词典（见jieba_cache.py），导入和创建本对象都不需要初始化jieba。
+    """
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        self.device_index: Dict[str, str] = {d: d for d in DEVICES}
+        self.device_index.update({k: v for k, v in SYNONYMS.items() if v in DEVICES})
+        # 长词优先匹配，避免“热水器”被拆成“热”
+        self.intent_keywords = sorted(INTENT_KEYWORDS, key=len, reverse=True)
+        self._tokenizer = None
+        self._tokenizer_lock = threading.Lock()
+
+    @property
+    def vocabulary(self) -> List[str]:
+        """需要加入分词词典的设备名、同义词和意图关键词"""
+        return list(self.device_index) + self.intent_keywords
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            with self._tokenizer_lock:
+                if self._tokenizer is None:
+                    from jieba_cache import load_tokenizer
+                    self._tokenizer = load_tokenizer(self.vocabulary)
+        return self._tokenizer
+
+    def classify(self, user_input: str) -> ClassifierResult:
+        text = user_input.strip()
+        if not text:
+            return ClassifierResult(reason="空指令")
+        if any(word in text for word in CONTEXT_WORDS):
+            return ClassifierResult(reason="依赖上下文")
+
+        devices: List[str] = []
+        intents: Dict[str, List[str]] = {}
+        for token in self.tokenizer.lcut(text):
+            device = self.device_index.get(token)
+            if device:
+                if device not in devices:
+                    devices.append(device)
+                continue
+            for keyword in self.intent_keywords:
+                # 单字关键词必须是完整的词，否则“太热”“热水”等都会被当作“热”
+                if token == keyword if len(keyword) == 1 else keyword in token:
+                    category, targets = INTENT_KEYWORDS[keyword]
+                    intents.setdefault(category, targets)
+                    break
+
+        if devices:
+            return ClassifierResult(devices, 1.0, "直接提到设备")
+        if len(intents) == 1:
+            category, targets = next(iter(intents.items()))
+            return ClassifierResult(list(targets), 0.9, f"意图匹配: {category}")
+        if intents:
+            merged = [d for targets in intents.values() for d in targets]
+            return ClassifierResult(list(dict.fromkeys(merged)), 0.5, "多个意图")
+        return ClassifierResult(reason="未匹配")
+
+    def predict(self, user_input: str) -> Optional[str]:
+        """置信度足够时返回设备名称，否则返回None表示需要调用大模型"""
+        result = self.classify(user_input)
+        if result.confidence >= self.threshold:
+            return result.answer
+        return None
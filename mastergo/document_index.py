@@ -0,0 +1,102 @@
+from typing import Dict, List, Optional, Tuple
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.element import Comment, Doctype
+from source_locator import SourceLocator
+
+
+class DocumentIndex:
+    """对同一版本的HTML文档只解析一次，并建立标签、class和文本节点的索引
+
+    文档内容变化后应重新创建索引，索引本身不跟踪修改。
+    """
+
+    def __init__(self, html: str):
+        self.html = html
+        self.soup = BeautifulSoup(html, 'html.parser')
+        self.by_tag: Dict[str, List[Tag]] = {}
+        self.by_class: Dict[str, List[Tag]] = {}
+        # 文档中的全部字符串节点，以及其中可见的文本节点（不含script/style内容和注释）
+        self.strings: List[NavigableString] = []
+        self.text_nodes: List[NavigableString] = []
+        self._order: Dict[int, int] = {}
+        self._text_spans: Dict[int, Tuple[int, int]] = {}
+        self.locator = SourceLocator(html)
+        self._build()
+
+    def _build(self):
+        for node in self.soup.descendants:
+            if isinstance(node, Tag):
+                self._order[id(node)] = len(self._order)
+                self.by_tag.setdefault(node.name, []).append(node)
+                for cls in node.get('class', []):
+                    self.by_class.setdefault(cls, []).append(node)
+            elif isinstance(node, NavigableString):
+                self.strings.append(node)
+                if isinstance(node, (Comment, Doctype)) or not node.strip():
+                    continue
+                if node.parent is not None and node.parent.name not in ('script', 'style'):
+                    self.text_nodes.append(node)
+
+        spans = self.locator.string_spans
+        if len(spans) == len(self.strings):
+            # 字符串节点与定位器记录的源码片段按文档顺序一一对应
+            for node, span in zip(self.strings, spans):
+                self._text_spans[id(node)] = span
+        else:
+            for node in self.strings:
+                span = self._locate_text(node)
+                if span:
+                    self._text_spans[id(node)] = span
+
+    def element_start(self, tag: Tag) -> Optional[int]:
+        """元素开始标签在源码中的偏移"""
+        if getattr(tag, 'sourceline', None) is None:
+            return None
+        return self.locator.source_offset(tag.sourceline, tag.sourcepos)
+
+    def element_span(self, tag: Tag) -> Optional[Tuple[int, int]]:
+        """元素在源码中的起止偏移，找不到时返回None"""
+        start = self.element_start(tag)
+        if start is None:
+            return None
+        span = self.locator.element_spans.get(start)
+        if span is not None:
+            return span
+        full_text = str(tag)
+        if self.html.startswith(full_text, start):
+            return start, start + len(full_text)
+        # 重新序列化与原文不一致时，从开始位置向后查找
+        pos = self.html.find(full_text, start)
+        return (pos, pos + len(full_text)) if pos != -1 else None
+
+    def _locate_text(self, node: NavigableString) -> Optional[Tuple[int, int]]:
+        start = 0
+        if node.parent is not None:
+            start = self.element_start(node.parent) or 0
+        pos = self.html.find(str(node), start)
+        if pos == -1:
+            return None
+        return pos, pos + len(node)
+
+    def text_span(self, node: NavigableString) -> Optional[Tuple[int, int]]:
+        """字符串节点在源码中的起止偏移（实体引用保持原样）"""
+        return self._text_spans.get(id(node))
+
+    def find_all(self, name: str) -> List[Tag]:
+        return list(self.by_tag.get(name, []))
+
+    def find(self, name: str) -> Optional[Tag]:
+        tags = self.by_tag.get(name)
+        return tags[0] if tags else None
+
+    def find_by_class(self, classes: List[str]) -> List[Tag]:
+        """按文档顺序返回带有任一class的元素"""
+        found = {}
+        for cls in classes:
+            for tag in self.by_class.get(cls, []):
+                found[id(tag)] = tag
+        return sorted(found.values(), key=lambda t: self._order[id(t)])
+
+    def strings_containing(self, target_text: str) -> List[NavigableString]:
+        """包含目标文本的所有字符串节点"""
+        return [node for node in self.strings if target_text in node]
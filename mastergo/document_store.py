@@ -0,0 +1,497 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from patch import PatchConflict, Splice as Edit, apply_splices, merge_splices
+
+# 修改超过文档这一比例时不再记录替换片段，直接保存整份文档作为快照
+FULL_REWRITE_RATIO = 0.5
+
+
+def _splice(text: str, edits: Sequence[Edit]) -> str:
+    # 日志中的替换在写入前已经合并排序
+    return apply_splices(text, edits, merged=True)
+
+
+def _inverse(text: str, edits: Sequence[Edit]) -> List[Edit]:
+    """撤销这组替换所需的替换，位置基于替换后的文档"""
+    inverse = []
+    shift = 0
+    for start, end, new in edits:
+        inverse.append((start + shift, start + shift + len(new), text[start:end]))
+        shift += len(new) - (end - start)
+    return inverse
+
+
+def _common_prefix(a: str, b: str) -> int:
+    # 二分比较切片，比逐字符循环快得多
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def diff_edit(old: str, new: str) -> List[Edit]:
+    """去掉相同的开头和结尾，得到把old变成new的单个替换；内容相同时返回空列表"""
+    if old == new:
+        return []
+    prefix = _common_prefix(old, new)
+    limit = min(len(old), len(new)) - prefix
+    suffix = _common_prefix(old[::-1][:limit], new[::-1][:limit])
+    return [(prefix, len(old) - suffix, new[prefix:len(new) - suffix])]
+
+
+def _edits_match(old: str, new: str, edits: Sequence[Edit]) -> bool:
+    """只检查长度和替换内容，确认edits确实把old变成了new，不比较整份文档"""
+    if len(old) + sum(len(s) - (e - b) for b, e, s in edits) != len(new):
+        return False
+    shift = 0
+    last = 0
+    for start, end, replacement in edits:
+        if start < last or end < start or end > len(old):
+            return False
+        if new[start + shift:start + shift + len(replacement)] != replacement:
+            return False
+        shift += len(replacement) - (end - start)
+        last = end
+    return True
+
+
+class DocumentStore:
+    """带版本历史的HTML文档存储
+
+    每次修改在日志中追加一条记录，只保存替换片段及其逆操作；与上一个快照相隔
+    snapshot_every个版本或整体重写时保存整份文档作为快照。日志、快照和输出文件由
+    后台线程每flush_interval秒批量写入，都先写临时文件再改名，写到一半崩溃也不会损坏页面。
+
+    版本之间按父子关系组成树，撤销回到父版本，重做进入最近的子版本，撤销后再修改会开出新分支。
+    任意版本和任意时刻的文档都可以从最近的快照重放日志得到。同一文件只应由一个进程写入。
+
+    Args:
+        path: 输出的HTML文件，历史保存在同目录的<文件名>.history目录中
+        snapshot_every: 每隔多少个版本保存一次快照
+        flush_interval: 后台写盘的间隔（秒），为0时每次修改都同步写盘
+        fsync: 写日志和输出文件后是否调用fsync
+    """
+
+    def __init__(self, path: str, snapshot_every: int = 50, flush_interval: float = 0.2,
+                 fsync: bool = True, cache_size: int = 8):
+        self.path = path
+        self.history_dir = f"{path}.history"
+        self.journal_path = os.path.join(self.history_dir, 'journal.jsonl')
+        self.snapshot_every = max(1, snapshot_every)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.cache_size = cache_size
+
+        # 版本号 -> {'v', 'p', 't', 'e', 'u', 's', 'd'}，d为距最近快照的版本数
+        self._records: Dict[int, dict] = {}
+        self._children: Dict[int, List[int]] = {}
+        # 当前版本的变化时间线 [(时间, 版本)]，用于按时间查询
+        self._timeline: List[Tuple[float, Optional[int]]] = []
+        self.head: Optional[int] = None
+        self._text: Optional[str] = None
+        self._next_version = 1
+        # 最近用到的版本全文，撤销整体重写时不必读取快照
+        self._cache: 'OrderedDict[int, str]' = OrderedDict()
+
+        self._lock = threading.RLock()
+        self._io_lock = threading.Lock()
+        self._pending_lines: List[str] = []
+        self._pending_snapshots: Dict[int, str] = {}
+        self._output_dirty = False
+        # 最近一次写出的输出文件的(修改时间, 大小)，用于发现外部修改
+        self._written_stat: Optional[Tuple[int, int]] = None
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.stats = {'commits': 0, 'snapshots': 0, 'flushes': 0, 'journal_bytes': 0, 'output_writes': 0}
+
+        self._load()
+
+    # ---- 读取 ----
+
+    @property
+    def text(self) -> Optional[str]:
+        """当前版本的文档，还没有任何版本时为None"""
+        return self._text
+
+    def _snapshot_path(self, version: int) -> str:
+        return os.path.join(self.history_dir, f"snapshot-{version}.html")
+
+    def _load(self):
+        """从日志恢复版本历史，并与输出文件核对"""
+        journal_mtime = 0
+        if os.path.exists(self.journal_path):
+            # 截断不完整的末尾会改变修改时间，需在读取之前记录
+            journal_mtime = os.stat(self.journal_path).st_mtime_ns
+            self._read_journal()
+        if self.head is not None:
+            self._text = self.checkout(self.head)
+
+        output = self._stat_output()
+        if output is None:
+            if self._text is not None:
+                self._output_dirty = True
+                self.flush()
+            return
+        if self._text is not None:
+            if output[0] <= journal_mtime:
+                # 日志已写入但输出文件还没来得及替换就中断了
+                if self._read_output() != self._text:
+                    self._output_dirty = True
+                    self.flush()
+                else:
+                    self._written_stat = output
+                return
+        # 没有历史，或输出文件在日志之后被其他程序修改过
+        self._written_stat = output
+        html = self._read_output()
+        if html != self._text:
+            self.commit(html, source='external')
+
+    def _read_journal(self):
+        good = 0
+        with open(self.journal_path, 'rb') as f:
+            data = f.read()
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good += len(line)
+            self._replay(record)
+        if good < len(data):
+            # 丢弃崩溃时写了一半的最后一行
+            print(f"文档日志末尾不完整，已截断: {self.journal_path}")
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(good)
+
+    def _replay(self, record: dict):
+        if 'h' in record:
+            self.head = record['h']
+        else:
+            version = record['v']
+            parent = record.get('p')
+            record['d'] = 0 if record.get('s') else self._records[parent]['d'] + 1
+            self._records[version] = record
+            self._children.setdefault(parent, []).append(version)
+            self.head = version
+            self._next_version = max(self._next_version, version + 1)
+        self._timeline.append((record['t'], self.head))
+
+    def checkout(self, version: int) -> str:
+        """重建指定版本的文档，不改变当前版本"""
+        with self._lock:
+            if version == self.head and self._text is not None:
+                return self._text
+            if version in self._cache:
+                self._cache.move_to_end(version)
+                return self._cache[version]
+            if version not in self._records:
+                raise KeyError(f"不存在的文档版本: {version}")
+
+            # 沿父版本回溯到最近的快照，再依次重放替换
+            chain = []
+            current = version
+            while True:
+                record = self._records[current]
+                if record.get('s'):
+                    text = self._read_snapshot(current)
+                    if text is not None:
+                        break
+                    if 'e' not in record:
+                        raise IOError(f"文档版本{current}的快照丢失")
+                if current == self.head and self._text is not None:
+                    text = self._text
+                    break
+                if current in self._cache:
+                    text = self._cache[current]
+                    break
+                chain.append(record)
+                current = record['p']
+            for record in reversed(chain):
+                text = _splice(text, record['e'])
+            self._remember(version, text)
+            return text
+
+    def _read_snapshot(self, version: int) -> Optional[str]:
+        if version in self._pending_snapshots:
+            return self._pending_snapshots[version]
+        try:
+            with open(self._snapshot_path(version), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def at(self, timestamp: float) -> Optional[str]:
+        """某一时刻（time.time()）的文档，早于第一个版本时返回None"""
+        with self._lock:
+            version = self.version_at(timestamp)
+            return None if version is None else self.checkout(version)
+
+    def version_at(self, timestamp: float) -> Optional[int]:
+        with self._lock:
+            index = bisect.bisect_right(self._timeline, (timestamp, float('inf'))) - 1
+            return self._timeline[index][1] if index >= 0 else None
+
+    def history(self) -> List[dict]:
+        """所有版本的编号、父版本、时间、来源和是否为快照"""
+        with self._lock:
+            return [{'version': r['v'], 'parent': r.get('p'), 'time': r['t'], 'source': r.get('src'),
+                     'snapshot': bool(r.get('s')), 'edits': len(r.get('e', []))}
+                    for r in self._records.values()]
+
+    def _remember(self, version: int, text: str):
+        self._cache[version] = text
+        self._cache.move_to_end(version)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # ---- 修改 ----
+
+    def commit(self, html: str, edits: Optional[Sequence[Edit]] = None, source: Optional[str] = None) -> int:
+        """保存新版本并返回版本号，内容没有变化时不产生新版本
+
+        Args:
+            html: 新版本的完整文档
+            edits: 基于当前版本的(起点, 终点, 新内容)替换，缺省或与html不一致时比较前后文档得到
+            source: 记录在日志中的修改来源
+        """
+        with self._lock:
+            version = self._commit(html, edits, source)
+        self._flush_if_sync()
+        return version
+
+    def _commit(self, html: str, edits: Optional[Sequence[Edit]], source: Optional[str]) -> int:
+        with self._lock:
+            old = self._text
+            if old is not None and html == old:
+                return self.head
+            if old is not None:
+                try:
+                    edits = merge_splices(edits) if edits else None
+                except PatchConflict:
+                    edits = None
+                if not edits or not _edits_match(old, html, edits):
+                    edits = diff_edit(old, html)
+            record = {'v': self._next_version, 'p': self.head, 't': time.time()}
+            if source:
+                record['src'] = source
+            changed = sum(e - s + len(new) for s, e, new in edits) if old is not None else len(html)
+            full = old is None or changed > FULL_REWRITE_RATIO * max(len(old), len(html))
+            if not full:
+                record['e'] = [list(edit) for edit in edits]
+                record['u'] = [list(edit) for edit in _inverse(old, edits)]
+                record['d'] = self._records[self.head]['d'] + 1
+            if full or record['d'] >= self.snapshot_every:
+                record['s'] = 1
+                record['d'] = 0
+                self._pending_snapshots[record['v']] = html
+                self.stats['snapshots'] += 1
+
+            self._next_version += 1
+            self._records[record['v']] = record
+            self._children.setdefault(record['p'], []).append(record['v'])
+            if old is not None:
+                self._remember(self.head, old)
+            self._move(record['v'], html, record)
+            self.stats['commits'] += 1
+            return record['v']
+
+    def undo(self) -> Optional[str]:
+        """回到父版本，没有可撤销的版本时返回None"""
+        with self._lock:
+            if self.head is None or self._records[self.head].get('p') is None:
+                return None
+            record = self._records[self.head]
+            parent = record['p']
+            if parent in self._cache:
+                text = self._cache[parent]
+            elif 'u' in record:
+                text = _splice(self._text, record['u'])
+            else:
+                text = self.checkout(parent)
+            self._remember(self.head, self._text)
+            self._move(parent, text, {'h': parent, 't': time.time()})
+        self._flush_if_sync()
+        return text
+
+    def redo(self) -> Optional[str]:
+        """进入最近一次从当前版本产生的子版本，没有时返回None"""
+        with self._lock:
+            children = self._children.get(self.head)
+            if not children:
+                return None
+            child = children[-1]
+            record = self._records[child]
+            if 'e' in record:
+                text = _splice(self._text, record['e'])
+            else:
+                text = self.checkout(child)
+            self._remember(self.head, self._text)
+            self._move(child, text, {'h': child, 't': time.time()})
+        self._flush_if_sync()
+        return text
+
+    def _move(self, version: int, text: str, record: dict):
+        """切换当前版本，并把记录加入待写入的日志"""
+        self.head = version
+        self._text = text
+        self._cache.pop(version, None)
+        self._timeline.append((record['t'], version))
+        line = {k: v for k, v in record.items() if k != 'd'}
+        self._pending_lines.append(json.dumps(line, ensure_ascii=False) + "\n")
+        self._output_dirty = True
+        self._schedule()
+
+    def refresh(self) -> bool:
+        """输出文件被其他程序改写时把它作为新版本读入，返回是否读入了新内容"""
+        with self._lock:
+            if self._output_dirty:
+                return False
+            output = self._stat_output()
+            if output is None or output == self._written_stat:
+                return False
+            self._written_stat = output
+            html = self._read_output()
+            if html == self._text:
+                return False
+            self._commit(html, None, 'external')
+        self._flush_if_sync()
+        return True
+
+    def _stat_output(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _read_output(self) -> str:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    # ---- 写盘 ----
+
+    def _schedule(self):
+        if self.flush_interval <= 0 or self._closed:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name='document-store', daemon=True)
+            self._thread.start()
+        self._wakeup.notify()
+
+    def _flush_if_sync(self):
+        # 不能在持有self._lock时写盘：后台线程写盘时先拿_io_lock再拿_lock
+        if self.flush_interval <= 0 or self._closed:
+            self.flush()
+
+    def _writer(self):
+        while True:
+            with self._lock:
+                while not (self._pending_lines or self._closed):
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+            # 等待一个间隔，把这段时间内的修改合并成一次写盘
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"文档写盘失败: {str(e)}")
+
+    def flush(self):
+        """立即把待写入的快照、日志和当前文档写到磁盘"""
+        with self._io_lock:
+            with self._lock:
+                lines, self._pending_lines = self._pending_lines, []
+                snapshots = dict(self._pending_snapshots)
+                text = self._text if self._output_dirty else None
+                self._output_dirty = False
+            if not lines and not snapshots and text is None:
+                return
+            try:
+                os.makedirs(self.history_dir, exist_ok=True)
+                # 先写快照再写引用它们的日志，最后替换输出文件
+                for version, snapshot in snapshots.items():
+                    self._write_atomic(self._snapshot_path(version), snapshot)
+                if lines:
+                    data = "".join(lines).encode('utf-8')
+                    with open(self.journal_path, 'ab') as f:
+                        f.write(data)
+                        f.flush()
+                        if self.fsync:
+                            os.fsync(f.fileno())
+                    self.stats['journal_bytes'] += len(data)
+                if text is not None:
+                    self._write_atomic(self.path, text)
+                    self.stats['output_writes'] += 1
+            except OSError:
+                with self._lock:
+                    self._pending_lines[:0] = lines
+                    self._output_dirty = self._output_dirty or text is not None
+                raise
+            with self._lock:
+                for version in snapshots:
+                    self._pending_snapshots.pop(version, None)
+                if text is not None:
+                    self._written_stat = self._stat_output()
+                self.stats['flushes'] += 1
+
+    def _write_atomic(self, path: str, text: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def close(self):
+        """写完所有待写入的内容并停止后台线程"""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+_stores: Dict[str, DocumentStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(path: str, **kwargs) -> DocumentStore:
+    """按文件路径共享的文档存储，同一进程内对同一文件的读写都经过同一个存储"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = DocumentStore(path, **kwargs)
+        return store
+
+
+@atexit.register
+def close_all():
+    """进程退出前写完所有存储的待写入内容"""
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        try:
+            store.close()
+        except Exception as e:
+            print(f"关闭文档存储失败: {str(e)}")
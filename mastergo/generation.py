@@ -0,0 +1,250 @@
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from prompts import get_example_content
+from async_providers import ASYNC_BACKENDS, run as run_async
+from document_store import open_store
+from html_parts import HtmlParts
+from rate_limit import RateLimits
+from tracing import text_bytes, tracer
+
+
+# 千帆沿用单独的提示词，其余后端共用同一个模板
+PROMPT_TEMPLATES = {
+    'qianfan': """
+                请根据以下要求修改下面的HTML文件：
+                {request}
+                HTML文件：
+                {example}
+                """,
+}
+DEFAULT_PROMPT_TEMPLATE = """
+        将以下代码按照{request}的要求修改：
+        {example}
+        """
+
+# 修改指令读写的默认文件，也是千帆生成结果的保存位置
+DEFAULT_OUTPUT_PATH = 'output.html'
+
+OUTPUT_PATHS = {
+    'qianfan': DEFAULT_OUTPUT_PATH,
+    'spark': 'output_spark.html',
+    'doubao': 'output_doubao.html',
+    'deepseek': 'output_deepseek.html',
+}
+
+# 生成结果必须包含基本结构的后端
+STRICT_PROVIDERS = {'doubao'}
+
+# 各后端每秒最多发起的生成请求数，默认值偏保守，可按账号配额调整
+DEFAULT_RATE_LIMITS = {'qianfan': 2, 'spark': 2, 'doubao': 5, 'deepseek': 5}
+
+
+def build_prompt(provider: str, request_content: str) -> str:
+    """生成HTML的提示词"""
+    template = PROMPT_TEMPLATES.get(provider, DEFAULT_PROMPT_TEMPLATE)
+    return template.format(request=request_content, example=get_example_content())
+
+
+def default_output_path(provider: str) -> str:
+    return OUTPUT_PATHS.get(provider, f'output_{provider}.html')
+
+
+_STYLE_RE = re.compile(r"(<style[^>]*>)(.*?)(</style>)", re.S | re.I)
+
+
+def repair_styles(html: str) -> str:
+    """补全样式表末尾漏写的分号和右括号，模型输出的CSS在最后一条规则处被截断时常见
+
+    例如"body { font-family: Arial"修复为"body { font-family: Arial;\n}"，完整的样式表保持不变。
+    """
+    def repair(match):
+        css = match.group(2)
+        depth = css.count('{') - css.count('}')
+        if depth <= 0:
+            return match.group(0)
+        css = css.rstrip()
+        if not css.endswith((';', '{', '}')):
+            css += ';'
+        return f"{match.group(1)}{css}\n{'}' * depth}\n{match.group(3)}"
+
+    return _STYLE_RE.sub(repair, html)
+
+
+def extract_html_code(text: str) -> str:
+    """提取模型回复中的HTML代码块，优先使用```html代码块"""
+    if "```html" in text:
+        return text.split("```html")[1].split("```")[0].strip()
+    if "```" not in text:
+        raise ValueError("未检测到有效的HTML代码块")
+    html_code = text.split("```")[1].strip()
+    if html_code.lower().startswith("html"):
+        html_code = html_code[4:].strip()
+    return html_code
+
+
+@dataclass
+class GenerationJob:
+    """一次HTML生成任务"""
+    request_content: str
+    provider: str = 'spark'
+    output_path: Optional[str] = None
+
+
+@dataclass
+class GenerationContext:
+    """在各阶段之间传递的生成状态"""
+    job: GenerationJob
+    prompt: str = ""
+    response: str = ""
+    html: str = ""
+    parts: Optional[HtmlParts] = None
+    output_path: Optional[str] = None
+    # 各阶段耗时（秒）
+    timings: Dict[str, float] = field(default_factory=dict)
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+Stage = Callable[[GenerationContext], None]
+
+
+class GenerationPipeline:
+    """HTML生成流程：提示词 → 调用后端 → 提取代码 → 修复 → 校验 → 解析 → 保存
+
+    每个阶段都是接收GenerationContext的函数，可通过replace_stage替换。
+    流程本身不保存任何状态，可以在多个线程中同时运行。
+    """
+
+    def __init__(self, chat: Optional[Callable[[str, str], str]] = None,
+                 rate_limits: Optional[RateLimits] = None, timeout: Optional[float] = None):
+        """
+        Args:
+            chat: (后端名称, 提示词) -> 回复文本，默认使用异步后端的单轮对话
+            rate_limits: 各后端的限流器
+            timeout: 单次调用后端的超时时间（秒）
+        """
+        self.chat = chat or self._chat_async
+        self.rate_limits = rate_limits or RateLimits()
+        self.timeout = timeout
+        self.stages: List[Tuple[str, Stage]] = [
+            ('prompt', self.build_prompt),
+            ('provider', self.call_provider),
+            ('extract', self.extract),
+            ('repair', self.repair),
+            ('validate', self.validate),
+            ('parse', self.parse),
+            ('persist', self.persist),
+        ]
+
+    def replace_stage(self, name: str, stage: Stage):
+        """替换指定名称的阶段"""
+        for i, (stage_name, _) in enumerate(self.stages):
+            if stage_name == name:
+                self.stages[i] = (name, stage)
+                return
+        raise KeyError(f"未知的生成阶段: {name}")
+
+    def run(self, job: GenerationJob, raise_errors: bool = True) -> GenerationContext:
+        """依次执行各阶段，某一阶段出错时停止
+
+        Args:
+            job: 生成任务
+            raise_errors: 为False时不抛出异常，错误记录在返回结果的error中
+        """
+        ctx = GenerationContext(job=job)
+        with tracer.span('generate_html', provider=job.provider) as root:
+            for name, stage in self.stages:
+                start = time.perf_counter()
+                try:
+                    with tracer.span(f'generation.{name}', provider=job.provider):
+                        stage(ctx)
+                except Exception as e:
+                    ctx.error = e
+                    if raise_errors:
+                        raise
+                    break
+                finally:
+                    ctx.timings[name] = time.perf_counter() - start
+            if root:
+                root.set(prompt_bytes=text_bytes(ctx.prompt), response_bytes=text_bytes(ctx.response),
+                         html_bytes=text_bytes(ctx.html), failed_stage=name if ctx.error else None)
+        return ctx
+
+    def _chat_async(self, provider: str, prompt: str) -> str:
+        if provider not in ASYNC_BACKENDS:
+            raise ValueError(f"不支持的后端: {provider}")
+        return run_async(ASYNC_BACKENDS[provider](prompt), self.timeout)
+
+    def build_prompt(self, ctx: GenerationContext):
+        ctx.prompt = build_prompt(ctx.job.provider, ctx.job.request_content)
+
+    def call_provider(self, ctx: GenerationContext):
+        if not self.rate_limits.acquire(ctx.job.provider, self.timeout):
+            raise TimeoutError(f"{ctx.job.provider}请求排队超时")
+        ctx.response = self.chat(ctx.job.provider, ctx.prompt)
+
+    def extract(self, ctx: GenerationContext):
+        ctx.html = extract_html_code(ctx.response)
+
+    def repair(self, ctx: GenerationContext):
+        ctx.html = repair_styles(ctx.html)
+
+    def validate(self, ctx: GenerationContext):
+        if not ctx.html:
+            raise ValueError("生成的HTML为空")
+        if ctx.job.provider in STRICT_PROVIDERS and \
+                not all(tag in ctx.html for tag in ["<!DOCTYPE", "<html", "<head", "<body"]):
+            raise ValueError("生成的HTML缺少基本结构")
+
+    def parse(self, ctx: GenerationContext):
+        ctx.parts = HtmlParts.from_html(ctx.html)
+
+    def persist(self, ctx: GenerationContext):
+        ctx.output_path = ctx.job.output_path or default_output_path(ctx.job.provider)
+        try:
+            # 作为新版本记入文档历史，文件由存储在后台原子写入
+            open_store(ctx.output_path).commit(ctx.html, source=ctx.job.provider)
+        except IOError as e:
+            raise ValueError(f"文件保存失败: {str(e)}")
+
+
+class GenerationEngine:
+    """用线程池并发执行多个生成任务，各后端按配置限流"""
+
+    def __init__(self, pipeline: Optional[GenerationPipeline] = None, max_workers: int = 4,
+                 rate_limits: Optional[Dict[str, float]] = None):
+        self.pipeline = pipeline or GenerationPipeline(
+            rate_limits=RateLimits(DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits))
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='generation')
+
+    def submit(self, job: GenerationJob) -> 'Future[GenerationContext]':
+        """提交一个任务，结果中的error记录失败原因"""
+        return self._executor.submit(self.pipeline.run, job, False)
+
+    def run_many(self, jobs: List[GenerationJob]) -> List[GenerationContext]:
+        """并发执行一批任务，按提交顺序返回结果"""
+        futures = [self.submit(job) for job in jobs]
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+def summarize_timings(results: List[GenerationContext]) -> Dict[str, Dict[str, float]]:
+    """汇总一批结果中各阶段的次数、平均和最大耗时"""
+    summary: Dict[str, Dict[str, float]] = {}
+    for ctx in results:
+        for name, seconds in ctx.timings.items():
+            item = summary.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            item['count'] += 1
+            item['total'] += seconds
+            item['max'] = max(item['max'], seconds)
+    for item in summary.values():
+        item['mean'] = item['total'] / item['count']
+    return summary
@@ -0,0 +1,160 @@
+import re
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional
+
+
+_CJK_RE = re.compile(r'[　-〿㐀-䶿一-鿿＀-￯]')
+_WORD_RE = re.compile(r'[A-Za-z0-9_]+')
+
+# 各后端历史的默认token上限，远小于模型上下文长度，给本次提示词留出空间
+DEFAULT_BUDGETS = {'qianfan': 4000, 'spark': 2000, 'doubao': 8000, 'deepseek': 8000}
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计token数：中文按字计，英文单词和数字约每4个字符1个，其余符号每个计1"""
+    cjk = len(_CJK_RE.findall(text))
+    words = _WORD_RE.findall(text)
+    word_tokens = sum((len(w) + 3) // 4 for w in words)
+    other = len(text) - cjk - sum(len(w) for w in words) - text.count(' ') - text.count('\n')
+    return cjk + word_tokens + max(0, other) + 4
+
+
+class ConversationHistory:
+    """按token预算截断的对话历史，用法与原来的消息列表相同
+
+    超出预算时一次性截断到low_water比例以下，之后的若干次请求共享同一段前缀，
+    便于服务端复用提示词前缀缓存，也避免每次请求都改动历史开头。
+    所有读写都在内部锁中进行，可以在多个线程之间共享（如main.py中的全局历史）。
+
+    Args:
+        max_tokens: 历史的token上限
+        policy: 'truncate'直接丢弃最早的消息；'summarize'用summarizer把丢弃的消息压缩成摘要
+        summarizer: 输入被丢弃的消息，返回摘要文本
+        low_water: 截断后保留的token比例
+    """
+
+    def __init__(self, max_tokens: int = 4000, policy: str = 'truncate',
+                 summarizer: Optional[Callable[[List[Dict[str, str]]], str]] = None,
+                 low_water: float = 0.75):
+        if policy not in ('truncate', 'summarize'):
+            raise ValueError(f"未知的历史截断策略: {policy}")
+        self.max_tokens = max_tokens
+        self.policy = policy
+        self.summarizer = summarizer
+        self.low_water = low_water
+        self._messages: Deque[Dict[str, str]] = deque()
+        self._tokens: Deque[int] = deque()
+        self.total_tokens = 0
+        self.trimmed = 0
+        # 可重入，summarizer中读取历史不会死锁
+        self._lock = threading.RLock()
+
+    def append(self, message: Dict[str, str]):
+        tokens = estimate_tokens(message.get('content', ''))
+        with self._lock:
+            self._messages.append(message)
+            self._tokens.append(tokens)
+            self.total_tokens += tokens
+            if self.total_tokens > self.max_tokens:
+                self._trim()
+
+    def append_and_list(self, message: Dict[str, str]) -> List[Dict[str, str]]:
+        """追加一条消息并返回追加后的历史，两步之间不会插入其他线程的修改"""
+        with self._lock:
+            self.append(message)
+            return list(self._messages)
+
+    def extend(self, messages: Iterable[Dict[str, str]]):
+        with self._lock:
+            for message in messages:
+                self.append(message)
+
+    def _popleft(self) -> Dict[str, str]:
+        self.total_tokens -= self._tokens.popleft()
+        self.trimmed += 1
+        return self._messages.popleft()
+
+    def _trim(self):
+        target = int(self.max_tokens * self.low_water)
+        removed = []
+        # 至少保留最新一条消息
+        while len(self._messages) > 1 and self.total_tokens > target:
+            removed.append(self._popleft())
+        # 历史必须以用户消息开头
+        while len(self._messages) > 1 and self._messages[0].get('role') != 'user':
+            removed.append(self._popleft())
+
+        if removed and self.policy == 'summarize' and self.summarizer is not None:
+            summary = self.summarizer(removed)
+            if summary:
+                first = self._messages.popleft()
+                self.total_tokens -= self._tokens.popleft()
+                self._messages.appendleft(dict(first, content=f"此前对话摘要：{summary}\n{first['content']}"))
+                self._tokens.appendleft(estimate_tokens(self._messages[0]['content']))
+                self.total_tokens += self._tokens[0]
+
+    def clear(self):
+        with self._lock:
+            self._messages.clear()
+            self._tokens.clear()
+            self.total_tokens = 0
+
+    def to_list(self) -> List[Dict[str, str]]:
+        """返回可直接作为请求messages发送的列表"""
+        with self._lock:
+            return list(self._messages)
+
+    def __iter__(self):
+        # 遍历的是副本，其他线程同时追加时不会出错
+        return iter(self.to_list())
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __getitem__(self, index: int) -> Dict[str, str]:
+        with self._lock:
+            return self._messages[index]
+
+
+class HistoryStore:
+    """各后端的对话历史和请求大小统计"""
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None, policy: str = 'truncate',
+                 summarizer: Optional[Callable[[List[Dict[str, str]]], str]] = None):
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.policy = policy
+        self.summarizer = summarizer
+        self._histories: Dict[str, ConversationHistory] = {}
+        self._metrics: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str) -> ConversationHistory:
+        with self._lock:
+            if provider not in self._histories:
+                self._histories[provider] = ConversationHistory(
+                    self.budgets.get(provider, 4000), self.policy, self.summarizer)
+            return self._histories[provider]
+
+    def record_request(self, provider: str, payload_bytes: int):
+        """记录一次请求发送的字节数"""
+        with self._lock:
+            item = self._metrics.setdefault(provider, {'requests': 0, 'bytes_total': 0, 'bytes_last': 0, 'bytes_max': 0})
+            item['requests'] += 1
+            item['bytes_total'] += payload_bytes
+            item['bytes_last'] = payload_bytes
+            item['bytes_max'] = max(item['bytes_max'], payload_bytes)
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """各后端的请求次数、平均/最近/最大请求字节数和当前历史token数"""
+        with self._lock:
+            result: Dict[str, Dict[str, float]] = {}
+            for provider, item in self._metrics.items():
+                result[provider] = dict(item, bytes_mean=item['bytes_total'] / item['requests'])
+            for provider, history in self._histories.items():
+                entry = result.setdefault(provider, {})
+                with history._lock:
+                    entry['history_messages'] = len(history)
+                    entry['history_tokens'] = history.total_tokens
+                    entry['trimmed'] = history.trimmed
+            return result
@@ -1,27 +1,53 @@
 import re
 import json
-from typing import Dict, List, Optional, Tuple, Any
-import requests
+import html as html_lib
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 from bs4 import BeautifulSoup, Tag
-from sparkai.llm.llm import ChatSparkLLM, ChunkPrintHandler
-from sparkai.core.messages import ChatMessage
 from prompts import HTML_GENERATION, HTML_MODIFICATION, HTML_EXAMPLE, get_example_content
 import os
-from volcenginesdkarkruntime import Ark
-import httpx
-import jieba
-import jieba.posseg as pseg
+from clients import ARK_EXTRA_HEADERS, get_client
+from token_manager import post_qianfan, qianfan_tokens
+from llm_cache import cached_chat
+from async_providers import fan_out, run as run_async
+from document_index import DocumentIndex
+from text_search import AhoCorasick, TextSearchIndex
+from batch_edit import BatchEditor
+from streaming import STREAM_BACKENDS, StreamingGeneration
+from html_parts import HtmlParts
+from history import HistoryStore
+from document_store import DocumentStore, open_store
+from patch import Patch
+from tracing import text_bytes, tracer
+from generation import DEFAULT_OUTPUT_PATH, GenerationJob, GenerationPipeline, build_prompt, default_output_path
+from local_rewrite import apply_edits, is_literal_replacement, plan_text_rewrites, strip_quotes
 
 
 class HTMLModifier:
     """处理HTML生成和修改的核心类"""
 
-    def __init__(self):
-        self.conversation_history_qianfan: List[Dict[str, str]] = []
-        self.conversation_history_spark: List[Dict[str, str]] = []
-        self.conversation_history_doubao: List[Dict[str, str]] = []
-        self.conversation_history_deepseek: List[Dict[str, str]] = []
+    def __init__(self, output_path: Optional[str] = DEFAULT_OUTPUT_PATH):
+        """
+        Args:
+            output_path: 修改时读写的HTML文件，为None时文档只保存在内存中（多会话场景）。
+                使用默认文件时各后端的生成结果仍保存到各自的文件（output_spark.html等），
+                指定其他文件时生成结果也保存到该文件
+        """
+        self.output_path = output_path
+        # 最近一次生成或修改后的文档
+        self.html: Optional[str] = None
+        # 各后端的对话历史按token预算截断，并统计每次请求发送的字节数
+        self.histories = HistoryStore()
+        self.conversation_history_qianfan = self.histories.get('qianfan')
+        self.conversation_history_spark = self.histories.get('spark')
+        self.conversation_history_doubao = self.histories.get('doubao')
+        self.conversation_history_deepseek = self.histories.get('deepseek')
         self.html_parts: Dict[str, Any] = {}
+        # 当前文档版本的解析索引，文档内容变化时重建
+        self._index: Optional[DocumentIndex] = None
+        # 精准修改时同时发往AI的片段数上限
+        self.max_concurrency = 4
+        # 精准修改时把多个片段合并到一个请求中，单个请求最多包含的片段数
+        self.max_batch_size = 20
         self.keyword_mapping = {
             # 中文关键词到HTML元素的映射
             '头部': 'head',
@@ -38,165 +64,141 @@ class HTMLModifier:
             '图片': 'img',
             '全部': 'all'
         }
+        self.level_mapping = {
+            '一级标题': 'h1',
+            '二级标题': 'h2',
+            '三级标题': 'h3',
+            '产品标题': '.product h3'
+        }
+        # 指令中所有可能用到的短语，一次扫描全部找出
+        self._phrase_matcher = AhoCorasick(
+            list(self.keyword_mapping) + list(self.level_mapping)
+            + ['完整', '整个', '内容标题', '标题', '内容', '产品', '名称']
+        )
+        # 文档文本节点的倒排索引，文档更新时增量同步
+        self._text_search = TextSearchIndex()
+        # HTML生成流程，不依赖本对象的对话历史，多个生成任务可以并发执行
+        self.generation = GenerationPipeline()
+        if output_path is None:
+            self.generation.replace_stage('persist', lambda ctx: None)
 
     def clear_history_qianfan(self):
         """清空对话历史和HTML解析结果"""
-        self.conversation_history_qianfan = []
+        self.conversation_history_qianfan.clear()
         self.html_parts = {}
 
     def clear_history_spark(self):
         """清空对话历史和HTML解析结果"""
-        self.conversation_history_spark = []
+        self.conversation_history_spark.clear()
         self.html_parts = {}
 
     def clear_history_doubao(self):
         """清空对话历史和HTML解析结果"""
-        self.conversation_history_doubao = []
+        self.conversation_history_doubao.clear()
         self.html_parts = {}
 
     def clear_history_deepseek(self):
         """清空对话历史和HTML解析结果"""
-        self.conversation_history_deepseek = []
+        self.conversation_history_deepseek.clear()
         self.html_parts = {}
 
     def _get_access_token_qianfan(self) -> str:
-        """获取百度千帆API的访问令牌"""
-        url = "https://aip.baidubce.com/oauth/2.0/token"
-        params = {
-            "client_id": os.environ.get("QIANFAN_API_KEY"),
-            "client_secret": os.environ.get("QIANFAN_SECRET_KEY"),
-            "grant_type": "client_credentials"
-        }
-        response = requests.post(url, params=params)
-        return response.json()['access_token']
+        """获取百度千帆API的访问令牌（带缓存）"""
+        return qianfan_tokens.get_token()
 
+    @cached_chat('spark', 'lite')
     def _chat_spark(self, content: str) -> str:
         """与讯飞星火AI聊天并获取响应"""
-        spark = ChatSparkLLM(
-            spark_api_url='wss://spark-api.xf-yun.com/v1.1/chat',
-            spark_app_id='54f0b31e',
-            spark_api_key=os.environ.get("SPARK_API_KEY"),
-            spark_api_secret=os.environ.get("SPARK_SECRET_KEY"),
-            spark_llm_domain='lite',
-            streaming=False,
-        )
+        from sparkai.core.messages import ChatMessage
+        from sparkai.llm.llm import ChunkPrintHandler
+        spark = get_client('spark')
         messages = [ChatMessage(
             role="user",
             content=content
         )]
+        self.histories.record_request('spark', len(content.encode('utf-8')))
         handler = ChunkPrintHandler()
         a = spark.generate([messages], callbacks=[handler])
         return a.generations[0][0].message.content
 
     def _chat_qianfan(self, content: str) -> str:
         """与百度千帆AI聊天并获取响应"""
-        self.conversation_history_qianfan.append({"role": "user", "content": content})
+        messages = self.conversation_history_qianfan.append_and_list({"role": "user", "content": content})
 
         payload = json.dumps({
-            "messages": self.conversation_history_qianfan,
+            "messages": messages,
             "temperature": 0.5
         })
+        self.histories.record_request('qianfan', len(payload.encode('utf-8')))
 
-        url = f"https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions_pro?access_token={self._get_access_token_qianfan()}"
-        response = requests.post(url, headers={'Content-Type': 'application/json'}, data=payload)
-        return response.json()['result']
+        return self._complete_qianfan(payload)
+
+    @cached_chat('qianfan', 'completions_pro', 0.5)
+    def _complete_qianfan(self, payload: str) -> str:
+        """发送千帆请求，请求体包含完整的对话历史，以整个请求体作为缓存键"""
+        return post_qianfan(payload).json()['result']
 
     def _chat_doubao(self, content: str) -> str:
         """与豆包AI聊天并获取响应"""
         self.conversation_history_doubao.append({"role": "user", "content": content})
-
-        client = Ark(
-            # 此为默认路径，您可根据业务所在地域进行配置
-            base_url="https://ark.cn-beijing.volces.com/api/v3",
-            # 从环境变量中获取您的 API Key。此为默认方式，您可根据需要进行修改
-            api_key=os.environ.get("ARK_API_KEY"),
-        )
-
-        completion = client.chat.completions.create(
-            # 指定您创建的方舟推理接入点 ID，此处已帮您修改为您的推理接入点 ID
-            model="ep-20250329165324-l8vxt",
-            messages=[
-                {"role": "system", "content": "你是前端UI生成师."},
-                {"role": "user", "content": f"{content}"},
-            ],
-            extra_headers={'x-is-encrypted': 'true'},
-        )
-        return completion.choices[0].message.content
+        self.histories.record_request('doubao', len(content.encode('utf-8')))
+        return self._complete_doubao(self._ark_messages(content))
 
     def _chat_deepseek(self, content: str) -> str:
         """与豆包AI聊天并获取响应"""
         self.conversation_history_deepseek.append({"role": "user", "content": content})
-
-        client = Ark(
-            # 此为默认路径，您可根据业务所在地域进行配置
-            base_url="https://ark.cn-beijing.volces.com/api/v3",
-            # 从环境变量中获取您的 API Key。此为默认方式，您可根据需要进行修改
-            api_key=os.environ.get("DS_API_KEY"),
-        )
-
-        completion = client.chat.completions.create(
+        self.histories.record_request('deepseek', len(content.encode('utf-8')))
+        return self._complete_deepseek(self._ark_messages(content))
+
+    @staticmethod
+    def _ark_messages(content: str) -> str:
+        """方舟请求的消息列表，序列化后作为缓存键"""
+        return json.dumps([
+            {"role": "system", "content": "你是前端UI生成师."},
+            {"role": "user", "content": content},
+        ], ensure_ascii=False)
+
+    @staticmethod
+    def _complete_ark(name: str, messages: str) -> str:
+        completion = get_client(name).chat.completions.create(
             # 指定您创建的方舟推理接入点 ID，此处已帮您修改为您的推理接入点 ID
             model="ep-20250329165324-l8vxt",
-            messages=[
-                {"role": "system", "content": "你是前端UI生成师."},
-                {"role": "user", "content": f"{content}"},
-            ],
-            extra_headers={'x-is-encrypted': 'true'},
+            messages=json.loads(messages),
+            extra_headers=ARK_EXTRA_HEADERS,
         )
         return completion.choices[0].message.content
 
-    def _parse_html(self, html_content: str) -> Dict[str, Any]:
-        """解析HTML并提取关键部分"""
-        soup = BeautifulSoup(html_content, 'html.parser')
-
-        parts = {
-            'head': str(soup.head) if soup.head else "",
-            'title': soup.title.string if soup.title else "无页面标题",
-            'h1': [str(h) for h in soup.find_all('h1')],
-            'h2': [str(h) for h in soup.find_all('h2')],
-            'h3': [str(h) for h in soup.find_all('h3')],
-            'nav': [str(nav) for nav in soup.find_all('nav')],
-            'footer': str(soup.footer) if soup.footer else "",
-            'body': str(soup.body) if soup.body else "",
-            'scripts': [str(script) for script in soup.find_all('script')],
-            'styles': [str(style) for style in soup.find_all('style')],
-            'paragraphs': [str(p) for p in soup.find_all('p')],
-            'links': [str(a) for a in soup.find_all('a')],
-            'images': [str(img) for img in soup.find_all('img')],
-            '.product h3': [str(h3) for h3 in soup.select('.product h3')]
-        }
+    @cached_chat('doubao', 'ep-20250329165324-l8vxt')
+    def _complete_doubao(self, messages: str) -> str:
+        return self._complete_ark('doubao', messages)
+
+    @cached_chat('deepseek', 'ep-20250329165324-l8vxt')
+    def _complete_deepseek(self, messages: str) -> str:
+        return self._complete_ark('deepseek', messages)
 
-        # 智能识别导航和页脚
-        if not parts['nav']:
-            parts['nav'] = [str(div) for div in soup.find_all(class_=['nav', 'navbar', 'navigation'])]
-        if not parts['footer']:
-            footer_div = soup.find(class_=['footer', 'bottom'])
-            if footer_div:
-                parts['footer'] = str(footer_div)
+    def _get_index(self, html: str) -> DocumentIndex:
+        """返回该文档版本的索引，同一内容只解析一次"""
+        if self._index is None or (self._index.html is not html and self._index.html != html):
+            with tracer.span('parse', target='index', html_chars=len(html)):
+                self._index = DocumentIndex(html)
+        return self._index
 
-        return parts
+    @tracer.traced('parse')
+    def _parse_html(self, html_content: str) -> HtmlParts:
+        """解析HTML并提取关键部分，各部分在首次访问时才从源码中切出"""
+        return HtmlParts.from_html(html_content)
 
     def _extract_content_keywords(self, text: str, html_content: str) -> List[Dict[str, Any]]:
         """从HTML内容中提取与用户输入文本相匹配的关键词及其相关信息"""
-        soup = BeautifulSoup(html_content, 'html.parser')
-        text_elements = []
-
-        for element in soup.find_all(text=True):
-            if element.parent.name not in ['script', 'style'] and element.strip():
-                text_elements.append({
-                    'text': element.strip(),
-                    'element': element.parent,
-                    'full_text': str(element.parent)
-                })
+        self._text_search.sync(self._get_index(html_content))
 
         matched_texts = []
-        for item in text_elements:
-            if item['text'] in text or text in item['text']:
-                matched_texts.append({
-                    'text': item['text'],
-                    'element': item['element'],
-                    'full_text': item['full_text']
-                })
+        for element in self._text_search.match(text):
+            matched_texts.append({
+                'text': element.strip(),
+                'element': element.parent,
+                'full_text': str(element.parent)
+            })
 
         return matched_texts
 
@@ -207,29 +209,24 @@ class HTMLModifier:
             if content_keywords:
                 return content_keywords
 
-        if '全部' in text or '完整' in text or '整个' in text:
+        phrases = self._phrase_matcher.find_all(text)
+
+        if '全部' in phrases or '完整' in phrases or '整个' in phrases:
             return ['全部']
 
-        if '内容标题' in text or ('标题' in text and '内容' in text):
+        if '内容标题' in phrases or ('标题' in phrases and '内容' in phrases):
             return ['h1', 'header h1']
 
-        level_mapping = {
-            '一级标题': 'h1',
-            '二级标题': 'h2',
-            '三级标题': 'h3',
-            '产品标题': '.product h3'
-        }
-
-        for phrase, tag in level_mapping.items():
-            if phrase in text:
+        for phrase, tag in self.level_mapping.items():
+            if phrase in phrases:
                 return [tag]
 
-        if ('产品' in text and ('标题' in text or '名称' in text)) or '产品标题' in text:
+        if ('产品' in phrases and ('标题' in phrases or '名称' in phrases)) or '产品标题' in phrases:
             return ['.product h3']
 
         found_keywords = []
         for chinese_key, english_key in self.keyword_mapping.items():
-            if chinese_key in text:
+            if chinese_key in phrases:
                 found_keywords.append(english_key)
 
         return found_keywords if found_keywords else ['全部']
@@ -246,23 +243,20 @@ class HTMLModifier:
             - full_text: 包含目标文本的完整父元素文本
             - element: BeautifulSoup元素对象
         """
-        from bs4 import BeautifulSoup
-
-        soup = BeautifulSoup(html, 'html.parser')
+        index = self._get_index(html)
         matches = []
 
-        # 使用 string 替代已弃用的 text 参数
-        for text_node in soup.find_all(string=lambda t: target_text in str(t)):
+        for text_node in index.strings_containing(target_text):
             parent = text_node.parent
-            full_text = str(parent)
-            start_pos = html.find(full_text)
+            span = index.element_span(parent)
 
-            if start_pos != -1:
+            if span is not None:
                 matches.append({
-                    'start': start_pos,
-                    'end': start_pos + len(full_text),
-                    'full_text': full_text,
-                    'element': text_node
+                    'start': span[0],
+                    'end': span[1],
+                    'full_text': html[span[0]:span[1]],
+                    'element': text_node,
+                    'parent': parent
                 })
 
         return matches
@@ -290,121 +284,58 @@ class HTMLModifier:
 
         return None, None
 
-    def generate_html_qianfan(self, request_content: str) -> str:
-        """生成HTML文件"""
-        self.clear_history_qianfan()
-        #prompt = HTML_GENERATION.format(request=request_content) + get_example_content()
-        prompt = f"""
-                请根据以下要求修改下面的HTML文件：
-                {request_content}
-                HTML文件：
-                {get_example_content()}
-                """
-        text = self._chat_qianfan(prompt)
-
-        if "```" not in text:
-            raise ValueError("未检测到有效的HTML代码块")
-
-        html_code = text.split("```")[1].strip()
-        if html_code.startswith("html"):
-            html_code = html_code[4:].strip()
-
-        self.html_parts = self._parse_html(html_code)
+    def _generate(self, provider: str, request_content: str) -> str:
+        """通过统一的生成流程生成HTML文件"""
+        getattr(self, f"clear_history_{provider}")()
+        ctx = self.generation.run(GenerationJob(request_content, provider, output_path=self._generation_path(provider)))
+        self.html = ctx.html
+        self.html_parts = ctx.parts
+        return "HTML文件已生成并解析完成。"
 
-        with open('output.html', 'w', encoding='utf-8') as f:
-            f.write(html_code)
+    def _generation_path(self, provider: str) -> Optional[str]:
+        """生成结果的保存位置"""
+        if self.output_path == DEFAULT_OUTPUT_PATH:
+            return default_output_path(provider)
+        return self.output_path
 
-        return "HTML文件已生成并解析完成。"
+    def generate_html_qianfan(self, request_content: str) -> str:
+        """生成HTML文件"""
+        return self._generate('qianfan', request_content)
 
     def generate_html_spark(self, request_content: str) -> str:
         """生成HTML文件"""
-        self.clear_history_spark()
-        #prompt = HTML_GENERATION.format(request=request_content) + get_example_content()
-        prompt = f"""
-        将以下代码按照{request_content}的要求修改：
-        {get_example_content()}
-        """
-        text = self._chat_spark(prompt)
-
-        if "```" not in text:
-            raise ValueError("未检测到有效的HTML代码块")
-
-        html_code = text.split("```")[1].strip()
-        if html_code.startswith("html"):
-            html_code = html_code[4:].strip()
-
-        self.html_parts = self._parse_html(html_code)
-
-        with open('output_spark.html', 'w', encoding='utf-8') as f:
-            f.write(html_code)
-
-        return "HTML文件已生成并解析完成。"
+        return self._generate('spark', request_content)
 
     def generate_html_doubao(self, request_content: str) -> str:
-        """生成HTML文件（增强版）"""
-        self.clear_history_doubao()
-        #prompt = HTML_GENERATION.format(request=request_content) + HTML_EXAMPLE
-        prompt = f"""
-                将以下代码按照{request_content}的要求修改：
-                {get_example_content()}
-                """
-        text = self._chat_doubao(prompt)
-
-        # 更健壮的代码块提取
-        if "```html" in text:
-            html_code = text.split("```html")[1].split("```")[0].strip()
-        elif "```" in text:
-            parts = text.split("```")
-            # 取第二个代码块（通常第一个是语言标记）
-            html_code = parts[1].strip() if len(parts) > 2 else parts[1].strip()
-            if html_code.lower().startswith("html"):
-                html_code = html_code[4:].strip()
-        else:
-            raise ValueError("未检测到有效的HTML代码块")
-
-        # CSS验证
-        if "<style>" in html_code:
-            style_content = html_code.split("<style>")[1].split("</style>")[0]
-            if "font-family" in style_content and not style_content.strip().endswith(";"):
-                # 自动修复缺少分号的情况
-                html_code = html_code.replace("font-family", "font-family;")
-
-        # 保存前验证基本结构
-        if not all(tag in html_code for tag in ["<!DOCTYPE", "<html", "<head", "<body"]):
-            raise ValueError("生成的HTML缺少基本结构")
-
-        self.html_parts = self._parse_html(html_code)
-
-        try:
-            with open('output_doubao.html', 'w', encoding='utf-8') as f:
-                f.write(html_code)
-            return "HTML文件已生成并解析完成。"
-        except IOError as e:
-            raise ValueError(f"文件保存失败: {str(e)}")
+        """生成HTML文件（校验基本结构）"""
+        return self._generate('doubao', request_content)
 
     def generate_html_deepseek(self, request_content: str) -> str:
         """生成HTML文件"""
-        self.clear_history_deepseek()
-        #prompt = HTML_GENERATION.format(request=request_content) + get_example_content()
-        prompt = f"""
-        将以下代码按照{request_content}的要求修改：
-        {get_example_content()}
-        """
-        text = self._chat_deepseek(prompt)
-
-        if "```" not in text:
-            raise ValueError("未检测到有效的HTML代码块")
+        return self._generate('deepseek', request_content)
 
-        html_code = text.split("```")[1].strip()
-        if html_code.startswith("html"):
-            html_code = html_code[4:].strip()
+    def generate_html_stream(self, request_content: str, provider: str = 'spark',
+                             output_path: Optional[str] = None) -> Iterator[str]:
+        """流式生成HTML文件，边生成边写入文件并解析
 
-        self.html_parts = self._parse_html(html_code)
+        Args:
+            request_content: 生成要求
+            provider: 使用的后端，qianfan/spark/doubao/deepseek
+            output_path: 输出文件，默认与generate_html_*方法保存到同一个文件
 
-        with open('output_deepseek.html', 'w', encoding='utf-8') as f:
-            f.write(html_code)
+        Returns:
+            逐块返回写入文件的HTML代码，迭代结束时html_parts已更新
+        """
+        getattr(self, f"clear_history_{provider}")()
+        prompt = build_prompt(provider, request_content)
+        output_path = output_path or self._generation_path(provider)
+        # 生成成功后作为一个版本交给文档存储，由存储原子写入输出文件
+        commit = (lambda html: open_store(output_path).commit(html, source=provider)) if output_path else None
 
-        return "HTML文件已生成并解析完成。"
+        generation = StreamingGeneration(output_path, commit)
+        yield from generation.run(STREAM_BACKENDS[provider](prompt))
+        self.html = generation.html
+        self.html_parts = generation.parts
 
     def modify_html(self, request_content: str) -> str:
         """智能修改HTML内容，只将需要修改的部分发送给AI
@@ -415,63 +346,88 @@ class HTMLModifier:
         Returns:
             操作结果消息
         """
-        try:
-            # 1. 读取HTML文件
-            with open('output.html', 'r', encoding='utf-8') as f:
-                current_html = f.read()
-        except Exception as e:
-            raise IOError(f"读取HTML文件失败: {str(e)}")
+        with tracer.span('modify_html', request_bytes=text_bytes(request_content)) as span:
+            result = self._modify_html(request_content, span)
+            span.set(result=result)
+            return result
+
+    def _modify_html(self, request_content: str, span) -> str:
+        """依次尝试本地替换、精准修改、结构修改和完整修改，span记录最终到达的方式（tier）"""
+        # 1. 读取HTML文件
+        current_html = self._load_html()
+        if span:
+            span.set(html_bytes=text_bytes(current_html))
 
         # 2. 尝试解析用户指令
         target_text, new_text = self._parse_modification_command(request_content)
 
-        # 3. 如果指令明确，尝试精准修改
+        # 3. 纯文字替换直接在本地完成，不调用AI
+        if target_text and new_text and is_literal_replacement(request_content, target_text, new_text):
+            span.set(tier='local')
+            edits, count = plan_text_rewrites(self._get_index(current_html),
+                                              strip_quotes(target_text), strip_quotes(new_text))
+            if count:
+                with tracer.span('apply', edits=len(edits)):
+                    updated_html = apply_edits(current_html, edits)
+                self._save_updated_html(updated_html, edits)
+                return f"成功完成{count}处精准修改"
+            span.event('fallback', reason="本地未找到目标文字")
+
+        # 4. 如果指令明确，尝试精准修改
         if target_text and new_text:
-            # print(target_text)
-            # print(new_text)
+            span.set(tier='precise')
             try:
-                # 3.1 查找所有需要修改的上下文片段
+                # 4.1 查找所有需要修改的上下文片段
                 contexts = self._extract_modification_contexts(current_html, target_text)
-                print(contexts)
+                span.set(contexts=len(contexts))
                 if contexts:
+                    # 4.2 只将相关片段发送给AI处理，所有片段打包成少量请求，多个请求并发发送
+                    editor = BatchEditor(
+                        lambda prompts: run_async(fan_out(prompts, provider='spark', limit=self.max_concurrency)),
+                        self._parse_ai_response,
+                        max_batch_size=self.max_batch_size
+                    )
+                    modified_contexts = editor.edit(request_content, [ctx['context'] for ctx in contexts])
+                    span.set(llm_requests=editor.request_count)
                     modifications = []
-                    for ctx in contexts:
-                        # 3.2 只将相关片段发送给AI处理
-                        prompt = f"根据指令'{request_content}'修改以下HTML片段:\n{ctx['context']}"
-                        #print(prompt)
-                        ai_response = self._chat_spark(prompt)
-                        #print(ai_response)
-                        modified_context = self._parse_ai_response(ai_response)
-
-                        # 3.3验证修改后的HTML结构
+                    for ctx, modified_context in zip(contexts, modified_contexts):
+                        # 4.3验证修改后的HTML结构
                         if not self._validate_html_structure(modified_context):
                             raise ValueError("AI返回的HTML结构无效")
 
                         modifications.append({
                             'modified_context': modified_context,
                             'position': ctx['position'],
+                            'text_span': ctx['text_span'],
                             'original_text': ctx['original_text']
                         })
-                        print(modifications)
-                    # 3.4 应用所有修改
-                    updated_html = self._apply_modifications(current_html, modifications)
-                    self._save_updated_html(updated_html)
+                    # 4.4 应用所有修改
+                    updated_html, edits = self._apply_modifications(current_html, modifications)
+                    if updated_html == current_html:
+                        raise ValueError("AI返回的片段没有修改任何内容")
+                    self._save_updated_html(updated_html, edits)
                     return f"成功完成{len(modifications)}处精准修改"
 
                 # 如果没有找到目标文本，继续尝试其他方式
                 print(f"未找到文本'{target_text}'，尝试其他修改方式")
+                span.event('fallback', reason="未找到目标文本")
             except Exception as e:
                 print(f"精准修改失败: {str(e)}，尝试其他方式")
+                span.event('fallback', reason=str(e))
 
-        # 4. 尝试HTML结构修改
+        # 5. 尝试HTML结构修改
+        span.set(tier='structure')
         try:
             modify_result = self._modify_html_structure(current_html, request_content)
             if modify_result == "HTML部分修改成功！":
                 return modify_result
+            span.event('fallback', reason=modify_result)
         except Exception as e:
             print(f"结构修改失败: {str(e)}，尝试完整修改")
+            span.event('fallback', reason=str(e))
 
-        # 5. 最后尝试：完整HTML修改
+        # 6. 最后尝试：完整HTML修改
+        span.set(tier='full')
         try:
             prompt = HTML_MODIFICATION.format(
                 elements=f"HTML文档部分内容:\n{current_html[:5000]}...",  # 限制长度
@@ -486,22 +442,26 @@ class HTMLModifier:
 
     def _extract_modification_contexts(self, html: str, target_text: str) -> list:
         """提取包含目标文本的HTML片段及其位置"""
-        soup = BeautifulSoup(html, 'html.parser')
+        index = self._get_index(html)
         contexts = []
+        seen = set()
 
-        for text_node in soup.find_all(string=lambda t: target_text in str(t)):
-            parent = text_node.parent
-            full_text = str(parent)
-            start_pos = html.find(full_text)
+        for text_node in index.strings_containing(target_text):
+            span = index.element_span(text_node.parent)
 
-            if start_pos != -1:
+            # 同一元素中的多个文本节点只发送一次
+            if span is not None and span not in seen:
+                seen.add(span)
                 contexts.append({
-                    'context': full_text,
-                    'position': (start_pos, start_pos + len(full_text))
+                    'context': html[span[0]:span[1]],
+                    'position': span,
+                    'text_span': index.text_span(text_node),
+                    'original_text': str(text_node)
                 })
 
         return contexts
 
+    @tracer.traced('validate')
     def _validate_html_structure(self, html_fragment: str) -> bool:
         """验证HTML片段结构是否合法"""
         from bs4 import BeautifulSoup
@@ -514,35 +474,42 @@ class HTMLModifier:
         except:
             return False
 
-    def _apply_modifications(self, original_html: str, modifications: list) -> str:
-        """将修改应用到原始HTML，处理结构化修改片段"""
-        from bs4 import BeautifulSoup
+    @tracer.traced('apply')
+    def _apply_modifications(self, original_html: str,
+                             modifications: list) -> Tuple[str, List[Tuple[int, int, str]]]:
+        """将修改后的片段作为源码替换一次性应用到原始HTML，片段之外的内容保持不变
 
-        updated_html = original_html
-        soup = BeautifulSoup(updated_html, 'html.parser')
+        Returns:
+            (修改后的HTML, 合并后的(起点, 终点, 新内容)替换列表)
+
+        Raises:
+            ValueError: 某个片段无法对应到原文档中的位置
+        """
+        patch = Patch(original_html)
 
         for mod in modifications:
             # 解析AI返回的修改片段
             modified_soup = BeautifulSoup(mod['modified_context'], 'html.parser')
-
-            # 查找原始位置对应的元素
-            original_fragment = soup.find(string=lambda t: mod['original_text'] in str(t))
-            if not original_fragment:
-                continue
-
-            original_parent = original_fragment.parent
+            start, end = mod['position']
 
             # 处理不同类型的修改片段
-            if modified_soup.find(class_='modified-section'):
+            section = modified_soup.find(class_='modified-section')
+            if section is not None:
                 # 如果是带有特定class的div，替换整个父元素
-                new_content = modified_soup.find(class_='modified-section')
-                original_parent.replace_with(new_content)
+                patch.replace(start, end, str(section))
+            elif modified_soup.find() is not None:
+                # 返回的仍是HTML元素，原样替换原元素的源码
+                patch.replace(start, end, mod['modified_context'])
+            elif mod.get('text_span'):
+                # 只返回了文字，替换原文本节点
+                patch.replace(*mod['text_span'], html_lib.escape(modified_soup.get_text(), quote=False))
             else:
-                # 普通文本修改
-                original_fragment.replace_with(modified_soup.get_text())
+                # 不能静默丢弃，否则会在文档未变的情况下报告修改成功
+                raise ValueError(f"无法定位'{mod.get('original_text', '')}'所在的文本节点")
 
-        return str(soup)
+        return patch.apply(), patch.splices
 
+    @tracer.traced('extract')
     def _parse_ai_response(self, ai_response: str) -> str:
         """解析AI返回的HTML内容"""
         if "```html" in ai_response:
@@ -559,17 +526,15 @@ class HTMLModifier:
 
         if not matches:
             # 尝试模糊匹配
-            soup = BeautifulSoup(html, 'html.parser')
-            for element in soup.find_all(text=True):
+            for element in self._get_index(html).strings:
                 if target_text in str(element):
                     parent = element.parent
-                    full_text = str(parent)
-                    start_pos = html.find(full_text)
-                    if start_pos != -1:
+                    span = self._get_index(html).element_span(parent)
+                    if span is not None:
                         matches.append({
-                            'start': start_pos,
-                            'end': start_pos + len(full_text),
-                            'full_text': full_text,
+                            'start': span[0],
+                            'end': span[1],
+                            'full_text': html[span[0]:span[1]],
                             'element': element,
                             'parent': parent
                         })
@@ -600,14 +565,15 @@ class HTMLModifier:
             raise ValueError(f"AI没有保持原标签结构，期望<{original_tag}>标签")
 
         # 执行替换
-        updated_html = html[:matches[0]['start']] + new_part + html[matches[0]['end']:]
+        patch = Patch(html)
+        patch.replace(matches[0]['start'], matches[0]['end'], new_part)
 
-        self._save_updated_html(updated_html)
+        self._save_updated_html(patch.apply(), patch.splices)
         return "文本内容修改成功！"
 
     def _modify_html_structure(self, html: str, request_content: str) -> str:
         """修改HTML结构"""
-        soup = BeautifulSoup(html, 'html.parser')
+        index = self._get_index(html)
         keywords = self._extract_chinese_keywords(request_content, html)
 
         if "全部" in keywords:
@@ -624,8 +590,9 @@ class HTMLModifier:
                     updated_html = updated_html[4:].strip()
             else:
                 return "AI返回格式不正确"
+            edits = None
         else:
-            elements_to_modify = self._find_elements_to_modify(soup, keywords)
+            elements_to_modify = self._find_elements_to_modify(index, keywords)
 
             if not elements_to_modify:
                 return "未找到与关键词对应的HTML部分"
@@ -655,33 +622,40 @@ class HTMLModifier:
             else:
                 return "AI返回格式不正确"
 
-            # 精确替换HTML部分
-            updated_html = html
+            # 按源码位置替换第一个能定位到的元素，不重新序列化也不在全文中查找
+            patch = Patch(html)
             for element in elements_to_modify:
-                if element and str(element) in updated_html:
-                    updated_html = updated_html.replace(str(element), new_part, 1)
+                span = index.element_span(element) if element else None
+                if span is not None:
+                    patch.replace(span[0], span[1], new_part)
                     break
+            updated_html = patch.apply()
+            edits = patch.splices or None
 
-        self._save_updated_html(updated_html)
+        self._save_updated_html(updated_html, edits)
         return "HTML部分修改成功！"
 
-    def _find_elements_to_modify(self, soup: BeautifulSoup, keywords: List[str]) -> List[Tag]:
+    def _find_elements_to_modify(self, index: DocumentIndex, keywords: List[Any]) -> List[Tag]:
         """查找需要修改的元素"""
+        soup = index.soup
         elements_to_modify = []
 
         for keyword in keywords:
-            if keyword == 'header h1':
-                header = soup.find('header')
+            if isinstance(keyword, dict):
+                # 按内容匹配到的元素与索引共用同一棵文档树
+                elements_to_modify.append(keyword['element'])
+            elif keyword == 'header h1':
+                header = index.find('header')
                 if header:
                     elements_to_modify.extend(header.find_all('h1'))
             elif keyword.startswith('.'):
                 elements_to_modify.extend(soup.select(keyword))
             elif keyword in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                main = soup.find('main')
+                main = index.find('main')
                 if main:
                     elements_to_modify.extend(main.find_all(keyword))
                 else:
-                    elements_to_modify.extend(soup.find_all(keyword))
+                    elements_to_modify.extend(index.find_all(keyword))
             elif keyword in self.html_parts:
                 if keyword == 'title':
                     elements_to_modify.append(soup.title)
@@ -690,18 +664,68 @@ class HTMLModifier:
                 elif keyword == 'body':
                     elements_to_modify.append(soup.body)
                 elif keyword == 'footer':
-                    footer = soup.find('footer') or soup.find(class_=['footer', 'bottom'])
+                    footer = index.find('footer') or next(iter(index.find_by_class(['footer', 'bottom'])), None)
                     if footer:
                         elements_to_modify.append(footer)
                 elif keyword == 'nav':
-                    nav = soup.find('nav') or soup.find(class_=['nav', 'navbar'])
+                    nav = index.find('nav') or next(iter(index.find_by_class(['nav', 'navbar'])), None)
                     if nav:
                         elements_to_modify.append(nav)
 
         return elements_to_modify
 
-    def _save_updated_html(self, html: str):
-        """保存更新后的HTML"""
-        with open('output.html', 'w', encoding='utf-8') as f:
-            f.write(html)
+    def _store(self) -> DocumentStore:
+        return open_store(self.output_path)
+
+    def _load_html(self) -> str:
+        """读取当前文档，内存模式下直接返回最近一次的结果"""
+        if self.output_path is None:
+            if self.html is None:
+                raise IOError("读取HTML文件失败: 当前会话还没有生成HTML")
+            return self.html
+        try:
+            store = self._store()
+            # 文件被其他程序改写过时先读入
+            store.refresh()
+        except Exception as e:
+            raise IOError(f"读取HTML文件失败: {str(e)}")
+        if store.text is None:
+            raise IOError(f"读取HTML文件失败: 找不到{self.output_path}")
+        return store.text
+
+    def undo(self) -> str:
+        """撤销最近一次生成或修改"""
+        return self._switch_version(redo=False)
+
+    def redo(self) -> str:
+        """重做最近一次撤销的修改"""
+        return self._switch_version(redo=True)
+
+    def _switch_version(self, redo: bool) -> str:
+        if self.output_path is None:
+            return "内存模式不保存修改历史，无法撤销或重做"
+        store = self._store()
+        html = store.redo() if redo else store.undo()
+        if html is None:
+            return "没有可以重做的修改" if redo else "没有可以撤销的修改"
+        self.html = html
         self.html_parts = self._parse_html(html)
+        return f"已{'重做' if redo else '撤销'}，当前为版本{store.head}"
+
+    def _save_updated_html(self, html: str, edits: Optional[List[Tuple[int, int, str]]] = None):
+        """保存更新后的HTML
+
+        Args:
+            html: 修改后的完整HTML
+            edits: 本次修改对应的(起点, 终点, 新内容)列表，提供时增量更新html_parts
+        """
+        with tracer.span('save', html_chars=len(html)) as span:
+            if self.output_path is not None:
+                # 只在日志中追加本次的替换，文件由存储在后台批量原子写入
+                self._store().commit(html, edits)
+            self.html = html
+            if edits and isinstance(self.html_parts, HtmlParts) and self.html_parts.apply_edits(edits, expected=html):
+                span.set(incremental=True)
+                return
+            span.set(incremental=False)
+            self.html_parts = self._parse_html(html)
@@ -0,0 +1,246 @@
+import bisect
+import html as html_lib
+import re
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+from source_locator import SourceLocator
+
+
+Span = Tuple[int, int]
+Edit = Tuple[int, int, str]
+
+LIST_TAGS = {'h1': 'h1', 'h2': 'h2', 'h3': 'h3', 'nav': 'nav', 'script': 'scripts',
+             'style': 'styles', 'p': 'paragraphs', 'a': 'links', 'img': 'images'}
+SINGLE_TAGS = ('head', 'footer', 'body', 'title')
+
+PART_KEYS = ('head', 'title', 'h1', 'h2', 'h3', 'nav', 'footer', 'body', 'scripts', 'styles',
+             'paragraphs', 'links', 'images', '.product h3')
+
+# 每个对外的部分依赖哪些内部记录的片段
+_DEPENDS = {key: (key,) for key in PART_KEYS}
+_DEPENDS.update({
+    'title': ('title', 'title_text'),
+    'nav': ('nav', 'nav_class'),
+    'footer': ('footer', 'footer_class'),
+})
+
+# 记录的是字符串节点而不是元素
+_STRING_KEYS = {'title_text'}
+
+_COMMENT_OPEN_RE = re.compile(r'<!--')
+_COMMENT_CLOSE_RE = re.compile(r'-->')
+
+
+class PartsScanner(SourceLocator):
+    """扫描HTML源码，记录html_parts各部分对应的源码片段位置
+
+    Args:
+        base: 片段在整个文档中的起始偏移，扫描局部片段时使用
+        inside_product: 片段是否位于class为product的元素内部
+    """
+
+    def __init__(self, base: int = 0, inside_product: bool = False):
+        super().__init__()
+        self.base = base
+        self.inside_product = inside_product
+        self.spans: Dict[str, List[Span]] = {}
+
+    def _add(self, key: str, start: int, end: int):
+        self.spans.setdefault(key, []).append((self.base + start, self.base + end))
+
+    def on_element(self, name: str, attrs: list, start: int, end: int):
+        if name in LIST_TAGS:
+            self._add(LIST_TAGS[name], start, end)
+        if name in SINGLE_TAGS:
+            self._add(name, start, end)
+        classes = set()
+        for key, value in attrs:
+            if key == 'class' and value:
+                classes.update(value.split())
+        if classes & {'nav', 'navbar', 'navigation'}:
+            self._add('nav_class', start, end)
+        if classes & {'footer', 'bottom'}:
+            self._add('footer_class', start, end)
+        if 'product' in classes:
+            self._add('product', start, end)
+        if name == 'h3' and (self.inside_product or any(
+                'product' in (value or '').split()
+                for _, _, ancestor_attrs in self._stack
+                for key, value in ancestor_attrs if key == 'class')):
+            self._add('.product h3', start, end)
+
+    def on_string(self, start: int, end: int, parent: Optional[str]):
+        if parent == 'title':
+            self._add('title_text', start, end)
+
+
+class HtmlParts(Mapping):
+    """与HTMLModifier._parse_html结果结构相同的只读映射
+
+    只保存各部分在源码中的位置，取值时才切出字符串并缓存。
+    局部修改后通过apply_edits只更新受影响的条目，其余条目仅平移位置。
+    """
+
+    def __init__(self, source: str, spans: Dict[str, List[Span]], balanced: bool = True):
+        self.source = source
+        # 文档中存在未闭合的标签时，元素的范围可能随修改变化，不能增量更新
+        self.balanced = balanced
+        self._spans = {key: sorted(value) for key, value in spans.items()}
+        self._cache: Dict[str, Any] = {}
+        # 注释起止标记的位置，首次判断修改位置时才扫描，源码变化后作废
+        self._comments: Optional[Tuple[List[int], List[int]]] = None
+
+    @classmethod
+    def from_html(cls, html: str) -> 'HtmlParts':
+        scanner = PartsScanner()
+        scanner.feed_chunk(html)
+        scanner.finish()
+        return cls.from_scanner(scanner)
+
+    @classmethod
+    def from_scanner(cls, scanner: PartsScanner) -> 'HtmlParts':
+        """由已经输入结束的扫描器创建"""
+        return cls(scanner.html, scanner.spans, balanced=scanner.unbalanced == 0)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _DEPENDS:
+            raise KeyError(key)
+        if key not in self._cache:
+            self._cache[key] = self._compute(key)
+        return self._cache[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in _DEPENDS
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(PART_KEYS)
+
+    def __len__(self) -> int:
+        return len(PART_KEYS)
+
+    def _slices(self, key: str) -> List[str]:
+        return [self.source[s:e] for s, e in self._spans.get(key, [])]
+
+    def _first(self, key: str) -> str:
+        spans = self._spans.get(key)
+        return self.source[spans[0][0]:spans[0][1]] if spans else ""
+
+    def _compute(self, key: str) -> Any:
+        if key == 'title':
+            titles = self._spans.get('title')
+            if not titles:
+                return "无页面标题"
+            start, end = titles[0]
+            inner = [(s, e) for s, e in self._spans.get('title_text', []) if start < s < end]
+            # 与BeautifulSoup的Tag.string一致：只有一个字符串子节点时才有值
+            return html_lib.unescape(self.source[inner[0][0]:inner[0][1]]) if len(inner) == 1 else None
+        if key == 'nav':
+            return self._slices('nav') or self._slices('nav_class')
+        if key == 'footer':
+            return self._first('footer') or self._first('footer_class')
+        if key in ('head', 'body'):
+            return self._first(key)
+        return self._slices(key)
+
+    def apply_edits(self, edits: Sequence[Edit], expected: Optional[str] = None) -> bool:
+        """在源码上应用若干互不重叠的(起点, 终点, 新内容)替换，并增量更新各部分
+
+        Args:
+            edits: 基于当前源码的替换列表
+            expected: 替换后应得到的完整源码，用于校验
+
+        Returns:
+            增量更新是否成功，失败时调用方应重新解析整个文档
+        """
+        if not self.balanced:
+            return False
+        # 从后往前处理，每处修改的检查都基于未修改的源码，最后一次拼接出新源码
+        pieces = []
+        last = len(self.source)
+        for start, end, replacement in sorted(edits, reverse=True):
+            if end > last or not self._apply_one(start, end, replacement):
+                return False
+            pieces.append(self.source[end:last])
+            pieces.append(replacement)
+            last = start
+        pieces.append(self.source[:last])
+        self.source = "".join(reversed(pieces))
+        self._comments = None
+        return expected is None or self.source == expected
+
+    def _apply_one(self, start: int, end: int, replacement: str) -> bool:
+        old = self.source[start:end]
+        if not (_is_local(old) and _is_local(replacement)):
+            return False
+        if self._inside_markup(start):
+            return False
+        text_only = '<' not in old + replacement and '>' not in old + replacement
+        if not text_only and any(s < start and end < e for key in ('scripts', 'styles')
+                                 for s, e in self._spans.get(key, [])):
+            return False
+        if any(s < start and end < e for s, e in self._spans.get('title', [])) and not (text_only and any(
+                s <= start and end <= e for s, e in self._spans.get('title_text', []))):
+            # title内部除了修改文字以外的改动都可能改变它的字符串子节点
+            return False
+        scanner = PartsScanner(base=start, inside_product=any(
+            s < start and end < e for s, e in self._spans.get('product', [])))
+        scanner.feed_chunk(replacement)
+        scanner.finish()
+        if scanner.unbalanced:
+            return False
+
+        delta = len(replacement) - (end - start)
+        changed = set()
+        for key, spans in self._spans.items():
+            updated = []
+            for s, e in spans:
+                if key in _STRING_KEYS and text_only and s <= start and end <= e:
+                    # 紧邻或位于字符串内的文字修改会并入该字符串，删空时字符串随之消失
+                    if e + delta > s:
+                        updated.append((s, e + delta))
+                    changed.add(key)
+                elif e <= start:
+                    updated.append((s, e))
+                elif s >= end:
+                    updated.append((s + delta, e + delta))
+                elif s < start and end < e:
+                    # 修改发生在该元素内部
+                    updated.append((s, e + delta))
+                    changed.add(key)
+                else:
+                    changed.add(key)
+            self._spans[key] = updated
+
+        for key, spans in scanner.spans.items():
+            target = self._spans.setdefault(key, [])
+            for span in spans:
+                bisect.insort(target, span)
+            changed.add(key)
+
+        for key, depends in _DEPENDS.items():
+            if changed.intersection(depends):
+                self._cache.pop(key, None)
+        return True
+
+    def _inside_markup(self, pos: int) -> bool:
+        """位置是否处于标签或注释内部，此时修改的是属性或注释而不是元素内容"""
+        if self.source.rfind('<', 0, pos) > self.source.rfind('>', 0, pos):
+            return True
+        if self._comments is None:
+            self._comments = ([m.start() for m in _COMMENT_OPEN_RE.finditer(self.source)],
+                              [m.start() for m in _COMMENT_CLOSE_RE.finditer(self.source)])
+        opens, closes = self._comments
+        # 与在source[:pos]中rfind相同：标记必须完整地位于pos之前
+        i = bisect.bisect_right(opens, pos - 4) - 1
+        j = bisect.bisect_right(closes, pos - 3) - 1
+        return i >= 0 and (j < 0 or opens[i] > closes[j])
+
+
+def _is_local(fragment: str) -> bool:
+    """片段是纯文本，或者是首尾完整、标签配对的HTML，替换它不会改变外部结构"""
+    if '<' not in fragment and '>' not in fragment:
+        return True
+    stripped = fragment.strip()
+    if not (stripped.startswith('<') and stripped.endswith('>')):
+        return False
+    return SourceLocator(fragment).unbalanced == 0
+
@@ -0,0 +1,173 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import threading
+from typing import Dict, Iterable, Optional
+
+
+# 预构建词典的位置，可通过环境变量 JIEBA_DICT_CACHE 指定；部署时可先运行本模块生成
+DEFAULT_PATH = os.environ.get(
+    "JIEBA_DICT_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'jieba_dict.bin'),
+)
+WORD_FREQ = 100000
+
+_MAGIC = b"MGJD1\0"
+# 魔数, 指纹, 词条数, 总词频，补齐到64字节使后面的数组对齐
+_HEADER = struct.Struct('<6s32sIQ14x')
+
+
+def fingerprint(words: Iterable[str], freq: int = WORD_FREQ) -> bytes:
+    """词典内容的指纹：jieba版本、附加词表和字节序任一变化都需要重新构建"""
+    import jieba
+    raw = "\x1f".join([jieba.__version__, sys.byteorder, str(freq)] + sorted(set(words)))
+    return hashlib.sha256(raw.encode('utf-8')).digest()
+
+
+class MmapFreq:
+    """jieba词频表的只读实现，词条按UTF-8字节排序存放在内存映射文件中
+
+    打开文件不需要读取或解析内容，查找用二分法；多个进程共享同一份物理内存。
+    运行时新增的词（jieba.add_word）保存在内存中的字典里。
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"词典文件为空: {path}")
+        magic, self.fingerprint, count, self.total = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"不是预构建的词典文件: {path}")
+        self._count = count
+        view = memoryview(self._mm)
+        start = _HEADER.size
+        # 第i个词条的字节范围为offsets[i]:offsets[i+1]（相对于词条区）
+        self._offsets = view[start:start + (count + 1) * 4].cast('I')
+        start += (count + 1) * 4
+        self._freqs = view[start:start + count * 4].cast('I')
+        self._keys_start = start + count * 4
+        self._added: Dict[str, int] = {}
+
+    def _find(self, word: str) -> int:
+        key = word.encode('utf-8')
+        mm, offsets, base = self._mm, self._offsets, self._keys_start
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = mm[base + offsets[mid]:base + offsets[mid + 1]]
+            if current < key:
+                lo = mid + 1
+            elif current > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def get(self, word: str, default: Optional[int] = None) -> Optional[int]:
+        if word in self._added:
+            return self._added[word]
+        index = self._find(word)
+        return self._freqs[index] if index >= 0 else default
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._added or self._find(word) >= 0
+
+    def __getitem__(self, word: str) -> int:
+        value = self.get(word)
+        if value is None:
+            raise KeyError(word)
+        return value
+
+    def __setitem__(self, word: str, freq: int):
+        self._added[word] = freq
+
+    def __len__(self) -> int:
+        return self._count + len(self._added)
+
+    def close(self):
+        # 先释放对内存映射的引用，否则mmap无法关闭
+        for name in ('_offsets', '_freqs'):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+        self._mm.close()
+        self._file.close()
+
+
+def build(path: str, words: Iterable[str], freq: int = WORD_FREQ):
+    """用jieba默认词典加上附加词表生成预构建词典（只需运行一次，约需1秒）"""
+    import jieba
+    words = sorted(set(words))
+    tokenizer = jieba.Tokenizer()
+    tokenizer.initialize()
+    for word in words:
+        tokenizer.add_word(word, freq=freq)
+
+    entries = sorted((word.encode('utf-8'), value) for word, value in tokenizer.FREQ.items())
+    offsets = [0]
+    for key, _ in entries:
+        offsets.append(offsets[-1] + len(key))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, fingerprint(words, freq), len(entries), tokenizer.total))
+        f.write(struct.pack(f'={len(offsets)}I', *offsets))
+        f.write(struct.pack(f'={len(entries)}I', *(value for _, value in entries)))
+        for key, _ in entries:
+            f.write(key)
+    os.replace(tmp, path)
+
+
+_build_lock = threading.Lock()
+
+
+def load_tokenizer(words: Iterable[str], path: str = DEFAULT_PATH, freq: int = WORD_FREQ):
+    """返回包含附加词表的jieba分词器，词频表直接映射预构建文件
+
+    文件不存在或与词表不一致时先重新构建；无法写入时退回jieba的常规初始化。
+    """
+    import jieba
+    words = sorted(set(words))
+    expected = fingerprint(words, freq)
+    with _build_lock:
+        table = _open(path, expected)
+        if table is None:
+            try:
+                build(path, words, freq)
+                table = _open(path, expected)
+            except OSError as e:
+                print(f"预构建分词词典失败: {str(e)}，使用常规初始化")
+        tokenizer = jieba.Tokenizer()
+        if table is None:
+            for word in words:
+                tokenizer.add_word(word, freq=freq)
+            return tokenizer
+    tokenizer.FREQ = table
+    tokenizer.total = table.total
+    tokenizer.initialized = True
+    return tokenizer
+
+
+def _open(path: str, expected: bytes) -> Optional[MmapFreq]:
+    try:
+        table = MmapFreq(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    if table.fingerprint != expected:
+        table.close()
+        return None
+    return table
+
+
+if __name__ == "__main__":
+    from device_classifier import DeviceClassifier
+
+    build(DEFAULT_PATH, DeviceClassifier().vocabulary)
+    print(f"分词词典已生成: {DEFAULT_PATH}")
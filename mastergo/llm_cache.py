@@ -0,0 +1,178 @@
+import asyncio
+import functools
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from tracing import text_bytes, tracer
+
+
+def normalize_prompt(prompt: str) -> str:
+    """合并空白字符，使缩进不同但内容相同的提示词命中同一缓存"""
+    return re.sub(r'\s+', ' ', prompt).strip()
+
+
+def make_key(provider: str, model: str, prompt: str, temperature: Optional[float] = None) -> str:
+    """根据后端、模型、规范化后的提示词和温度计算缓存键"""
+    raw = "\x1f".join([provider, model, normalize_prompt(prompt), repr(temperature)])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """大模型响应缓存：内存LRU + TTL，可选SQLite磁盘持久化"""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 24 * 3600,
+                 path: Optional[str] = None):
+        """
+        Args:
+            max_entries: 内存中最多保留的条目数
+            ttl: 条目有效秒数，None表示永不过期
+            path: 磁盘缓存文件路径，None表示只使用内存
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            self.open_disk(path)
+
+    def open_disk(self, path: str):
+        """启用磁盘缓存，重启后仍然有效"""
+        with self._lock:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                if not self._expired(item[1]):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return item[0]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and not self._expired(row[1]):
+                    self._remember(key, row[0], row[1])
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str):
+        created = time.time()
+        with self._lock:
+            self._remember(key, value, created)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created) VALUES (?, ?, ?)",
+                    (key, value, created)
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, value: str, created: float):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中统计"""
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._memory),
+                'hit_rate': (self.hits + self.disk_hits) / total if total else 0.0,
+            }
+
+
+# 设置环境变量 LLM_CACHE_PATH 即可开启磁盘缓存
+llm_cache = LLMCache(path=os.environ.get("LLM_CACHE_PATH"))
+
+
+def cached_chat(provider: str, model: str, temperature: Optional[float] = None,
+                cache: Optional[LLMCache] = None) -> Callable:
+    """为聊天函数加上响应缓存的装饰器，提示词取最后一个位置参数或content参数
+
+    同时支持同步函数和协程函数，只缓存非空的字符串响应。
+    缓存键只包含这一个参数，发送对话历史的后端应把包含历史的完整请求体作为该参数传入，
+    否则会把一段对话中的回复返回给另一段对话。
+    开启追踪时每次调用记录一个provider阶段，包含提示词和响应的字节数以及是否命中缓存。
+    """
+    def decorator(fn: Callable) -> Callable:
+        def key_for(args, kwargs) -> str:
+            content = kwargs['content'] if 'content' in kwargs else args[-1]
+            return make_key(provider, model, content, kwargs.get('temperature', temperature))
+
+        store = cache or llm_cache
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span('provider', provider=provider, model=model) as span:
+                    key = key_for(args, kwargs)
+                    hit = store.get(key)
+                    if hit is None:
+                        result = await fn(*args, **kwargs)
+                        if isinstance(result, str) and result:
+                            store.set(key, result)
+                    else:
+                        result = hit
+                    if span:
+                        _describe(span, args, kwargs, result, hit is not None)
+                    return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span('provider', provider=provider, model=model) as span:
+                key = key_for(args, kwargs)
+                hit = store.get(key)
+                if hit is None:
+                    result = fn(*args, **kwargs)
+                    if isinstance(result, str) and result:
+                        store.set(key, result)
+                else:
+                    result = hit
+                if span:
+                    _describe(span, args, kwargs, result, hit is not None)
+                return result
+        return wrapper
+
+    return decorator
+
+
+def _describe(span, args, kwargs, result, hit: bool):
+    content = kwargs['content'] if 'content' in kwargs else args[-1]
+    span.set(cache='hit' if hit else 'miss', prompt_bytes=text_bytes(content),
+             response_bytes=text_bytes(result if isinstance(result, str) else None))
@@ -0,0 +1,142 @@
+import html as html_lib
+import re
+from typing import List, Optional, Tuple
+from bs4.element import PreformattedString
+from document_index import DocumentIndex
+from patch import apply_splices
+
+
+QUOTES = "'\"“”‘’「」"
+
+# 整条指令只能是一次带引号的替换，引号内不能再出现引号，结尾最多一个句末标点
+_QUOTED_RE = re.compile(
+    r"\s*请?\s*[将把]\s*['\"“‘「]([^'\"“”‘’「」]+)['\"”’」]\s*(?:修改为|改为|改成|替换为)\s*"
+    r"['\"“‘「]([^'\"“”‘’「」]*)['\"”’」]\s*[。.!！]?\s*"
+)
+
+# 与html.unescape相同的字符引用写法
+_CHARREF_RE = re.compile(r"&(#[0-9]+;?|#[xX][0-9a-fA-F]+;?|[^\t\n\f <&#;]{1,32};?)")
+
+
+def strip_quotes(text: str) -> str:
+    """去掉指令中包裹文字的引号"""
+    return text.strip(QUOTES)
+
+
+def is_literal_replacement(command: str, target_text: str, new_text: str) -> bool:
+    """判断“将A改为B”是否为纯文字替换
+
+    只有整条指令就是一次目标和新内容都带引号的替换时才视为文字替换。不带引号的指令（如“将导航改为竖排”）
+    往往是布局或样式要求，后面还有其他要求的复合指令（如“将'首页'改为'主页'，并把字体改成红色”）
+    也不能只做替换，都交给大模型处理。
+    """
+    if not target_text:
+        return False
+    return _QUOTED_RE.fullmatch(command) is not None
+
+
+def _replace_outside_charrefs(raw: str, decoded: str, target: str, replacement: str) -> Optional[Tuple[str, int]]:
+    """在文本节点的源码中替换目标文字，字符引用只会被整个替换或原样保留
+
+    Args:
+        raw: 文本节点的源码
+        decoded: 文本节点的内容
+        target: 要替换的文字（解码后）
+        replacement: 替换成的源码
+
+    Returns:
+        (新源码, 替换次数)；源码与内容对应不上，或目标只覆盖了某个引用解码结果的一部分时返回None
+    """
+    # starts[i]为第i个解码字符所在单元的源码起点，单元是一个普通字符或一个字符引用
+    starts: List[int] = []
+    boundaries = set()
+    chars = []
+    last = 0
+    for match in _CHARREF_RE.finditer(raw):
+        for pos in range(last, match.start()):
+            boundaries.add(len(starts))
+            starts.append(pos)
+            chars.append(raw[pos])
+        text = html_lib.unescape(match.group())
+        boundaries.add(len(starts))
+        starts.extend([match.start()] * len(text))
+        chars.append(text)
+        last = match.end()
+    for pos in range(last, len(raw)):
+        boundaries.add(len(starts))
+        starts.append(pos)
+        chars.append(raw[pos])
+    boundaries.add(len(starts))
+    starts.append(len(raw))
+    if "".join(chars) != decoded:
+        return None
+
+    pieces = []
+    copied = 0
+    count = 0
+    i = decoded.find(target)
+    while i != -1:
+        j = i + len(target)
+        if i not in boundaries or j not in boundaries:
+            return None
+        pieces.append(raw[copied:starts[i]])
+        pieces.append(replacement)
+        copied = starts[j]
+        count += 1
+        i = decoded.find(target, j)
+    pieces.append(raw[copied:])
+    return "".join(pieces), count
+
+
+def plan_text_rewrites(index: DocumentIndex, target_text: str,
+                       new_text: str) -> Tuple[List[Tuple[int, int, str]], int]:
+    """计算在可见文本节点里替换目标文字所需的源码修改，不触碰标签、属性、脚本和样式
+
+    Returns:
+        ([(起点, 终点, 新源码), ...], 替换次数)
+    """
+    source = index.html
+    escaped_target = html_lib.escape(target_text, quote=False)
+    replacement = html_lib.escape(new_text, quote=True)
+    edits: List[Tuple[int, int, str]] = []
+    count = 0
+
+    for node in index.strings_containing(target_text):
+        if isinstance(node, PreformattedString):
+            continue
+        if node.parent is None or node.parent.name in ('script', 'style'):
+            continue
+        span = index.text_span(node)
+        if span is None:
+            continue
+        raw = source[span[0]:span[1]]
+        # 只替换字符引用之外的文字，保留其他实体写法，也不会改到“&copy;”这类引用的内部
+        result = _replace_outside_charrefs(raw, str(node), target_text, replacement)
+        if result is None:
+            # 目标文字只覆盖了某个引用的一部分，整个文本节点重新转义
+            result = (html_lib.escape(str(node), quote=False).replace(escaped_target, replacement),
+                      str(node).count(target_text))
+        new_raw, replaced = result
+        if not replaced:
+            continue
+        count += replaced
+        edits.append((span[0], span[1], new_raw))
+
+    return sorted(edits), count
+
+
+def apply_edits(source: str, edits: List[Tuple[int, int, str]]) -> str:
+    """一次拼接应用互不重叠的(起点, 终点, 新源码)修改"""
+    return apply_splices(source, edits)
+
+
+def rewrite_text_nodes(index: DocumentIndex, target_text: str, new_text: str) -> Tuple[str, int]:
+    """直接在源码中替换可见文本节点里的目标文字
+
+    Returns:
+        (修改后的HTML, 替换次数)，未找到目标文字时返回原HTML和0
+    """
+    edits, count = plan_text_rewrites(index, target_text, new_text)
+    if not edits:
+        return index.html, 0
+    return apply_edits(index.html, edits), count
@@ -2,15 +2,17 @@ import os
 import json
 import time
 from prompt import PROMPT
-from sparkai.llm.llm import ChatSparkLLM
-from sparkai.core.messages import ChatMessage
-from volcenginesdkarkruntime import Ark
-import requests
-from typing import Dict, List
+from clients import ARK_EXTRA_HEADERS, get_client
+from token_manager import post_qianfan, qianfan_tokens
+from llm_cache import cached_chat
+from device_classifier import DeviceClassifier
+from history import HistoryStore
+from tracing import tracer
+from collections import deque
 
 class DialogHistory:
     def __init__(self, max_length=3):
-        self.history = []
+        self.history = deque(maxlen=max_length)
         self.max_length = max_length
 
     def add(self, user_input: str, response: str):
@@ -19,8 +21,6 @@ class DialogHistory:
             "system": response,
             "timestamp": time.time()
         })
-        if len(self.history) > self.max_length:
-            self.history.pop(0)
 
     def get_context(self):
         return "\n======\n".join(
@@ -30,101 +30,119 @@ class DialogHistory:
 
 
 history = DialogHistory()
-conversation_history_doubao: List[Dict[str, str]] = []
-conversation_history_qianfan: List[Dict[str, str]] = []
-conversation_history_deepseek: List[Dict[str, str]] = []
+classifier = DeviceClassifier()
+histories = HistoryStore()
+conversation_history_doubao = histories.get('doubao')
+conversation_history_qianfan = histories.get('qianfan')
+conversation_history_deepseek = histories.get('deepseek')
 
+@cached_chat('spark', 'lite')
 def chat_spark(content: str) -> str:
     """完全由Spark大模型识别需要操作的设备"""
-    spark = ChatSparkLLM(
-        spark_api_url='wss://spark-api.xf-yun.com/v1.1/chat',
-        spark_app_id='54f0b31e',
-        spark_api_key=os.environ.get("SPARK_API_KEY"),
-        spark_api_secret=os.environ.get("SPARK_SECRET_KEY"),
-        spark_llm_domain='lite',
-        streaming=False,
-    )
+    from sparkai.core.messages import ChatMessage
+    spark = get_client('spark')
 
     messages = [ChatMessage(role="user", content=content)]
     response = spark.generate([messages]).generations[0][0].message.content
     return response.strip()
 
 def get_access_token_qianfan() -> str:
-    """获取百度千帆API的访问令牌"""
-    url = "https://aip.baidubce.com/oauth/2.0/token"
-    params = {
-        "client_id": os.environ.get("QIANFAN_API_KEY"),
-        "client_secret": os.environ.get("QIANFAN_SECRET_KEY"),
-        "grant_type": "client_credentials"
-    }
-    response = requests.post(url, params=params)
-    return response.json()['access_token']
+    """获取百度千帆API的访问令牌（带缓存）"""
+    return qianfan_tokens.get_token()
+
+@cached_chat('qianfan', 'completions_pro', 0.5)
+def _complete_qianfan(payload: str) -> str:
+    """发送千帆请求，请求体包含完整的对话历史，以整个请求体作为缓存键"""
+    return post_qianfan(payload).json()['result']
+
+def _ark_messages(content: str) -> str:
+    """方舟请求的消息列表，序列化后作为缓存键"""
+    return json.dumps([
+        {"role": "system", "content": "你是前端UI生成师."},
+        {"role": "user", "content": content},
+    ], ensure_ascii=False)
+
+def _complete_ark(name: str, messages: str) -> str:
+    completion = get_client(name).chat.completions.create(
+        # 指定您创建的方舟推理接入点 ID，此处已帮您修改为您的推理接入点 ID
+        model="ep-20250329165324-l8vxt",
+        messages=json.loads(messages),
+        extra_headers=ARK_EXTRA_HEADERS,
+    )
+    return completion.choices[0].message.content
+
+@cached_chat('doubao', 'ep-20250329165324-l8vxt')
+def _complete_doubao(messages: str) -> str:
+    return _complete_ark('doubao', messages)
+
+@cached_chat('deepseek', 'ep-20250329165324-l8vxt')
+def _complete_deepseek(messages: str) -> str:
+    return _complete_ark('deepseek', messages)
 
 def chat_qianfan(content: str) -> str:
     """与百度千帆AI聊天并获取响应"""
-    conversation_history_qianfan.append({"role": "user", "content": content})
+    messages = conversation_history_qianfan.append_and_list({"role": "user", "content": content})
 
     payload = json.dumps({
-        "messages": conversation_history_qianfan,
+        "messages": messages,
         "temperature": 0.5
     })
+    histories.record_request('qianfan', len(payload.encode('utf-8')))
 
-    url = f"https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions_pro?access_token={get_access_token_qianfan()}"
-    response = requests.post(url, headers={'Content-Type': 'application/json'}, data=payload)
-    return response.json()['result']
+    return _complete_qianfan(payload)
 
 def chat_doubao(content: str) -> str:
     """与豆包AI聊天并获取响应"""
     conversation_history_doubao.append({"role": "user", "content": content})
+    histories.record_request('doubao', len(content.encode('utf-8')))
+    return _complete_doubao(_ark_messages(content))
 
-    client = Ark(
-        # 此为默认路径，您可根据业务所在地域进行配置
-        base_url="https://ark.cn-beijing.volces.com/api/v3",
-        # 从环境变量中获取您的 API Key。此为默认方式，您可根据需要进行修改
-        api_key=os.environ.get("ARK_API_KEY"),
-    )
+def chat_deepseek(content: str) -> str:
+    """与DeepSeek聊天并获取响应"""
+    conversation_history_deepseek.append({"role": "user", "content": content})
+    histories.record_request('deepseek', len(content.encode('utf-8')))
+    return _complete_deepseek(_ark_messages(content))
 
-    completion = client.chat.completions.create(
-        # 指定您创建的方舟推理接入点 ID，此处已帮您修改为您的推理接入点 ID
-        model="ep-20250329165324-l8vxt",
-        messages=[
-            {"role": "system", "content": "你是前端UI生成师."},
-            {"role": "user", "content": f"{content}"},
-        ],
-        extra_headers={'x-is-encrypted': 'true'},
+def _device_prompt(user_input: str) -> str:
+    return PROMPT.format(
+        user_input=user_input,
+        history=history.get_context()
     )
-    return completion.choices[0].message.content
 
-def chat_deepseek(self, content: str) -> str:
-    """与豆包AI聊天并获取响应"""
-    self.conversation_history_deepseek.append({"role": "user", "content": content})
+def predict_device(user_input: str) -> str:
+    """识别需要操作的设备，不修改对话历史
+
+    可以在多个线程中提前调用（见voice_device.py），结果被采用时再调用record_device。
+    """
+    with tracer.span('get_device') as span:
+        # 简单指令由本地规则直接识别，只有不确定时才调用大模型
+        device = classifier.predict(user_input)
+        if device is not None:
+            span.set(source='rule', device=device)
+            return device
+
+        # 与chat_qianfan发送的请求相同，只是不把本次提示词写入历史
+        messages = conversation_history_qianfan.to_list()
+        messages.append({"role": "user", "content": _device_prompt(user_input)})
+        payload = json.dumps({
+            "messages": messages,
+            "temperature": 0.5
+        })
+        histories.record_request('qianfan', len(payload.encode('utf-8')))
 
-    client = Ark(
-        # 此为默认路径，您可根据业务所在地域进行配置
-        base_url="https://ark.cn-beijing.volces.com/api/v3",
-        # 从环境变量中获取您的 API Key。此为默认方式，您可根据需要进行修改
-        api_key=os.environ.get("DS_API_KEY"),
-    )
+        response = _complete_qianfan(payload)
+        span.set(source='llm', device=response)
+        return response
 
-    completion = client.chat.completions.create(
-        # 指定您创建的方舟推理接入点 ID，此处已帮您修改为您的推理接入点 ID
-        model="ep-20250329165324-l8vxt",
-        messages=[
-            {"role": "system", "content": "你是前端UI生成师."},
-            {"role": "user", "content": f"{content}"},
-        ],
-        extra_headers={'x-is-encrypted': 'true'},
-    )
-    return completion.choices[0].message.content
+def record_device(user_input: str, device: str):
+    """采用一次识别结果：由大模型识别的指令把提示词计入千帆对话历史"""
+    if classifier.predict(user_input) is None:
+        conversation_history_qianfan.append({"role": "user", "content": _device_prompt(user_input)})
 
 def get_device(user_input: str) -> str:
-    prompt = PROMPT.format(
-        user_input=user_input,
-        history=history.get_context()
-    )
-
-    response = chat_qianfan(prompt)
-    return response
+    device = predict_device(user_input)
+    record_device(user_input, device)
+    return device
 
 
 # 测试示例
@@ -0,0 +1,668 @@
+import base64
+import codecs
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import socket
+import ssl
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+from device_classifier import DEVICES
+
+
+QIANFAN_TOKEN_PATH = "/oauth/2.0/token"
+QIANFAN_CHAT_PATH = "/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions_pro"
+ARK_CHAT_PATH = "/api/v3/chat/completions"
+SPARK_PATH = "/v1.1/chat"
+
+# 录制模式下转发请求的真实服务
+UPSTREAMS = {
+    'qianfan': "https://aip.baidubce.com",
+    'ark': "https://ark.cn-beijing.volces.com",
+    'spark': "wss://spark-api.xf-yun.com",
+}
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+@dataclass
+class MockBehavior:
+    """模拟后端的响应特性
+
+    Args:
+        latency: 首个字符返回前的平均延迟（秒）
+        jitter: 延迟的标准差（秒）
+        error_rate: 请求失败的概率
+        chars_per_second: 生成速度，为0时整段回复立即返回
+        chunk_chars: 流式输出时每块的字符数
+    """
+    latency: float = 0.2
+    jitter: float = 0.05
+    error_rate: float = 0.0
+    chars_per_second: float = 20000.0
+    chunk_chars: int = 64
+
+
+def synthetic_html(size: int = 8000, seed: int = 0) -> str:
+    """生成接近真实页面结构的HTML（导航、产品列表、页脚、样式和脚本），长度约为size个字符"""
+    rng = random.Random(seed)
+    head = (
+        "<!DOCTYPE html>\n<html lang=\"zh-CN\">\n<head>\n<meta charset=\"UTF-8\">\n"
+        "<title>智能家居商城</title>\n<style>\nbody { font-family: sans-serif; margin: 0; }\n"
+        ".product { display: inline-block; width: 30%; margin: 1%; }\n"
+        ".product h3 { color: #333; }\n.price { color: #e4393c; }\n</style>\n</head>\n<body>\n"
+        "<nav><a href=\"#home\">首页</a> <a href=\"#products\">产品</a> <a href=\"#about\">关于我们</a></nav>\n"
+        "<h1>智能家居商城</h1>\n<h2>热门产品</h2>\n<div class=\"products\">\n"
+    )
+    tail = (
+        "</div>\n<footer><p>版权所有 © 智能家居商城</p></footer>\n"
+        "<script>\ndocument.querySelectorAll('.product').forEach(function (el) {\n"
+        "  el.addEventListener('click', function () { el.classList.toggle('active'); });\n});\n"
+        "</script>\n</body>\n</html>"
+    )
+    cards = []
+    length = len(head) + len(tail)
+    number = 0
+    while length < size:
+        number += 1
+        device = DEVICES[number % len(DEVICES)]
+        card = (
+            f"<div class=\"product\" id=\"product-{number}\">\n"
+            f"  <img src=\"images/{number}.png\" alt=\"{device}\">\n"
+            f"  <h3>{device} {number}号</h3>\n"
+            f"  <p>这款{device}支持语音控制和远程开关，适合{rng.choice(['客厅', '卧室', '厨房', '书房'])}使用。</p>\n"
+            f"  <span class=\"price\">¥{rng.randint(99, 9999)}</span>\n</div>\n"
+        )
+        cards.append(card)
+        length += len(card)
+    return head + "".join(cards) + tail
+
+
+class SyntheticResponder:
+    """根据提示词的类型生成合理的回复：设备识别返回设备名，片段修改原样返回片段，其余返回HTML页面"""
+
+    def __init__(self, html_bytes: int = 8000):
+        self.html_bytes = html_bytes
+
+    def __call__(self, provider: str, prompt: str) -> str:
+        if "<<<FRAGMENT" in prompt:
+            return prompt[prompt.index("<<<FRAGMENT"):]
+        if "HTML片段:\n" in prompt:
+            return "```html\n" + prompt.split("HTML片段:\n", 1)[1] + "\n```"
+        if "相互独立的用户指令" in prompt:
+            commands = re.findall(r"^\[(\d+)\] (.+)$", prompt, re.M)
+            return "\n".join(f"[{number}] {self._device(command)}" for number, command in commands)
+        match = re.search(r"用户指令：「(.*?)」", prompt, re.S)
+        if match:
+            return self._device(match.group(1))
+        return "以下是生成的页面：\n```html\n" + synthetic_html(self.html_bytes) + "\n```"
+
+    @staticmethod
+    def _device(command: str) -> str:
+        return DEVICES[zlib.crc32(command.encode('utf-8')) % len(DEVICES)]
+
+
+def request_key(provider: str, messages: List[dict], stream: bool) -> str:
+    """同一后端、同一组消息和相同的流式设置视为同一请求"""
+    raw = json.dumps([provider, messages, stream], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """录制与回放后端响应
+
+    record模式把请求转发给真实服务，并记录每块响应及其相对时间；replay模式按记录的节奏原样回放，
+    不访问网络。同一请求录制多次时按顺序轮流回放。
+
+    Args:
+        path: 记录文件（JSON）
+        mode: record / replay
+        speed: 回放速度倍数，为0时不等待
+        strict: 回放时请求不在记录中是否返回错误，否则改用模拟回复
+    """
+
+    def __init__(self, path: str, mode: str = 'replay', speed: float = 1.0, strict: bool = False):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"未知的录制模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._cursors: Dict[str, int] = {}
+        self.interactions: Dict[str, List[dict]] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.interactions = json.load(f).get('interactions', {})
+
+    def lookup(self, key: str) -> Optional[dict]:
+        with self._lock:
+            recorded = self.interactions.get(key)
+            if not recorded:
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            return recorded[cursor % len(recorded)]
+
+    def add(self, key: str, interaction: dict):
+        with self._lock:
+            self.interactions.setdefault(key, []).append(interaction)
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'version': 1, 'interactions': self.interactions}, ensure_ascii=False, indent=1)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    def replay(self, interaction: dict, send: Callable[[str], None]):
+        """按录制时的时间间隔依次发送各块响应"""
+        started = time.monotonic()
+        for offset, chunk in interaction['chunks']:
+            if self.speed > 0:
+                delay = started + offset / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            send(chunk)
+
+
+def _ws_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+
+
+def _ws_send(sock, text: str, opcode: int = 0x1, mask: bool = False):
+    payload = text.encode('utf-8')
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    if len(payload) < 126:
+        header.append(mask_bit | len(payload))
+    elif len(payload) < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack('>H', len(payload))
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack('>Q', len(payload))
+    if mask:
+        key = os.urandom(4)
+        header += key
+        payload = _ws_mask(payload, key)
+    sock.sendall(bytes(header) + payload)
+
+
+def _ws_mask(data: bytes, key: bytes) -> bytes:
+    if not data:
+        return data
+    stream = (key * (len(data) // 4 + 1))[:len(data)]
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(stream, 'big')).to_bytes(len(data), 'big')
+
+
+def _read_exact(rfile, size: int) -> bytes:
+    data = rfile.read(size)
+    if len(data) < size:
+        raise ConnectionError("WebSocket连接已断开")
+    return data
+
+
+def _ws_recv(rfile) -> Tuple[int, bytes]:
+    """读取一条完整消息，返回(操作码, 内容)，分片消息会被拼接"""
+    message = b""
+    message_opcode = None
+    while True:
+        first, second = _read_exact(rfile, 2)
+        opcode = first & 0x0F
+        size = second & 0x7F
+        if size == 126:
+            size = struct.unpack('>H', _read_exact(rfile, 2))[0]
+        elif size == 127:
+            size = struct.unpack('>Q', _read_exact(rfile, 8))[0]
+        key = _read_exact(rfile, 4) if second & 0x80 else None
+        payload = _read_exact(rfile, size)
+        if key:
+            payload = _ws_mask(payload, key)
+        if opcode >= 0x8:
+            # 控制帧可以夹在分片之间，直接返回
+            return opcode, payload
+        if message_opcode is None:
+            message_opcode = opcode
+        message += payload
+        if first & 0x80:
+            return message_opcode, message
+
+
+def spark_signed_url(api_url: str, api_key: str, api_secret: str) -> str:
+    """按讯飞开放平台的规则为WebSocket地址签名"""
+    parsed = urlparse(api_url)
+    date = formatdate(usegmt=True)
+    origin = f"host: {parsed.netloc}\ndate: {date}\nGET {parsed.path} HTTP/1.1"
+    signature = base64.b64encode(
+        hmac.new(api_secret.encode('utf-8'), origin.encode('utf-8'), hashlib.sha256).digest()).decode()
+    authorization = base64.b64encode(
+        f'api_key="{api_key}", algorithm="hmac-sha256", headers="host date request-line", '
+        f'signature="{signature}"'.encode('utf-8')).decode()
+    return api_url + "?" + urlencode({'authorization': authorization, 'date': date, 'host': parsed.netloc})
+
+
+def _ws_connect(url: str):
+    """连接WebSocket服务，返回(套接字, 读取用的文件对象)"""
+    parsed = urlparse(url)
+    secure = parsed.scheme == 'wss'
+    port = parsed.port or (443 if secure else 80)
+    sock = socket.create_connection((parsed.hostname, port), timeout=60)
+    if secure:
+        sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parsed.hostname)
+    key = base64.b64encode(os.urandom(16)).decode()
+    path = parsed.path + ("?" + parsed.query if parsed.query else "")
+    sock.sendall((
+        f"GET {path} HTTP/1.1\r\nHost: {parsed.netloc}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+    ).encode())
+    rfile = sock.makefile('rb')
+    status = rfile.readline().decode('latin-1')
+    if " 101 " not in status:
+        sock.close()
+        raise ConnectionError(f"WebSocket握手失败: {status.strip()}")
+    while rfile.readline() not in (b"\r\n", b""):
+        pass
+    return sock, rfile
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: '_MockHTTPServer'
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---- HTTP后端 ----
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if path == QIANFAN_TOKEN_PATH:
+            self._token(body)
+        elif path == QIANFAN_CHAT_PATH:
+            self._chat('qianfan', json.loads(body or b"{}"), body)
+        elif path == ARK_CHAT_PATH:
+            self._chat('ark', json.loads(body or b"{}"), body)
+        else:
+            self._send_json(404, {'error': f"未知路径: {path}"})
+
+    def _token(self, body: bytes):
+        mock = self.server.mock
+        if mock.cassette is not None and mock.cassette.mode == 'record':
+            # 令牌只转发不录制，回放时使用假令牌
+            import requests
+            response = requests.post(UPSTREAMS['qianfan'] + self.path, data=body, timeout=60)
+            self._send_json(response.status_code, response.json())
+            return
+        self._send_json(200, {'access_token': 'mock-token', 'expires_in': 2592000})
+
+    def _chat(self, provider: str, request: dict, body: bytes):
+        mock = self.server.mock
+        stream = bool(request.get('stream'))
+        key = request_key(provider, request.get('messages', []), stream)
+        mock.count(provider, 'requests')
+        if stream:
+            mock.count(provider, 'streamed')
+
+        cassette = mock.cassette
+        if cassette is not None and cassette.mode == 'record':
+            self._record_http(provider, key, body, stream)
+            return
+        if cassette is not None:
+            interaction = cassette.lookup(key)
+            if interaction is not None:
+                mock.count(provider, 'cassette_hits')
+                self._start_response(interaction['status'], interaction['content_type'], chunked=True)
+                cassette.replay(interaction, self._write_chunk)
+                self._end_chunked()
+                return
+            mock.count(provider, 'cassette_misses')
+            if cassette.strict:
+                self._send_json(404, {'error': "请求不在录制记录中"})
+                return
+
+        behavior = mock.behavior(provider)
+        prompt = request['messages'][-1]['content'] if request.get('messages') else ""
+        if mock.fail(behavior):
+            mock.count(provider, 'errors')
+            mock.sleep_first(behavior)
+            if provider == 'qianfan':
+                # 千帆的业务错误仍返回HTTP 200
+                self._send_json(200, {'error_code': 18, 'error_msg': "Open api qps request limit reached"})
+            else:
+                self._send_json(429, {'error': {'code': 'RateLimitExceeded', 'message': "模拟的限流错误",
+                                                'type': 'TooManyRequests'}})
+            return
+
+        text = mock.responder(provider, prompt)
+        model = request.get('model', 'mock')
+        if not stream:
+            mock.sleep_first(behavior)
+            mock.sleep_generate(behavior, len(text))
+            if provider == 'qianfan':
+                payload = {'id': 'as-mock', 'object': 'chat.completion', 'created': int(time.time()),
+                           'result': text, 'is_truncated': False, 'need_clear_history': False,
+                           'usage': _usage(prompt, text)}
+            else:
+                payload = {'id': 'mock', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                           'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                                        'finish_reason': 'stop'}],
+                           'usage': _usage(prompt, text)}
+            self._send_json(200, payload)
+            return
+
+        self._start_response(200, 'text/event-stream; charset=utf-8', chunked=True)
+        mock.sleep_first(behavior)
+        pieces = _split(text, behavior.chunk_chars)
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            if provider == 'qianfan':
+                event = {'id': 'as-mock', 'object': 'chat.completion', 'created': int(time.time()),
+                         'sentence_id': i, 'is_end': last, 'is_truncated': False, 'result': piece,
+                         'need_clear_history': False, 'usage': _usage(prompt, text)}
+            else:
+                event = {'id': 'mock', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                         'model': model,
+                         'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': piece},
+                                      'finish_reason': 'stop' if last else None}]}
+            self._write_chunk("data: " + json.dumps(event, ensure_ascii=False) + "\n\n")
+            mock.sleep_generate(behavior, len(piece))
+        if provider == 'ark':
+            self._write_chunk("data: [DONE]\n\n")
+        self._end_chunked()
+
+    def _record_http(self, provider: str, key: str, body: bytes, stream: bool):
+        import requests
+        headers = {name: value for name, value in self.headers.items()
+                   if name.lower() in ('authorization', 'content-type')}
+        started = time.monotonic()
+        response = requests.post(UPSTREAMS[provider] + self.path, data=body, headers=headers,
+                                 stream=True, timeout=300)
+        content_type = response.headers.get('Content-Type', 'application/json')
+        self._start_response(response.status_code, content_type, chunked=True)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        chunks = []
+        for data in response.iter_content(chunk_size=None):
+            text = decoder.decode(data)
+            if text:
+                chunks.append([time.monotonic() - started, text])
+                self._write_chunk(text)
+        self._end_chunked()
+        self.server.mock.cassette.add(key, {'provider': provider, 'stream': stream, 'status': response.status_code,
+                                            'content_type': content_type, 'chunks': chunks})
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.mock.count_bytes(len(data))
+
+    def _start_response(self, status: int, content_type: str, chunked: bool):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, text: str):
+        data = text.encode('utf-8')
+        if data:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+            self.server.mock.count_bytes(len(data))
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    # ---- 星火WebSocket ----
+
+    def do_GET(self):
+        if self.headers.get('Upgrade', '').lower() != 'websocket' or urlparse(self.path).path != SPARK_PATH:
+            self._send_json(404, {'error': f"未知路径: {self.path}"})
+            return
+        self.send_response(101, 'Switching Protocols')
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', _ws_accept(self.headers['Sec-WebSocket-Key']))
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        try:
+            opcode, data = _ws_recv(self.rfile)
+            if opcode == 0x1:
+                self._spark(json.loads(data.decode('utf-8')))
+            _ws_send(self.connection, "", opcode=0x8)
+        except (ConnectionError, OSError):
+            pass
+
+    def _spark(self, request: dict):
+        mock = self.server.mock
+        messages = request.get('payload', {}).get('message', {}).get('text', [])
+        key = request_key('spark', messages, True)
+        mock.count('spark', 'requests')
+        mock.count('spark', 'streamed')
+        send = lambda text: (_ws_send(self.connection, text), mock.count_bytes(len(text)))
+
+        cassette = mock.cassette
+        if cassette is not None and cassette.mode == 'record':
+            self._record_spark(key, request)
+            return
+        if cassette is not None:
+            interaction = cassette.lookup(key)
+            if interaction is not None:
+                mock.count('spark', 'cassette_hits')
+                cassette.replay(interaction, send)
+                return
+            mock.count('spark', 'cassette_misses')
+            if cassette.strict:
+                send(json.dumps({'header': {'code': 10404, 'message': "请求不在录制记录中", 'sid': 'mock',
+                                            'status': 2}}))
+                return
+
+        behavior = mock.behavior('spark')
+        prompt = messages[-1]['content'] if messages else ""
+        mock.sleep_first(behavior)
+        if mock.fail(behavior):
+            mock.count('spark', 'errors')
+            send(json.dumps({'header': {'code': 11202, 'message': "AppIdQpsOverFlowError", 'sid': 'mock',
+                                        'status': 2}}))
+            return
+
+        text = mock.responder('spark', prompt)
+        pieces = _split(text, behavior.chunk_chars)
+        for i, piece in enumerate(pieces):
+            status = 2 if i == len(pieces) - 1 else (0 if i == 0 else 1)
+            payload = {'choices': {'status': status, 'seq': i,
+                                   'text': [{'content': piece, 'role': 'assistant', 'index': 0}]}}
+            if status == 2:
+                payload['usage'] = {'text': _usage(prompt, text)}
+            send(json.dumps({'header': {'code': 0, 'message': 'Success', 'sid': 'mock', 'status': status},
+                             'payload': payload}, ensure_ascii=False))
+            mock.sleep_generate(behavior, len(piece))
+
+    def _record_spark(self, key: str, request: dict):
+        url = spark_signed_url(UPSTREAMS['spark'] + SPARK_PATH, os.environ.get("SPARK_API_KEY", ""),
+                               os.environ.get("SPARK_SECRET_KEY", ""))
+        upstream, rfile = _ws_connect(url)
+        started = time.monotonic()
+        chunks = []
+        try:
+            _ws_send(upstream, json.dumps(request, ensure_ascii=False), mask=True)
+            while True:
+                opcode, data = _ws_recv(rfile)
+                if opcode != 0x1:
+                    break
+                text = data.decode('utf-8')
+                chunks.append([time.monotonic() - started, text])
+                _ws_send(self.connection, text)
+                header = json.loads(text).get('header', {})
+                if header.get('code') != 0 or header.get('status') == 2:
+                    break
+        finally:
+            upstream.close()
+        self.server.mock.cassette.add(key, {'provider': 'spark', 'stream': True, 'status': 200,
+                                            'content_type': 'websocket', 'chunks': chunks})
+
+
+def _split(text: str, size: int) -> List[str]:
+    size = max(1, size)
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def _usage(prompt: str, text: str) -> dict:
+    prompt_tokens = len(prompt) // 2
+    completion_tokens = len(text) // 2
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens}
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    mock: 'MockLLMServer'
+
+    def handle_error(self, request, client_address):
+        # 流式客户端读到代码块结束后会提前断开，不视为错误
+        import sys
+        if not isinstance(sys.exc_info()[1], (ConnectionError, OSError)):
+            super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    """在本地端口上模拟千帆REST、方舟chat-completions和星火WebSocket接口
+
+    启动后把env()返回的环境变量设置到进程中（须在导入clients之前），各后端的请求就会发往本服务。
+
+    Args:
+        behaviors: 各后端（qianfan/ark/spark）的响应特性，缺省的后端使用default
+        default: 默认响应特性
+        responder: (后端, 提示词) -> 回复文本
+        cassette: 录制或回放，为None时使用模拟回复
+        seed: 随机数种子，固定后延迟和错误序列可复现
+    """
+
+    def __init__(self, behaviors: Optional[Dict[str, MockBehavior]] = None,
+                 default: Optional[MockBehavior] = None,
+                 responder: Optional[Callable[[str, str], str]] = None,
+                 cassette: Optional[Cassette] = None, host: str = '127.0.0.1', port: int = 0,
+                 seed: Optional[int] = None):
+        self.behaviors = behaviors or {}
+        self.default = default or MockBehavior()
+        self.responder = responder or SyntheticResponder()
+        self.cassette = cassette
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.bytes_sent = 0
+        self._server = _MockHTTPServer((host, port), _MockHandler)
+        self._server.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """指向本服务所需的环境变量，未配置的密钥用占位值填充"""
+        host, port = self._server.server_address[:2]
+        env = {
+            'QIANFAN_BASE_URL': self.base_url,
+            'ARK_BASE_URL': self.base_url + "/api/v3",
+            'SPARK_API_URL': f"ws://{host}:{port}{SPARK_PATH}",
+            'ARK_ENCRYPTED': 'false',
+        }
+        for name in ('QIANFAN_API_KEY', 'QIANFAN_SECRET_KEY', 'ARK_API_KEY', 'DS_API_KEY',
+                     'SPARK_API_KEY', 'SPARK_SECRET_KEY'):
+            env[name] = os.environ.get(name) or 'mock'
+        return env
+
+    def start(self) -> 'MockLLMServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self.cassette is not None and self.cassette.mode == 'record':
+            self.cassette.save()
+
+    def __enter__(self) -> 'MockLLMServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def behavior(self, provider: str) -> MockBehavior:
+        return self.behaviors.get(provider, self.default)
+
+    def fail(self, behavior: MockBehavior) -> bool:
+        with self._random_lock:
+            return self._random.random() < behavior.error_rate
+
+    def sleep_first(self, behavior: MockBehavior):
+        with self._random_lock:
+            delay = self._random.gauss(behavior.latency, behavior.jitter) if behavior.jitter else behavior.latency
+        if delay > 0:
+            time.sleep(delay)
+
+    def sleep_generate(self, behavior: MockBehavior, chars: int):
+        if behavior.chars_per_second > 0 and chars:
+            time.sleep(chars / behavior.chars_per_second)
+
+    def count(self, provider: str, name: str):
+        with self._stats_lock:
+            counts = self.stats.setdefault(provider, {})
+            counts[name] = counts.get(name, 0) + 1
+
+    def count_bytes(self, size: int):
+        with self._stats_lock:
+            self.bytes_sent += size
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地模拟大模型服务")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--chars-per-second', type=float, default=20000.0)
+    parser.add_argument('--html-bytes', type=int, default=8000)
+    parser.add_argument('--cassette', help="录制或回放的记录文件")
+    parser.add_argument('--cassette-mode', choices=['record', 'replay'], default='replay')
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        default=MockBehavior(args.latency, args.jitter, args.error_rate, args.chars_per_second),
+        responder=SyntheticResponder(args.html_bytes),
+        cassette=Cassette(args.cassette, args.cassette_mode) if args.cassette else None,
+        port=args.port,
+    )
+    for name, value in server.env().items():
+        print(f"export {name}={value}")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
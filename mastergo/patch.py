@@ -0,0 +1,101 @@
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+
+# (起点, 终点, 新内容)，起止位置基于同一份原始源码
+Splice = Tuple[int, int, str]
+
+
+class PatchConflict(ValueError):
+    """两处修改的范围部分重叠，无法确定合并结果"""
+
+
+def merge_splices(splices: Iterable[Splice]) -> List[Splice]:
+    """排序并合并替换，得到互不重叠、按起点排序的替换列表
+
+    - 首尾相接的替换（包括同一位置的多个插入）按顺序合并成一个
+    - 一个替换完全包含另一个时保留外层，范围相同时保留最后添加的
+    - 范围部分重叠时抛出PatchConflict
+    """
+    def key(item):
+        seq, (start, end, _) = item
+        # 同一位置的插入排在替换之前并保持添加顺序；相同范围时后添加的排在前面
+        return (start, 0, seq) if start == end else (start, 1, -end, -seq)
+
+    merged: List[list] = []
+    for _, (start, end, text) in sorted(enumerate(splices), key=key):
+        if start < 0 or end < start:
+            raise PatchConflict(f"无效的修改范围: {start}-{end}")
+        if merged:
+            last = merged[-1]
+            if start < last[1]:
+                if end <= last[1]:
+                    continue
+                raise PatchConflict(f"修改范围部分重叠: {last[0]}-{last[1]}与{start}-{end}")
+            if start == last[1]:
+                last[1] = end
+                last[2].append(text)
+                continue
+        merged.append([start, end, [text]])
+    return [(start, end, "".join(texts)) for start, end, texts in merged]
+
+
+def apply_splices(source: str, splices: Sequence[Splice], merged: bool = False) -> str:
+    """一次顺序拼接应用所有替换，替换之外的源码原样保留
+
+    Args:
+        source: 原始源码
+        splices: 基于原始源码的替换
+        merged: splices已经是merge_splices的结果时为True，跳过合并
+    """
+    if not merged:
+        splices = merge_splices(splices)
+    if splices and splices[-1][1] > len(source):
+        raise PatchConflict(f"修改范围超出文档长度: {splices[-1][1]} > {len(source)}")
+    pieces = []
+    last = 0
+    for start, end, text in splices:
+        pieces.append(source[last:start])
+        pieces.append(text)
+        last = end
+    pieces.append(source[last:])
+    return "".join(pieces)
+
+
+class Patch:
+    """针对同一份源码收集的一组替换，最后一次性应用
+
+    示例:
+        patch = Patch(html)
+        patch.replace(*index.element_span(tag), new_fragment)
+        updated = patch.apply()
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._splices: List[Splice] = []
+        self._merged: Optional[List[Splice]] = None
+
+    def replace(self, start: int, end: int, text: str):
+        self._splices.append((start, end, text))
+        self._merged = None
+
+    def insert(self, pos: int, text: str):
+        self.replace(pos, pos, text)
+
+    def delete(self, start: int, end: int):
+        self.replace(start, end, "")
+
+    @property
+    def splices(self) -> List[Splice]:
+        """合并后的替换，可直接传给HtmlParts.apply_edits或文档存储"""
+        if self._merged is None:
+            self._merged = merge_splices(self._splices)
+        return self._merged
+
+    def apply(self) -> str:
+        if not self._splices:
+            return self.source
+        return apply_splices(self.source, self.splices, merged=True)
+
+    def __len__(self) -> int:
+        return len(self._splices)
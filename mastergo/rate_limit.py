@@ -0,0 +1,54 @@
+import threading
+import time
+from typing import Dict, Optional
+
+
+class RateLimiter:
+    """令牌桶限流，每秒补充rate个令牌，最多积累burst个，可在多个线程间共享"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        if rate <= 0:
+            raise ValueError("限流速率必须大于0")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """取得一个令牌，令牌不足时等待；超时返回False"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+            with self._lock:
+                self.waited += wait
+
+
+class RateLimits:
+    """按后端名称管理限流器，未配置的后端不限流"""
+
+    def __init__(self, limits: Optional[Dict[str, float]] = None):
+        self._limiters: Dict[str, RateLimiter] = {
+            name: RateLimiter(rate) for name, rate in (limits or {}).items()
+        }
+
+    def set(self, name: str, rate: float, burst: Optional[int] = None):
+        self._limiters[name] = RateLimiter(rate, burst)
+
+    def acquire(self, name: str, timeout: Optional[float] = None) -> bool:
+        limiter = self._limiters.get(name)
+        return limiter.acquire(timeout) if limiter else True
@@ -0,0 +1,212 @@
+import itertools
+import json
+import queue
+import socketserver
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+from voice_engine import MODEL_PATH, SAMPLE_RATE, StreamRecognizer, load_model
+
+
+class RecognitionStream:
+    """服务端的一路音频流，同一时刻只由一个工作线程处理"""
+
+    def __init__(self, stream_id: str, recognizer: StreamRecognizer):
+        self.stream_id = stream_id
+        self.recognizer = recognizer
+        self.pending: Deque[bytes] = deque()
+        self.closing = False
+        self.closed = threading.Event()
+        # 是否已在就绪队列中或正在被处理
+        self.scheduled = False
+
+
+class RecognitionServer:
+    """多路语音识别服务：模型只加载一次，由所有流的KaldiRecognizer只读共享
+
+    每路流有独立的识别器和待处理音频队列，有数据的流进入就绪队列，由固定数量的工作线程轮流处理。
+    每次最多处理max_batch块后让出，避免一路长音频占住工作线程。
+    一路流积压max_pending块时feed阻塞，直到工作线程取走数据，网络连接因此停止接收而不是无限占用内存。
+
+    Args:
+        model_path: Vosk模型目录
+        workers: 工作线程数
+        recognizer_factory: (采样率) -> 识别器，默认用共享模型创建KaldiRecognizer
+        vad_factory: 为每路流创建静音过滤器（vad.VADGate），为None时不过滤
+        max_pending: 每路流最多积压的音频块数
+    """
+
+    def __init__(self, model_path: str = MODEL_PATH, workers: int = 4,
+                 recognizer_factory: Optional[Callable[[int], object]] = None,
+                 vad_factory: Optional[Callable[[], object]] = None, max_batch: int = 8,
+                 max_pending: int = 64):
+        if recognizer_factory is None:
+            from vosk import KaldiRecognizer
+            model = load_model(model_path)
+            recognizer_factory = lambda rate: KaldiRecognizer(model, rate)
+        self.recognizer_factory = recognizer_factory
+        self.vad_factory = vad_factory
+        self.max_batch = max_batch
+        self.max_pending = max(1, max_pending)
+        self._streams: Dict[str, RecognitionStream] = {}
+        self._lock = threading.Lock()
+        # 积压的流有数据被取走或关闭时通知等待中的feed
+        self._space = threading.Condition(self._lock)
+        self._ready: 'queue.Queue[Optional[RecognitionStream]]' = queue.Queue()
+        self._ids = itertools.count(1)
+        self._workers = [
+            threading.Thread(target=self._work, name=f'recognition-{i}', daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def open_stream(self, on_final: Optional[Callable[[str], None]] = None,
+                    on_partial: Optional[Callable[[str], None]] = None,
+                    sample_rate: int = SAMPLE_RATE, stream_id: Optional[str] = None) -> str:
+        """创建一路音频流，回调在工作线程中执行，返回流ID"""
+        recognizer = StreamRecognizer(
+            self.recognizer_factory(sample_rate), on_final, on_partial,
+            vad_gate=self.vad_factory() if self.vad_factory else None,
+        )
+        with self._lock:
+            stream_id = stream_id or f"stream-{next(self._ids)}"
+            if stream_id in self._streams:
+                raise ValueError(f"音频流已存在: {stream_id}")
+            self._streams[stream_id] = RecognitionStream(stream_id, recognizer)
+        return stream_id
+
+    def feed(self, stream_id: str, pcm: bytes):
+        """向音频流追加16位单声道PCM数据，积压过多时等待工作线程处理"""
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            while stream is not None and not stream.closing and len(stream.pending) >= self.max_pending:
+                self._space.wait()
+            if stream is None or stream.closing:
+                raise KeyError(f"音频流不存在或已关闭: {stream_id}")
+            stream.pending.append(pcm)
+            self._schedule(stream)
+
+    def close_stream(self, stream_id: str, wait: bool = True,
+                     timeout: Optional[float] = None) -> Optional[dict]:
+        """结束音频流，剩余音频识别完后输出最后结果
+
+        Returns:
+            wait为True时返回该流的统计信息
+        """
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                raise KeyError(f"音频流不存在: {stream_id}")
+            stream.closing = True
+            self._schedule(stream)
+            self._space.notify_all()
+        if wait:
+            stream.closed.wait(timeout)
+            return dict(stream.recognizer.stats)
+        return None
+
+    def _schedule(self, stream: RecognitionStream):
+        """在持有锁时调用"""
+        if not stream.scheduled:
+            stream.scheduled = True
+            self._ready.put(stream)
+
+    def _work(self):
+        while True:
+            stream = self._ready.get()
+            if stream is None:
+                return
+            for _ in range(self.max_batch):
+                with self._lock:
+                    chunk = stream.pending.popleft() if stream.pending else None
+                    if chunk is not None:
+                        self._space.notify_all()
+                if chunk is None:
+                    break
+                try:
+                    stream.recognizer.feed(chunk)
+                except Exception as e:
+                    print(f"音频流{stream.stream_id}识别失败: {str(e)}")
+
+            with self._lock:
+                if stream.pending:
+                    # 还有数据，排到队尾让其他流先处理
+                    self._ready.put(stream)
+                    continue
+                finishing = stream.closing and not stream.closed.is_set()
+                stream.scheduled = False
+                if finishing:
+                    self._streams.pop(stream.stream_id, None)
+            if finishing:
+                try:
+                    stream.recognizer.finish()
+                except Exception as e:
+                    print(f"音频流{stream.stream_id}结束识别失败: {str(e)}")
+                finally:
+                    stream.closed.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'streams': len(self._streams), 'ready': self._ready.qsize(), 'workers': len(self._workers)}
+
+    def shutdown(self):
+        for _ in self._workers:
+            self._ready.put(None)
+        for worker in self._workers:
+            worker.join()
+
+
+class _StreamHandler(socketserver.BaseRequestHandler):
+    """一个连接对应一路音频流：客户端发送PCM数据，服务端按行返回JSON结果，客户端关闭写端表示结束"""
+
+    def handle(self):
+        server: RecognitionServer = self.server.recognition
+        send_lock = threading.Lock()
+
+        def send(kind: str, text: str):
+            line = json.dumps({'type': kind, 'text': text}, ensure_ascii=False) + "\n"
+            with send_lock:
+                try:
+                    self.request.sendall(line.encode('utf-8'))
+                except OSError:
+                    pass
+
+        stream_id = server.open_stream(
+            on_final=lambda text: send('final', text),
+            on_partial=lambda text: send('partial', text),
+        )
+        # recv可能在16位采样中间截断，奇数字节留到下一块
+        carry = b""
+        try:
+            while True:
+                data = self.request.recv(8000)
+                if not data:
+                    break
+                data = carry + data
+                usable = len(data) - len(data) % 2
+                carry = data[usable:]
+                if usable:
+                    server.feed(stream_id, data[:usable])
+        finally:
+            server.close_stream(stream_id)
+        send('end', '')
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve_tcp(recognition: RecognitionServer, host: str = '127.0.0.1', port: int = 2700) -> socketserver.TCPServer:
+    """在本地端口上提供识别服务，返回的服务器需调用serve_forever"""
+    server = _TCPServer((host, port), _StreamHandler)
+    server.recognition = recognition
+    return server
+
+
+if __name__ == "__main__":
+    recognition = RecognitionServer()
+    with serve_tcp(recognition) as tcp:
+        print(f"语音识别服务已启动: {tcp.server_address}")
+        tcp.serve_forever()
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+from html_modifier import HTMLModifier
+
+
+HISTORY_ATTRS = (
+    'conversation_history_qianfan',
+    'conversation_history_spark',
+    'conversation_history_doubao',
+    'conversation_history_deepseek',
+)
+
+
+class Session:
+    """一个编辑会话：独立的文档、对话历史和锁"""
+
+    def __init__(self, session_id: str, modifier: HTMLModifier):
+        self.session_id = session_id
+        self.modifier = modifier
+        self.lock = threading.RLock()
+        self.last_used = time.monotonic()
+        # 正在使用该会话的调用数，大于0时不会被淘汰
+        self.active = 0
+
+    def dump(self) -> dict:
+        state = {'html': self.modifier.html}
+        for attr in HISTORY_ATTRS:
+            state[attr] = getattr(self.modifier, attr).to_list()
+        return state
+
+    def restore(self, state: dict):
+        for attr in HISTORY_ATTRS:
+            history = getattr(self.modifier, attr)
+            history.clear()
+            history.extend(state.get(attr, []))
+        if state.get('html') is not None:
+            self.modifier.html = state['html']
+            self.modifier.html_parts = self.modifier._parse_html(state['html'])
+
+
+class SessionManager:
+    """按会话ID管理相互隔离的HTMLModifier，文档只保存在内存中
+
+    同一会话的请求按顺序执行，不同会话之间可以并发。
+    会话数超过上限时淘汰最久未使用的空闲会话，配置spill_dir时淘汰的会话写入磁盘，再次访问时恢复。
+    """
+
+    def __init__(self, max_sessions: int = 256, spill_dir: Optional[str] = None,
+                 factory: Optional[Callable[[], HTMLModifier]] = None):
+        """
+        Args:
+            max_sessions: 内存中最多保留的会话数
+            spill_dir: 淘汰会话的保存目录，为None时直接丢弃
+            factory: 创建会话所用HTMLModifier的函数，默认使用内存模式
+        """
+        self.max_sessions = max(1, max_sessions)
+        self.spill_dir = spill_dir
+        self.factory = factory or (lambda: HTMLModifier(output_path=None))
+        self._sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self._lock = threading.Lock()
+        # 正在写盘的会话，同一会话在写盘完成前不能恢复
+        self._spilling: Dict[str, threading.Event] = {}
+        self.evictions = 0
+        self.restores = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, session_id: str) -> str:
+        name = hashlib.sha256(session_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.spill_dir, f"{name}.json")
+
+    def _spill(self, session: Session):
+        if not self.spill_dir:
+            return
+        path = self._spill_path(session.session_id)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(session.dump(), f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _load_spilled(self, session: Session):
+        if not self.spill_dir:
+            return
+        path = self._spill_path(session.session_id)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            session.restore(json.load(f))
+        os.remove(path)
+        self.restores += 1
+
+    def _evict_over_capacity(self) -> List[Session]:
+        """在持有全局锁时选出要淘汰的会话，只淘汰空闲会话"""
+        evicted = []
+        if len(self._sessions) <= self.max_sessions:
+            return evicted
+        for session_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            session = self._sessions[session_id]
+            if session.active == 0:
+                del self._sessions[session_id]
+                self._spilling[session_id] = threading.Event()
+                evicted.append(session)
+        self.evictions += len(evicted)
+        return evicted
+
+    def _spill_evicted(self, evicted: List[Session]):
+        for session in evicted:
+            # 每个会话单独处理，一个会话写盘失败不能让其余会话的等待者一直阻塞
+            try:
+                # 等待可能仍在收尾的调用结束后再写盘
+                with session.lock:
+                    self._spill(session)
+            except Exception as e:
+                print(f"会话{session.session_id}写盘失败: {str(e)}，保留在内存中")
+                with self._lock:
+                    current = self._sessions.get(session.session_id)
+                    if current is None:
+                        self._sessions[session.session_id] = session
+                    else:
+                        # 同一ID已有调用在等待恢复，直接交给它内存中的状态
+                        current.modifier = session.modifier
+                    self.evictions -= 1
+            finally:
+                with self._lock:
+                    self._spilling.pop(session.session_id).set()
+
+    def _acquire(self, session_id: str) -> Session:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            created = session is None
+            if created:
+                session = Session(session_id, self.factory())
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.active += 1
+            evicted = self._evict_over_capacity()
+            spilling = self._spilling.get(session_id)
+            # 新会话在放开全局锁前先占住自己的锁，恢复完成前其他调用会在会话锁上等待
+            if created:
+                session.lock.acquire()
+
+        self._spill_evicted(evicted)
+
+        if created:
+            try:
+                if spilling is not None:
+                    spilling.wait()
+                self._load_spilled(session)
+            finally:
+                session.lock.release()
+        return session
+
+    def _release(self, session: Session):
+        with self._lock:
+            session.active -= 1
+            session.last_used = time.monotonic()
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[HTMLModifier]:
+        """独占使用某个会话的HTMLModifier
+
+        示例:
+            with manager.session('user-1') as modifier:
+                modifier.modify_html("将A改为B")
+        """
+        session = self._acquire(session_id)
+        try:
+            with session.lock:
+                yield session.modifier
+        finally:
+            self._release(session)
+
+    def generate(self, session_id: str, request_content: str, provider: str = 'spark') -> str:
+        """在指定会话中生成HTML"""
+        with self.session(session_id) as modifier:
+            return modifier._generate(provider, request_content)
+
+    def modify(self, session_id: str, request_content: str) -> str:
+        """在指定会话中修改HTML"""
+        with self.session(session_id) as modifier:
+            return modifier.modify_html(request_content)
+
+    def get_html(self, session_id: str) -> Optional[str]:
+        with self.session(session_id) as modifier:
+            return modifier.html
+
+    def evict_idle(self, max_idle: float) -> int:
+        """淘汰空闲超过max_idle秒的会话，返回淘汰数量"""
+        now = time.monotonic()
+        with self._lock:
+            idle = [s for s in self._sessions.values() if s.active == 0 and now - s.last_used > max_idle]
+            for session in idle:
+                del self._sessions[session.session_id]
+                self._spilling[session.session_id] = threading.Event()
+            self.evictions += len(idle)
+        self._spill_evicted(idle)
+        return len(idle)
+
+    def close(self, session_id: str):
+        """结束会话并删除其所有状态，包括已写入磁盘的部分"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.spill_dir and os.path.exists(self._spill_path(session_id)):
+            os.remove(self._spill_path(session_id))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'active': sum(1 for s in self._sessions.values() if s.active),
+                'evictions': self.evictions,
+                'restores': self.restores,
+            }
@@ -0,0 +1,154 @@
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+
+# 与BeautifulSoup的html.parser构建器一致的空元素列表
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link',
+    'menuitem', 'meta', 'param', 'source', 'track', 'wbr',
+    'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+}
+
+
+class SourceLocator(HTMLParser):
+    """一次扫描记录每个元素和字符串节点在原始HTML中的精确起止偏移
+
+    解析事件与BeautifulSoup的html.parser构建器相同，因此:
+    - 元素以开始标签的偏移为键，与Tag.sourceline/sourcepos对应
+    - 字符串节点（文本、注释、DOCTYPE等）按文档顺序排列，与soup.descendants中的字符串一一对应
+
+    既可以一次传入完整文档，也可以通过feed_chunk/finish逐块输入（例如流式生成时），
+    子类可重写on_element/on_string在元素和字符串闭合时立即处理。
+    """
+
+    def __init__(self, html: Optional[str] = None):
+        super().__init__(convert_charrefs=False)
+        self.html = ""
+        self.element_spans: Dict[int, Tuple[int, int]] = {}
+        self.element_names: Dict[int, str] = {}
+        self.string_spans: List[Tuple[int, int]] = []
+        self._chunks: List[str] = []
+        self._length = 0
+        self._line_starts = [0]
+        # 打开的元素栈: (标签名, 开始偏移, 属性)
+        self._stack: List[Tuple[str, int, List[Tuple[str, Optional[str]]]]] = []
+        # 尚未确定结束位置的事件，事件的结束位置即下一个事件的起始位置
+        self._pending: Optional[Tuple[str, int, Optional[str], list]] = None
+        self._text_start: Optional[int] = None
+        # 多余的结束标签和隐式闭合的元素个数，为0说明片段标签完整配对
+        self.unbalanced = 0
+        if html is not None:
+            self.feed_chunk(html)
+            self.finish()
+
+    def feed_chunk(self, chunk: str):
+        """输入一段HTML源码"""
+        for i, ch in enumerate(chunk):
+            if ch == '\n':
+                self._line_starts.append(self._length + i + 1)
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        self.feed(chunk)
+
+    def finish(self) -> str:
+        """输入结束，闭合所有未闭合的元素并返回完整源码"""
+        self.close()
+        self._event(None, self._length, None, [])
+        if self._text_start is not None:
+            self._add_string(self._text_start, self._length)
+            self._text_start = None
+        while self._stack:
+            name, start, attrs = self._stack.pop()
+            self.unbalanced += 1
+            self._close(name, start, self._length, attrs)
+        self.html = "".join(self._chunks)
+        self._chunks = [self.html]
+        return self.html
+
+    def _pos(self) -> int:
+        line, col = self.getpos()
+        return self._line_starts[line - 1] + col
+
+    def handle_starttag(self, tag, attrs):
+        self._event('start', self._pos(), tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self._event('startend', self._pos(), tag, attrs)
+
+    def handle_endtag(self, tag):
+        self._event('end', self._pos(), tag, [])
+
+    def handle_data(self, data):
+        self._event('data', self._pos(), None, [])
+
+    def handle_charref(self, name):
+        self._event('data', self._pos(), None, [])
+
+    def handle_entityref(self, name):
+        self._event('data', self._pos(), None, [])
+
+    def handle_comment(self, data):
+        self._event('string', self._pos(), None, [])
+
+    def handle_decl(self, decl):
+        self._event('string', self._pos(), None, [])
+
+    def handle_pi(self, data):
+        self._event('string', self._pos(), None, [])
+
+    def unknown_decl(self, data):
+        self._event('string', self._pos(), None, [])
+
+    def _event(self, kind: Optional[str], start: int, name: Optional[str], attrs: list):
+        """收到新事件时，上一个事件的结束位置随之确定"""
+        if self._pending is not None:
+            self._resolve(*self._pending, end=start)
+        self._pending = (kind, start, name, attrs) if kind is not None else None
+
+    def _resolve(self, kind: str, start: int, name: Optional[str], attrs: list, end: int):
+        if kind == 'data':
+            # 连续的文本和实体引用在BeautifulSoup中合并为一个字符串
+            if self._text_start is None:
+                self._text_start = start
+            return
+        if self._text_start is not None:
+            self._add_string(self._text_start, start)
+            self._text_start = None
+
+        if kind == 'string':
+            self._add_string(start, end)
+        elif kind == 'startend' or (kind == 'start' and name in VOID_ELEMENTS):
+            self._close(name, start, end, attrs)
+        elif kind == 'start':
+            self._stack.append((name, start, attrs))
+        elif kind == 'end':
+            if not any(open_name == name for open_name, _, _ in self._stack):
+                self.unbalanced += 1
+                return
+            # 未闭合的内层元素在遇到外层结束标签时隐式闭合
+            while self._stack:
+                open_name, open_start, open_attrs = self._stack.pop()
+                if open_name == name:
+                    self._close(open_name, open_start, end, open_attrs)
+                    break
+                self.unbalanced += 1
+                self._close(open_name, open_start, start, open_attrs)
+
+    def _add_string(self, start: int, end: int):
+        self.string_spans.append((start, end))
+        self.on_string(start, end, self._stack[-1][0] if self._stack else None)
+
+    def _close(self, name: str, start: int, end: int, attrs: list):
+        self.element_spans[start] = (start, end)
+        self.element_names[start] = name
+        self.on_element(name, attrs, start, end)
+
+    def on_element(self, name: str, attrs: list, start: int, end: int):
+        """元素闭合时调用，此时self._stack中为该元素的祖先"""
+
+    def on_string(self, start: int, end: int, parent: Optional[str]):
+        """字符串节点结束时调用"""
+
+    def source_offset(self, line: int, col: int) -> int:
+        """将行列位置（行从1开始）转换为源码偏移"""
+        return self._line_starts[line - 1] + col
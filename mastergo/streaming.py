@@ -0,0 +1,222 @@
+import json
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from clients import ARK_EXTRA_HEADERS, SPARK_API_URL, get_client, registry
+from html_parts import HtmlParts, PartsScanner
+from token_manager import post_qianfan
+
+
+ARK_MODEL = "ep-20250329165324-l8vxt"
+
+def _create_spark_stream_client():
+    from sparkai.llm.llm import ChatSparkLLM
+    return ChatSparkLLM(
+        spark_api_url=SPARK_API_URL,
+        spark_app_id='54f0b31e',
+        spark_api_key=os.environ.get("SPARK_API_KEY"),
+        spark_api_secret=os.environ.get("SPARK_SECRET_KEY"),
+        spark_llm_domain='lite',
+        streaming=True,
+    )
+
+
+registry.register('spark_stream', _create_spark_stream_client)
+
+
+def stream_spark(content: str) -> Iterator[str]:
+    """流式调用讯飞星火，逐块返回文本"""
+    from sparkai.core.messages import ChatMessage
+    messages = [ChatMessage(role="user", content=content)]
+    for chunk in get_client('spark_stream').stream(messages):
+        if chunk.content:
+            yield chunk.content
+
+
+def stream_qianfan(content: str) -> Iterator[str]:
+    """流式调用百度千帆，解析SSE事件"""
+    payload = json.dumps({
+        "messages": [{"role": "user", "content": content}],
+        "temperature": 0.5,
+        "stream": True
+    })
+    with post_qianfan(payload, stream=True) as response:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = json.loads(line[5:].strip())
+            if data.get('result'):
+                yield data['result']
+            if data.get('is_end'):
+                break
+
+
+def _stream_ark(client_name: str, content: str) -> Iterator[str]:
+    stream = get_client(client_name).chat.completions.create(
+        model=ARK_MODEL,
+        messages=[
+            {"role": "system", "content": "你是前端UI生成师."},
+            {"role": "user", "content": f"{content}"},
+        ],
+        extra_headers=ARK_EXTRA_HEADERS,
+        stream=True,
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def stream_doubao(content: str) -> Iterator[str]:
+    """流式调用豆包"""
+    return _stream_ark('doubao', content)
+
+
+def stream_deepseek(content: str) -> Iterator[str]:
+    """流式调用DeepSeek"""
+    return _stream_ark('deepseek', content)
+
+
+STREAM_BACKENDS: Dict[str, Callable[[str], Iterator[str]]] = {
+    'qianfan': stream_qianfan,
+    'spark': stream_spark,
+    'doubao': stream_doubao,
+    'deepseek': stream_deepseek,
+}
+
+
+class FenceExtractor:
+    """增量提取第一个```代码块的内容，去掉语言标记和首尾空白"""
+
+    def __init__(self):
+        self.state = 'before'
+        self.found = False
+        self._pending = ""
+        self._lang = ""
+        self._trailing = ""
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        """输入一段模型输出，返回其中新增的代码内容"""
+        data = self._pending + chunk
+        self._pending = ""
+        out: List[str] = []
+
+        while data and self.state != 'done':
+            if self.state == 'before':
+                pos = data.find("```")
+                if pos == -1:
+                    # 保留末尾可能是半个围栏的反引号
+                    keep = len(data) - len(data.rstrip('`'))
+                    self._pending = data[len(data) - keep:] if keep else ""
+                    return ""
+                self.found = True
+                self.state = 'lang'
+                data = data[pos + 3:]
+            elif self.state == 'lang':
+                pos = data.find("\n")
+                if pos == -1:
+                    self._lang += data
+                    data = ""
+                    continue
+                lang = self._lang + data[:pos]
+                self._lang = ""
+                data = data[pos + 1:]
+                self.state = 'code'
+                # 语言标记（如html）丢弃，其他内容视为代码
+                if lang.strip() and not lang.strip().isalpha():
+                    data = lang + "\n" + data
+            else:
+                pos = data.find("```")
+                if pos == -1:
+                    keep = len(data) - len(data.rstrip('`'))
+                    body, self._pending = (data[:len(data) - keep], data[len(data) - keep:]) if keep else (data, "")
+                    out.append(self._emit(body))
+                    data = ""
+                else:
+                    out.append(self._emit(data[:pos]))
+                    self.state = 'done'
+                    data = ""
+
+        return "".join(out)
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        # 末尾空白先暂存，后面还有内容时再输出，相当于对整个代码块做strip
+        text = self._trailing + text
+        stripped = text.rstrip()
+        self._trailing = text[len(stripped):]
+        return stripped
+
+    def finish(self) -> str:
+        """输入结束时返回尚未输出的代码（未闭合的围栏也视为代码结束）"""
+        if self.state == 'code' and self._pending:
+            return self._emit(self._pending)
+        return ""
+
+
+class StreamingGeneration:
+    """消费模型的流式输出：增量提取代码块、写入临时文件并同步解析
+
+    代码先追加写入<output_path>.partial，流正常结束后才成为输出文件：提供commit时交给它保存
+    （如文档存储），否则原子改名为output_path。流失败或中途取消时删除临时文件，原输出文件保持不变。
+    """
+
+    def __init__(self, output_path: Optional[str], commit: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            output_path: 输出文件，为None时只在内存中生成
+            commit: 生成成功后以完整HTML调用，代替改名
+        """
+        self.output_path = output_path
+        self.commit = commit
+        self.html: Optional[str] = None
+        self.parts: Optional[HtmlParts] = None
+
+    def run(self, chunks: Iterable[str]) -> Iterator[str]:
+        """逐块返回生成的HTML代码，结束后self.html和self.parts可用"""
+        partial = f"{self.output_path}.partial" if self.output_path else None
+        f = open(partial, 'w', encoding='utf-8') if partial else None
+        try:
+            yield from self._consume(chunks, f)
+            if f is not None:
+                f.close()
+                if self.commit is not None:
+                    self.commit(self.html)
+                    os.remove(partial)
+                else:
+                    os.replace(partial, self.output_path)
+        finally:
+            if f is not None:
+                f.close()
+                if os.path.exists(partial):
+                    os.remove(partial)
+
+    def _consume(self, chunks: Iterable[str], f) -> Iterator[str]:
+        fence = FenceExtractor()
+        builder = PartsScanner()
+
+        for chunk in chunks:
+            code = fence.feed(chunk)
+            if code:
+                if f is not None:
+                    f.write(code)
+                    f.flush()
+                builder.feed_chunk(code)
+                yield code
+            if fence.state == 'done':
+                break
+        code = fence.finish()
+        if code:
+            if f is not None:
+                f.write(code)
+            builder.feed_chunk(code)
+            yield code
+
+        if not fence.found:
+            raise ValueError("未检测到有效的HTML代码块")
+
+        self.html = builder.finish()
+        self.parts = HtmlParts.from_scanner(builder)
@@ -0,0 +1,17 @@
+import os
+import sys
+import types
+
+# 模块都位于mastergo目录下，以平铺方式导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import prompts  # noqa: F401
+except ImportError:
+    # html_modifier引用的提示词模块不在仓库中，测试时用只包含指令本身的模板代替
+    prompts = types.ModuleType('prompts')
+    prompts.HTML_GENERATION = "{request}"
+    prompts.HTML_MODIFICATION = "根据要求修改HTML: {request}"
+    prompts.HTML_EXAMPLE = "<html></html>"
+    prompts.get_example_content = lambda: "<html></html>"
+    sys.modules['prompts'] = prompts
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+import async_providers
+from async_providers import fan_out, race, run
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    fake = {}
+    monkeypatch.setattr(async_providers, 'ASYNC_BACKENDS', fake)
+    return fake
+
+
+def test_fan_out_keeps_order_limits_concurrency_and_returns_errors(backends):
+    active = []
+    peak = []
+
+    async def chat(prompt):
+        active.append(prompt)
+        peak.append(len(active))
+        await asyncio.sleep(0.01)
+        active.remove(prompt)
+        if prompt == 'bad':
+            raise ValueError(prompt)
+        return prompt.upper()
+
+    backends['fake'] = chat
+    results = run(fan_out(['a', 'bad', 'c', 'd', 'e'], provider='fake', limit=2), timeout=5)
+    assert results[0] == 'A' and results[2:] == ['C', 'D', 'E']
+    assert isinstance(results[1], ValueError)
+    assert max(peak) == 2
+
+
+def test_race_returns_first_valid_result_and_cancels_rest(backends):
+    cancelled = []
+
+    def backend(delay, answer):
+        async def chat(prompt):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(answer)
+                raise
+            return answer
+        return chat
+
+    backends.update(fast=backend(0.01, 'invalid'), medium=backend(0.05, 'ok'), slow=backend(5, 'late'))
+    name, result = run(race('x', ['fast', 'medium', 'slow'], validate=lambda r: r == 'ok'), timeout=5)
+    assert (name, result) == ('medium', 'ok')
+    # 取消在事件循环的下一轮生效
+    run(asyncio.sleep(0.01), timeout=5)
+    assert cancelled == ['late']
+
+
+def test_race_raises_when_nothing_valid(backends):
+    async def fail(prompt):
+        raise ConnectionError('down')
+
+    async def slow(prompt):
+        await asyncio.sleep(5)
+        return 'late'
+
+    backends.update(fail=fail, slow=slow)
+    with pytest.raises(TimeoutError) as error:
+        run(race('x', ['fail', 'slow'], timeout=0.1), timeout=5)
+    assert 'fail: down' in str(error.value)
@@ -0,0 +1,81 @@
+import re
+
+import pytest
+
+from batch_edit import BatchEditor, build_batch_prompt, parse_batch_response
+
+_FRAGMENT_RE = re.compile(r"<<<FRAGMENT (\w+)>>>\n(.*?)\n<<<END \1>>>", re.S)
+_SINGLE_RE = re.compile(r"修改以下HTML片段:\n(.*)", re.S)
+
+
+def rewrite(fragment):
+    return fragment.replace('旧', '新')
+
+
+class FakeChat:
+    """按提示词逐个回复；片段数超过max_ok的批量请求返回缺片段的回复"""
+
+    def __init__(self, max_ok):
+        self.max_ok = max_ok
+        self.batches = []
+
+    def __call__(self, prompts):
+        responses = []
+        for prompt in prompts:
+            fragments = _FRAGMENT_RE.findall(prompt)
+            if not fragments:
+                self.batches.append(1)
+                responses.append(rewrite(_SINGLE_RE.search(prompt).group(1)))
+                continue
+            self.batches.append(len(fragments))
+            if len(fragments) > self.max_ok:
+                fragments = fragments[:-1]
+            responses.append("\n".join(f"<<<FRAGMENT {fid}>>>\n{rewrite(f)}\n<<<END {fid}>>>"
+                                       for fid, f in fragments))
+        return responses
+
+
+def test_prompt_round_trip():
+    fragments = {'f0': '<p>旧一</p>', 'f1': '<p>旧二</p>'}
+    prompt = build_batch_prompt('改', fragments)
+    assert parse_batch_response(prompt, ['f0', 'f1']) == fragments
+    assert parse_batch_response(prompt, ['f0', 'f2']) is None
+
+
+def test_single_batch_when_reply_is_well_formed():
+    chat = FakeChat(max_ok=100)
+    editor = BatchEditor(chat, lambda r: r, max_batch_size=20)
+    fragments = [f'<p>旧{i}</p>' for i in range(8)]
+    assert editor.edit('改', fragments) == [f'<p>新{i}</p>' for i in range(8)]
+    assert chat.batches == [8]
+    assert editor.request_count == 1
+
+
+def test_malformed_batches_are_split_in_half():
+    chat = FakeChat(max_ok=2)
+    editor = BatchEditor(chat, lambda r: r, max_batch_size=20)
+    fragments = [f'<p>旧{i}</p>' for i in range(8)]
+    assert editor.edit('改', fragments) == [f'<p>新{i}</p>' for i in range(8)]
+    assert chat.batches == [8, 4, 4, 2, 2, 2, 2]
+    assert editor.request_count == 7
+
+
+def test_max_batch_size_and_single_fragment_prompts():
+    chat = FakeChat(max_ok=100)
+    editor = BatchEditor(chat, lambda r: r, max_batch_size=3)
+    fragments = [f'<p>旧{i}</p>' for i in range(7)]
+    assert editor.edit('改', fragments) == [f'<p>新{i}</p>' for i in range(7)]
+    assert chat.batches == [3, 3, 1]
+
+
+def test_failed_batch_is_retried_and_single_failure_raises():
+    calls = []
+
+    def chat_many(prompts):
+        calls.append(len(prompts))
+        return [ConnectionError("超时") for _ in prompts]
+
+    editor = BatchEditor(chat_many, lambda r: r)
+    with pytest.raises(ConnectionError):
+        editor.edit('改', ['<p>a</p>', '<p>b</p>'])
+    assert calls == [1, 2]
@@ -0,0 +1,113 @@
+import json
+import re
+
+import pytest
+
+from batch_identify import BatchIdentifier, build_batch_prompt, normalize_command, parse_batch_answer
+
+
+class NoRules:
+    def predict(self, text):
+        return None
+
+
+class FakeIdentifier(BatchIdentifier):
+    """按提示词中的[N]编号回答，设备名为指令本身"""
+
+    def __init__(self, fail=False, **kwargs):
+        super().__init__(classifier=NoRules(), **kwargs)
+        self.prompts = []
+        self.fail = fail
+
+    def _chat_many(self, prompts):
+        self.stats['llm_requests'] += len(prompts)
+        self.prompts.extend(prompts)
+        if self.fail:
+            return [ConnectionError('down') for _ in prompts]
+        return ["\n".join(f"[{n}] 设备{text}" for n, text in re.findall(r"^\[(\d+)\] (.+)$", p, re.M))
+                for p in prompts]
+
+
+def write_input(path, texts):
+    path.write_text("".join(json.dumps({'id': i, 'text': t}, ensure_ascii=False) + "\n"
+                            for i, t in enumerate(texts)), encoding='utf-8')
+
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_commands_use_bracket_labels_distinct_from_rule_numbers():
+    prompt = build_batch_prompt(['打开空调', '关灯'])
+    assert prompt.rstrip().endswith("[1] 打开空调\n[2] 关灯")
+    # 规则中的“1. ”编号不会被当成回答
+    assert parse_batch_answer("1. 灯光\n[2] 空调\n[1]: 窗帘\n[3] 电视", 2) == {1: '空调', 0: '窗帘'}
+
+
+def test_normalize_command():
+    assert normalize_command(' 打开 空调！') == normalize_command('打开空调')
+
+
+def test_run_deduplicates_and_keeps_order(tmp_path):
+    source, output = tmp_path / 'in.jsonl', tmp_path / 'out.jsonl'
+    write_input(source, ['开灯', '关灯', '开灯。', '开窗'])
+    identifier = FakeIdentifier(batch_size=2)
+    stats = identifier.run(str(source), str(output))
+    rows = read_output(output)
+    assert [r['device'] for r in rows] == ['设备开灯', '设备关灯', '设备开灯', '设备开窗']
+    assert [r['id'] for r in rows] == [0, 1, 2, 3]
+    assert stats['unique'] == 3
+    assert stats['llm_requests'] == 2
+
+
+def test_memo_is_bounded_without_breaking_window(tmp_path):
+    source, output = tmp_path / 'in.jsonl', tmp_path / 'out.jsonl'
+    write_input(source, ['一', '二', '三', '一', '四', '五', '一'])
+    identifier = FakeIdentifier(window=4, max_memo=2)
+    identifier.run(str(source), str(output))
+    assert len(identifier.memo) == 2
+    assert [r['device'] for r in read_output(output)] == ['设备' + t for t in '一二三一四五一']
+
+
+def test_resume_warms_memo_from_checkpoint(tmp_path):
+    source, output = tmp_path / 'in.jsonl', tmp_path / 'out.jsonl'
+    write_input(source, ['开灯', '关灯', '开灯', '开窗'])
+    FakeIdentifier(window=2).run(str(source), str(output))
+    checkpoint = json.loads((tmp_path / 'out.jsonl.checkpoint').read_text())
+    assert checkpoint['records_done'] == 4
+
+    # 模拟第二个窗口写了一半就中断
+    first = output.read_bytes().splitlines(keepends=True)[:2]
+    output.write_bytes(b"".join(first) + b'{"line": 2, "te')
+    (tmp_path / 'out.jsonl.checkpoint').write_text(
+        json.dumps({'records_done': 2, 'output_bytes': len(b"".join(first))}))
+
+    resumed = FakeIdentifier(window=2)
+    resumed.run(str(source), str(output))
+    assert set(resumed.memo) == {'开灯', '关灯', '开窗'}
+    # 只有断点之后的新指令需要调用
+    assert len(resumed.prompts) == 1 and '开窗' in resumed.prompts[0]
+    assert [r['line'] for r in read_output(output)] == [0, 1, 2, 3]
+
+
+def test_failed_window_is_not_written(tmp_path):
+    source, output = tmp_path / 'in.jsonl', tmp_path / 'out.jsonl'
+    write_input(source, ['开灯'])
+    with pytest.raises(ConnectionError):
+        FakeIdentifier(fail=True).run(str(source), str(output))
+    assert output.read_text(encoding='utf-8') == ''
+    assert not (tmp_path / 'out.jsonl.checkpoint').exists()
+
+
+def test_refuses_to_overwrite_existing_output(tmp_path):
+    source, output = tmp_path / 'in.jsonl', tmp_path / 'out.jsonl'
+    write_input(source, ['开灯'])
+    output.write_text('old\n', encoding='utf-8')
+    with pytest.raises(FileExistsError):
+        FakeIdentifier().run(str(source), str(output))
+
+
+def test_mock_server_answers_batch_prompts():
+    from mock_llm_server import SyntheticResponder
+    response = SyntheticResponder()('qianfan', build_batch_prompt(['打开空调', '关灯', '开窗']))
+    assert sorted(parse_batch_answer(response, 3)) == [0, 1, 2]
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from clients import ClientRegistry
+
+
+class Client:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_client_is_created_once_and_reused():
+    registry = ClientRegistry()
+    created = []
+    registry.register('a', lambda: created.append(Client()) or created[-1])
+    first = registry.get('a')
+    assert registry.get('a') is first
+    assert len(created) == 1
+    assert registry.stats() == {'a': {'hits': 1, 'misses': 1}}
+
+
+def test_concurrent_first_use_creates_one_client():
+    registry = ClientRegistry()
+    created = []
+    start = threading.Barrier(8)
+
+    def factory():
+        created.append(1)
+        return Client()
+
+    registry.register('a', factory)
+
+    def worker():
+        start.wait()
+        registry.get('a')
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert registry.stats()['a'] == {'hits': 7, 'misses': 1}
+
+
+def test_unknown_backend_raises_key_error():
+    with pytest.raises(KeyError):
+        ClientRegistry().get('missing')
+
+
+def test_register_replaces_and_close_all_closes():
+    registry = ClientRegistry()
+    registry.register('a', Client)
+    old = registry.get('a')
+    registry.register('a', Client)
+    new = registry.get('a')
+    assert new is not old
+    registry.close_all()
+    assert new.closed
+    assert registry.get('a') is not new
@@ -0,0 +1,63 @@
+import pytest
+
+from device_classifier import (CATEGORIES, DEVICES, INTENT_KEYWORDS, DeviceClassifier,
+                               build_intent_keywords, parse_device_prompt)
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    return DeviceClassifier()
+
+
+def test_prompt_is_parsed():
+    devices, categories = parse_device_prompt()
+    assert devices == DEVICES
+    assert len(DEVICES) == 26
+    assert categories['温度调节'] == ['空调', '电风扇', '暖气', '电热毯', '浴霸']
+    assert categories == CATEGORIES
+
+
+def test_intent_targets_stay_inside_their_category():
+    for keyword, (category, targets) in INTENT_KEYWORDS.items():
+        assert targets, keyword
+        assert set(targets) <= set(CATEGORIES[category]), keyword
+    assert INTENT_KEYWORDS['太亮'][1] == ['灯光']
+    assert INTENT_KEYWORDS['睡觉'][1] == CATEGORIES['睡眠场景']
+
+
+def test_unknown_category_is_rejected():
+    with pytest.raises(ValueError):
+        build_intent_keywords({'开心': ('心情', None)})
+    with pytest.raises(ValueError):
+        build_intent_keywords({'太亮': ('睡眠场景', ('窗帘',))})
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("房间太热了", "空调 电风扇"),
+    ("屋里太闷了", "空调 电风扇"),
+    ("有点热", "空调 电风扇"),
+    ("好冷啊", "空调 暖气"),
+    ("太亮了", "灯光"),
+    ("打开热水器", "热水器"),
+    ("把冷气关了", "空调"),
+    ("想看电影", "电视 投影仪"),
+])
+def test_confident_commands_skip_the_llm(classifier, text, expected):
+    assert classifier.predict(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "它太热了", "再调高一点", "今天天气不错"])
+def test_uncertain_commands_go_to_the_llm(classifier, text):
+    assert classifier.predict(text) is None
+
+
+def test_single_character_intent_needs_a_whole_token(classifier):
+    # “热水”是一个词，不能因为包含“热”就识别成温度调节
+    result = classifier.classify("热水不够用")
+    assert '空调' not in result.devices
+
+
+def test_multiple_intents_are_not_confident(classifier):
+    result = classifier.classify("太热而且太干")
+    assert result.confidence < classifier.threshold
+    assert set(result.devices) == {'空调', '电风扇', '加湿器'}
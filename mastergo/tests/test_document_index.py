@@ -0,0 +1,39 @@
+from document_index import DocumentIndex
+
+
+HTML = """<!DOCTYPE html>
+<html><head><style>.a { color: red; }</style><script>var x = "<p>";</script></head>
+<body>
+  <!-- 注释 -->
+  <div class="card a">第一张&amp;卡片</div>
+  <p class="b">段落</p>
+  <div class="card">第二张</div>
+</body></html>"""
+
+
+def test_indexes_tags_and_classes_in_document_order():
+    index = DocumentIndex(HTML)
+    assert [t.get_text() for t in index.find_all('div')] == ['第一张&卡片', '第二张']
+    assert index.find('p').get_text() == '段落'
+    assert index.find('table') is None
+    assert [t.name for t in index.find_by_class(['b', 'card'])] == ['div', 'p', 'div']
+
+
+def test_text_nodes_skip_script_style_and_comments():
+    index = DocumentIndex(HTML)
+    assert [str(node) for node in index.text_nodes] == ['第一张&卡片', '段落', '第二张']
+
+
+def test_spans_point_into_original_source():
+    index = DocumentIndex(HTML)
+    div = index.find('div')
+    start, end = index.element_span(div)
+    assert HTML[start:end] == '<div class="card a">第一张&amp;卡片</div>'
+    start, end = index.text_span(index.text_nodes[0])
+    # 实体引用保持原样
+    assert HTML[start:end] == '第一张&amp;卡片'
+
+
+def test_strings_containing():
+    index = DocumentIndex(HTML)
+    assert [str(node) for node in index.strings_containing('第二')] == ['第二张']
@@ -0,0 +1,132 @@
+import json
+import os
+import time
+
+from document_store import DocumentStore
+
+V1 = "<html><body><p>第一版</p></body></html>"
+V2 = "<html><body><p>第二版</p></body></html>"
+V3 = "<html><body><p>第二版</p><p>追加</p></body></html>"
+
+
+def make_store(tmp_path, **kwargs):
+    kwargs.setdefault('flush_interval', 0)
+    kwargs.setdefault('fsync', False)
+    return DocumentStore(str(tmp_path / 'output.html'), **kwargs)
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_commit_undo_redo(tmp_path):
+    store = make_store(tmp_path)
+    v1 = store.commit(V1)
+    start = V1.index('第一版')
+    v2 = store.commit(V2, [(start, start + 3, '第二版')])
+    v3 = store.commit(V3)
+    assert (v1, v2, v3) == (1, 2, 3)
+    assert store.commit(V3) == v3
+    assert read(store.path) == V3
+
+    assert store.undo() == V2
+    assert store.undo() == V1
+    assert store.undo() is None
+    assert read(store.path) == V1
+    assert store.redo() == V2
+    assert store.redo() == V3
+    assert store.redo() is None
+    assert store.head == v3
+
+
+def test_commit_after_undo_starts_a_branch(tmp_path):
+    store = make_store(tmp_path)
+    store.commit(V1)
+    store.commit(V2)
+    store.undo()
+    v3 = store.commit(V3)
+    assert store.undo() == V1
+    # 重做进入最近产生的分支
+    assert store.redo() == V3
+    assert store.head == v3
+    assert store.checkout(2) == V2
+
+
+def test_history_survives_reopen_and_snapshots(tmp_path):
+    store = make_store(tmp_path, snapshot_every=2)
+    texts = [V1]
+    store.commit(V1)
+    for i in range(5):
+        texts.append(texts[-1].replace('</body>', f'<p>{i}</p></body>'))
+        store.commit(texts[-1])
+    store.undo()
+    store.close()
+
+    reopened = make_store(tmp_path, snapshot_every=2)
+    assert reopened.text == texts[-2]
+    for version, text in enumerate(texts, start=1):
+        assert reopened.checkout(version) == text
+    assert any(r['snapshot'] for r in reopened.history()[1:])
+    assert reopened.redo() == texts[-1]
+
+
+def test_at_returns_document_at_time(tmp_path):
+    store = make_store(tmp_path)
+    before = time.time() - 1
+    store.commit(V1)
+    middle = time.time()
+    time.sleep(0.01)
+    store.commit(V2)
+    assert store.at(before) is None
+    assert store.at(middle) == V1
+    assert store.at(time.time()) == V2
+
+
+def test_torn_journal_line_is_truncated(tmp_path):
+    store = make_store(tmp_path)
+    store.commit(V1)
+    store.commit(V2)
+    store.close()
+    with open(store.journal_path, 'rb') as f:
+        good = f.read()
+    # 模拟写日志时崩溃：最后一行只写了一半
+    with open(store.journal_path, 'ab') as f:
+        f.write(json.dumps({'v': 3, 'p': 2, 't': time.time(), 's': 1}).encode('utf-8')[:15])
+
+    reopened = make_store(tmp_path)
+    assert reopened.text == V2
+    assert reopened.head == 2
+    with open(store.journal_path, 'rb') as f:
+        assert f.read() == good
+    assert reopened.commit(V3) == 3
+    assert make_store(tmp_path).text == V3
+
+
+def test_external_edit_becomes_a_version(tmp_path):
+    store = make_store(tmp_path)
+    store.commit(V1)
+    time.sleep(0.01)
+    with open(store.path, 'w', encoding='utf-8') as f:
+        f.write(V3)
+    assert store.refresh()
+    assert store.text == V3
+    assert store.history()[-1]['source'] == 'external'
+    assert not store.refresh()
+    assert store.undo() == V1
+
+
+def test_output_written_before_crash_is_restored(tmp_path):
+    store = make_store(tmp_path)
+    store.commit(V1)
+    store.commit(V2)
+    store.close()
+    # 日志已经写入但输出文件还是旧内容
+    with open(store.path, 'w', encoding='utf-8') as f:
+        f.write(V1)
+    journal_time = os.stat(store.journal_path).st_mtime_ns + 1
+    os.utime(store.path, ns=(journal_time - 10**9, journal_time - 10**9))
+
+    reopened = make_store(tmp_path)
+    assert reopened.text == V2
+    assert read(store.path) == V2
@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+from document_store import open_store
+from generation import (GenerationEngine, GenerationJob, GenerationPipeline, build_prompt,
+                        extract_html_code, repair_styles, summarize_timings)
+from rate_limit import RateLimits
+
+PAGE = "<!DOCTYPE html><html><head><title>商城</title></head><body><h1>首页</h1></body></html>"
+
+
+def reply(html):
+    return lambda provider, prompt: f"好的，页面如下：\n```html\n{html}\n```\n"
+
+
+def test_extract_html_code():
+    assert extract_html_code("```html\n<p>a</p>\n```") == "<p>a</p>"
+    assert extract_html_code("```HTML\n<p>a</p>\n```") == "<p>a</p>"
+    with pytest.raises(ValueError):
+        extract_html_code("<p>没有代码块</p>")
+
+
+def test_build_prompt_uses_provider_template():
+    assert "请根据以下要求修改下面的HTML文件" in build_prompt('qianfan', "红色主题")
+    assert "将以下代码按照红色主题的要求修改" in build_prompt('spark', "红色主题")
+
+
+def test_repair_closes_truncated_style():
+    html = "<style>body { color: red; }\nh1 { font-family: Arial</style><h1>a</h1>"
+    assert repair_styles(html) == "<style>body { color: red; }\nh1 { font-family: Arial;\n}\n</style><h1>a</h1>"
+    complete = "<style>h1 { font-family: Arial }</style>"
+    assert repair_styles(complete) == complete
+
+
+def test_pipeline_runs_all_stages(tmp_path):
+    path = str(tmp_path / 'page.html')
+    pipeline = GenerationPipeline(chat=reply(PAGE.replace("</head>", "<style>h1 { color: red</style></head>")))
+    ctx = pipeline.run(GenerationJob("生成商城首页", 'doubao', output_path=path))
+    assert ctx.ok
+    assert [name for name, _ in pipeline.stages] == list(ctx.timings)
+    assert "h1 { color: red;\n}" in ctx.html
+    assert ctx.parts['h1'] == ["<h1>首页</h1>"]
+    assert ctx.output_path == path
+    store = open_store(path)
+    store.flush()
+    assert store.history()[-1]['source'] == 'doubao'
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == ctx.html
+
+
+def test_strict_provider_requires_basic_structure():
+    pipeline = GenerationPipeline(chat=reply("<h1>只有标题</h1>"))
+    pipeline.replace_stage('persist', lambda ctx: None)
+    with pytest.raises(ValueError):
+        pipeline.run(GenerationJob("生成", 'doubao'))
+    # 其他后端不要求完整结构
+    assert pipeline.run(GenerationJob("生成", 'spark')).html == "<h1>只有标题</h1>"
+
+
+def test_errors_are_recorded_when_not_raised():
+    pipeline = GenerationPipeline(chat=lambda provider, prompt: "没有代码块")
+    ctx = pipeline.run(GenerationJob("生成", 'spark'), raise_errors=False)
+    assert isinstance(ctx.error, ValueError)
+    assert 'validate' not in ctx.timings
+
+
+def test_replace_unknown_stage():
+    with pytest.raises(KeyError):
+        GenerationPipeline().replace_stage('upload', lambda ctx: None)
+
+
+def test_rate_limit_timeout_fails_the_job():
+    limits = RateLimits({'spark': 1})
+    limits.acquire('spark')
+    pipeline = GenerationPipeline(chat=reply(PAGE), rate_limits=limits, timeout=0.05)
+    ctx = pipeline.run(GenerationJob("生成", 'spark'), raise_errors=False)
+    assert isinstance(ctx.error, TimeoutError)
+
+
+def test_engine_runs_jobs_concurrently():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def chat(provider, prompt):
+        barrier.wait()
+        return reply(PAGE)(provider, prompt)
+
+    pipeline = GenerationPipeline(chat=chat)
+    pipeline.replace_stage('persist', lambda ctx: None)
+    engine = GenerationEngine(pipeline, max_workers=3)
+    try:
+        results = engine.run_many([GenerationJob(f"要求{i}", 'spark') for i in range(3)])
+    finally:
+        engine.shutdown()
+    assert all(ctx.ok for ctx in results)
+    summary = summarize_timings(results)
+    assert summary['provider']['count'] == 3
+    assert summary['provider']['max'] >= summary['provider']['mean']
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+from history import ConversationHistory, HistoryStore, estimate_tokens
+
+
+def user(content):
+    return {"role": "user", "content": content}
+
+
+def assistant(content):
+    return {"role": "assistant", "content": content}
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 4
+    assert estimate_tokens("打开空调") == 8
+    assert estimate_tokens("hello world") == 4 + 2 + 2
+
+
+def test_trims_to_low_water_and_keeps_user_first():
+    history = ConversationHistory(max_tokens=100, low_water=0.5)
+    for i in range(10):
+        history.append(user("问" * 10))
+        history.append(assistant("答" * 10))
+    assert history.total_tokens <= 100
+    assert history[0]['role'] == 'user'
+    assert history.trimmed > 0
+    assert history.total_tokens == sum(estimate_tokens(m['content']) for m in history)
+
+
+def test_latest_message_is_always_kept():
+    history = ConversationHistory(max_tokens=10)
+    history.append(user("很长的消息" * 20))
+    assert len(history) == 1
+
+
+def test_summarize_policy():
+    dropped = []
+
+    def summarizer(messages):
+        dropped.extend(messages)
+        return f"{len(messages)}条"
+
+    history = ConversationHistory(max_tokens=60, policy='summarize', summarizer=summarizer)
+    for i in range(6):
+        history.append(user(f"第{i}个问题" * 2))
+    assert dropped
+    assert history[0]['content'].startswith("此前对话摘要：")
+    assert history.total_tokens == sum(estimate_tokens(m['content']) for m in history)
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        ConversationHistory(policy='drop')
+
+
+def test_concurrent_appends_keep_counts_consistent():
+    history = ConversationHistory(max_tokens=500)
+    snapshots = []
+
+    def worker(n):
+        for i in range(200):
+            snapshots.append(history.append_and_list(user(f"线程{n}消息{i}")))
+            list(history)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert history.total_tokens == sum(estimate_tokens(m['content']) for m in history)
+    assert history.total_tokens <= 500
+    assert len(history) + history.trimmed == 8 * 200
+    assert all(snapshot for snapshot in snapshots)
+
+
+def test_append_and_list_includes_the_new_message():
+    history = ConversationHistory()
+    history.append(user("一"))
+    assert history.append_and_list(user("二")) == [user("一"), user("二")]
+
+
+def test_store_metrics():
+    store = HistoryStore(budgets={'spark': 50})
+    assert store.get('spark') is store.get('spark')
+    assert store.get('spark').max_tokens == 50
+    store.get('spark').append(user("你好"))
+    store.record_request('spark', 100)
+    store.record_request('spark', 300)
+    metrics = store.metrics()['spark']
+    assert metrics['requests'] == 2
+    assert metrics['bytes_mean'] == 200
+    assert metrics['bytes_max'] == 300
+    assert metrics['history_messages'] == 1
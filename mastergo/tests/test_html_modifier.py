@@ -0,0 +1,120 @@
+import pytest
+
+import html_modifier
+from html_modifier import HTMLModifier
+
+PAGE = "<html><head><title>商城</title></head><body><h1>智能<b>家居</b>商城</h1><p>其他内容</p></body></html>"
+
+
+@pytest.fixture
+def modifier(monkeypatch):
+    replies = []
+
+    def fake_run(coro):
+        coro.close()
+        return replies.pop(0)
+
+    monkeypatch.setattr(html_modifier, 'run_async', fake_run)
+    # 跳过本地替换，让指令进入精准修改
+    monkeypatch.setattr(html_modifier, 'is_literal_replacement', lambda *args: False)
+    modifier = HTMLModifier(output_path=None)
+    modifier.html = PAGE
+    modifier.html_parts = modifier._parse_html(PAGE)
+    modifier.replies = replies
+    return modifier
+
+
+def test_text_only_reply_replaces_text_node(modifier):
+    modifier.replies.append(["红色的智能"])
+    assert modifier.modify_html("将智能改为红色的智能") == "成功完成1处精准修改"
+    assert modifier.html == PAGE.replace("<h1>智能", "<h1>红色的智能")
+    assert modifier.html_parts['h1'] == ["<h1>红色的智能<b>家居</b>商城</h1>"]
+
+
+def test_text_only_reply_is_escaped(modifier):
+    modifier.replies.append(["A&B <新>"])
+    modifier.modify_html("将其他内容改为A&B <新>")
+    assert "<p>A&amp;B &lt;新&gt;</p>" in modifier.html
+
+
+def test_unchanged_reply_is_not_reported_as_success(modifier, monkeypatch):
+    modifier.replies.append(["其他内容"])
+    monkeypatch.setattr(modifier, '_modify_html_structure', lambda html, request: "未找到可修改的元素")
+    monkeypatch.setattr(modifier, '_chat_spark', lambda prompt: (_ for _ in ()).throw(ConnectionError("离线")))
+    result = modifier.modify_html("将其他内容改为其他内容")
+    assert "精准修改" not in result
+    assert modifier.html == PAGE
+
+
+def test_qianfan_cache_includes_history(modifier, monkeypatch):
+    import llm_cache
+    llm_cache.llm_cache.clear()
+    sent = []
+
+    class Response:
+        def json(self):
+            return {'result': f"回复{len(sent)}"}
+
+    monkeypatch.setattr(html_modifier, 'post_qianfan', lambda payload: sent.append(payload) or Response())
+    assert modifier._chat_qianfan("生成页面") == "回复1"
+    assert modifier._chat_qianfan("生成页面") == "回复2"
+    other = HTMLModifier(output_path=None)
+    # 另一个对象的历史为空，请求体与第一次相同
+    assert other._chat_qianfan("生成页面") == "回复1"
+    assert len(sent) == 2
+    llm_cache.llm_cache.clear()
+
+
+def test_quoted_replacement_runs_locally(monkeypatch):
+    def no_llm(coro):
+        coro.close()
+        raise AssertionError("纯文字替换不应调用大模型")
+
+    monkeypatch.setattr(html_modifier, 'run_async', no_llm)
+    modifier = HTMLModifier(output_path=None)
+    modifier.html = PAGE
+    modifier.html_parts = modifier._parse_html(PAGE)
+    assert modifier.modify_html('将"其他内容"改为"更多内容"') == "成功完成1处精准修改"
+    assert modifier.html == PAGE.replace("其他内容", "更多内容")
+    assert modifier.html_parts['paragraphs'] == ["<p>更多内容</p>"]
+
+
+def test_compound_command_goes_to_the_llm(monkeypatch):
+    calls = []
+
+    def fake_run(coro):
+        coro.close()
+        calls.append(1)
+        return ['<p style="color: red">更多内容</p>']
+
+    monkeypatch.setattr(html_modifier, 'run_async', fake_run)
+    modifier = HTMLModifier(output_path=None)
+    modifier.html = PAGE
+    modifier.html_parts = modifier._parse_html(PAGE)
+    modifier.modify_html('将"其他内容"改为"更多内容"，并把字体改成红色')
+    assert calls
+    assert '<p style="color: red">更多内容</p>' in modifier.html
+
+
+@pytest.mark.parametrize("provider, expected", [
+    ('qianfan', 'output.html'),
+    ('spark', 'output_spark.html'),
+    ('doubao', 'output_doubao.html'),
+    ('deepseek', 'output_deepseek.html'),
+])
+def test_default_modifier_keeps_per_provider_outputs(tmp_path, monkeypatch, provider, expected):
+    monkeypatch.chdir(tmp_path)
+    modifier = HTMLModifier()
+    modifier.generation.chat = lambda provider, prompt: f"```html\n<!DOCTYPE html><html><head></head><body>{provider}</body></html>\n```"
+    assert modifier._generation_path(provider) == expected
+    getattr(modifier, f"generate_html_{provider}")("生成页面")
+    html_modifier.open_store(expected).flush()
+    assert (tmp_path / expected).read_text(encoding='utf-8').endswith(f"<body>{provider}</body></html>")
+
+
+def test_custom_output_path_receives_generation(tmp_path):
+    path = str(tmp_path / 'custom.html')
+    modifier = HTMLModifier(output_path=path)
+    modifier.generation.chat = lambda provider, prompt: "```html\n<html><body><h1>首页</h1></body></html>\n```"
+    modifier.generate_html_spark("生成页面")
+    assert modifier._load_html() == "<html><body><h1>首页</h1></body></html>"
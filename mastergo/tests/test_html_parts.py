@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from html_parts import PART_KEYS, HtmlParts
+
+PAGE = """<html><head><title>旧标题</title><style>p { color: red; }</style></head>
+<body>
+<!-- 注释中的<p>段落</p> -->
+<nav class="navbar"><a href="/">首页</a><a href="/shop">商城</a></nav>
+<h1>大标题</h1>
+<div class="product"><h3>商品一</h3><p>介绍一</p><img src="1.png" alt="商品一"></div>
+<div class="product"><h3>商品二</h3><p>介绍二</p></div>
+<h2>小标题</h2><p>段落</p>
+<footer class="bottom">底部</footer>
+<script>var s = "<p>";</script>
+</body></html>"""
+
+TEXTS = ['旧标题', '首页', '大标题', '商品一', '介绍一', '商品二', '介绍二', '小标题', '段落', '底部']
+REPLACEMENTS = ['', '新', '<b>加粗</b>', '<h3>新标题</h3>', '<p>新段落</p>', '<a href="#">链接</a>']
+
+
+def splice(source, edits):
+    for start, end, text in sorted(edits, reverse=True):
+        source = source[:start] + text + source[end:]
+    return source
+
+
+def assert_same_as_rescan(parts, html):
+    fresh = HtmlParts.from_html(html)
+    for key in PART_KEYS:
+        assert parts[key] == fresh[key], key
+
+
+def test_random_edits_match_full_rescan():
+    rng = random.Random(0)
+    applied = 0
+    for _ in range(300):
+        edits = []
+        for text in rng.sample(TEXTS, rng.randint(1, 4)):
+            start = PAGE.index('>' + text) + 1
+            edits.append((start, start + len(text), rng.choice(REPLACEMENTS + [text + '!'])))
+        expected = splice(PAGE, edits)
+        parts = HtmlParts.from_html(PAGE)
+        # 先取一遍值，确认缓存随修改失效
+        for key in PART_KEYS:
+            parts[key]
+        if parts.apply_edits(edits, expected=expected):
+            applied += 1
+            assert parts.source == expected
+            assert_same_as_rescan(parts, expected)
+    assert applied > 100
+
+
+def test_consecutive_edits_match_full_rescan():
+    parts = HtmlParts.from_html(PAGE)
+    html = PAGE
+    for old, new in [('商品一', '<b>新品</b>'), ('大标题', '更大的标题'), ('旧标题', '新标题')]:
+        start = html.index('>' + old) + 1
+        edits = [(start, start + len(old), new)]
+        html = splice(html, edits)
+        assert parts.apply_edits(edits, expected=html)
+        assert_same_as_rescan(parts, html)
+
+
+@pytest.mark.parametrize("anchor", ['navbar', '段落</p> -->', 'color'])
+def test_edits_in_markup_comments_and_styles_are_rejected(anchor):
+    start = PAGE.index(anchor) + 1
+    assert not HtmlParts.from_html(PAGE).apply_edits([(start, start + 1, '<i>x</i>')])
+
+
+def test_unbalanced_fragment_is_rejected():
+    start = PAGE.index('介绍一')
+    assert not HtmlParts.from_html(PAGE).apply_edits([(start, start + 3, '<p>未闭合')])
+
+
+def test_overlapping_edits_are_rejected():
+    start = PAGE.index('介绍一')
+    assert not HtmlParts.from_html(PAGE).apply_edits([(start, start + 3, 'a'), (start + 1, start + 2, 'b')])
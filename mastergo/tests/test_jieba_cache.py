@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from jieba_cache import MmapFreq, build, load_tokenizer
+
+WORDS = ['空气净化器', '扫地机器人']
+
+
+@pytest.fixture(scope='module')
+def dict_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('jieba') / 'dict.bin'
+    build(str(path), WORDS)
+    return str(path)
+
+
+def test_mmap_table_lookups(dict_path):
+    table = MmapFreq(dict_path)
+    try:
+        assert table['空气净化器'] == 100000
+        assert '扫地机器人' in table
+        assert '不存在的词语' not in table
+        assert table.get('不存在的词语', 0) == 0
+        table['新词'] = 5
+        assert table['新词'] == 5
+        assert table.total > 0
+    finally:
+        table.close()
+
+
+def test_tokenizer_uses_prebuilt_dictionary(dict_path):
+    tokenizer = load_tokenizer(WORDS, path=dict_path)
+    assert isinstance(tokenizer.FREQ, MmapFreq)
+    assert '空气净化器' in tokenizer.lcut('打开空气净化器')
+    tokenizer.FREQ.close()
+
+
+def test_mismatched_or_broken_dictionary_is_rebuilt(tmp_path):
+    path = tmp_path / 'dict.bin'
+    path.write_bytes(b"not a dictionary")
+    tokenizer = load_tokenizer(WORDS, path=str(path))
+    assert isinstance(tokenizer.FREQ, MmapFreq)
+    tokenizer.FREQ.close()
+
+    # 词表变化时指纹不一致，重新构建
+    tokenizer = load_tokenizer(WORDS + ['智能门锁'], path=str(path))
+    assert '智能门锁' in tokenizer.FREQ
+    tokenizer.FREQ.close()
+
+
+def test_importing_modules_does_not_load_sdks_or_jieba():
+    code = ("import sys, main, clients, device_classifier; "
+            "print(sorted(m for m in ('jieba', 'requests', 'sparkai', 'volcenginesdkarkruntime') if m in sys.modules))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                         cwd=root).stdout
+    assert out.strip() == '[]'
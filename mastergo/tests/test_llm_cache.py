@@ -0,0 +1,106 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import llm_cache
+import main
+from llm_cache import LLMCache, cached_chat, make_key
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    llm_cache.llm_cache.clear()
+    yield
+    llm_cache.llm_cache.clear()
+
+
+def test_key_ignores_whitespace_but_not_temperature():
+    assert make_key('spark', 'lite', "打开  空调\n") == make_key('spark', 'lite', "打开 空调")
+    assert make_key('spark', 'lite', "打开空调", 0.5) != make_key('spark', 'lite', "打开空调", 0.7)
+    assert make_key('spark', 'lite', "打开空调") != make_key('qianfan', 'lite', "打开空调")
+
+
+def test_lru_and_ttl(monkeypatch):
+    cache = LLMCache(max_entries=2, ttl=10)
+    cache.set('a', "1")
+    cache.set('b', "2")
+    assert cache.get('a') == "1"
+    cache.set('c', "3")
+    assert cache.get('b') is None
+    assert cache.get('a') == "1"
+    now = time.time()
+    monkeypatch.setattr(llm_cache.time, 'time', lambda: now + 11)
+    assert cache.get('a') is None
+
+
+def test_disk_cache_survives_restart(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    LLMCache(path=path).set('k', "回复")
+    cache = LLMCache(path=path)
+    assert cache.get('k') == "回复"
+    assert cache.stats()['disk_hits'] == 1
+
+
+def test_cached_chat_sync_and_async():
+    cache = LLMCache()
+    calls = []
+
+    @cached_chat('spark', 'lite', cache=cache)
+    def chat(content):
+        calls.append(content)
+        return "" if content == "空" else content.upper()
+
+    @cached_chat('spark', 'lite', cache=cache)
+    async def achat(content):
+        calls.append(content)
+        return content.upper()
+
+    assert chat("abc") == "ABC"
+    assert chat("abc") == "ABC"
+    assert asyncio.run(achat("abc")) == "ABC"
+    # 空回复不缓存
+    chat("空")
+    chat("空")
+    assert calls == ["abc", "空", "空"]
+
+
+class FakeResponse:
+    def __init__(self, result):
+        self.result = result
+
+    def json(self):
+        return {'result': self.result}
+
+
+def test_qianfan_cache_is_keyed_on_history(monkeypatch):
+    sent = []
+
+    def post(payload):
+        sent.append(json.loads(payload)['messages'])
+        return FakeResponse(f"回复{len(sent)}")
+
+    monkeypatch.setattr(main, 'post_qianfan', post)
+    history = main.conversation_history_qianfan
+    history.clear()
+    try:
+        assert main.chat_qianfan("打开空调") == "回复1"
+        # 对话历史不同，请求体不同，不能命中上一次的回复
+        assert main.chat_qianfan("打开空调") == "回复2"
+        assert len(sent[1]) == 2
+        history.clear()
+        # 历史相同时完整请求体相同，直接命中
+        assert main.chat_qianfan("打开空调") == "回复1"
+        assert len(sent) == 2
+    finally:
+        history.clear()
+
+
+def test_ark_backends_are_cached_separately(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, '_complete_ark', lambda name, messages: calls.append(name) or f"{name}回复")
+    assert main.chat_doubao("做一个页面") == "doubao回复"
+    assert main.chat_doubao("做一个页面") == "doubao回复"
+    assert main.chat_deepseek("做一个页面") == "deepseek回复"
+    assert calls == ['doubao', 'deepseek']
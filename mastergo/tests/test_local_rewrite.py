@@ -0,0 +1,63 @@
+import pytest
+
+from document_index import DocumentIndex
+from local_rewrite import is_literal_replacement, plan_text_rewrites, rewrite_text_nodes, strip_quotes
+
+
+@pytest.mark.parametrize("command", [
+    '将"首页"改为"主页"',
+    "把'首页'改成'主页'",
+    '请将“首页”替换为“主页”。',
+    '将「首页」修改为「」',
+])
+def test_whole_quoted_command_is_literal(command):
+    assert is_literal_replacement(command, '首页', '主页')
+
+
+@pytest.mark.parametrize("command", [
+    '将首页改为主页',
+    '将导航改为竖排',
+    '将"首页"改为"主页"，并把字体改成红色加粗',
+    '将"首页"改为"主页"，把"关于"改为"简介"',
+    '在页脚将"首页"改为"主页"',
+])
+def test_unquoted_or_compound_command_is_not_literal(command):
+    assert not is_literal_replacement(command, '首页', '主页')
+
+
+def rewrite(html, target, new):
+    return rewrite_text_nodes(DocumentIndex(html), target, new)
+
+
+def test_replaces_only_visible_text():
+    html = ('<html><head><title>首页</title><style>.首页{}</style></head><body>'
+            '<a href="/首页" title="首页">首页</a><script>var s="首页";</script><!-- 首页 --></body></html>')
+    updated, count = rewrite(html, '首页', '主页')
+    assert count == 2
+    assert updated == html.replace('<title>首页', '<title>主页').replace('>首页</a>', '>主页</a>')
+
+
+def test_character_references_are_not_rewritten():
+    assert rewrite('<p>copy &copy; copy</p>', 'copy', 'X') == ('<p>X &copy; X</p>', 2)
+    assert rewrite('<p>amp &amp; amp</p>', 'amp', 'b') == ('<p>b &amp; b</p>', 2)
+    # 其他引用的写法保持不变
+    assert rewrite('<p>A&#38;B&nbsp;C</p>', 'C', 'D') == ('<p>A&#38;B&nbsp;D</p>', 1)
+
+
+def test_target_spanning_a_reference_is_replaced_whole():
+    assert rewrite('<p>A&amp;B, A&#38;B</p>', 'A&B', 'C') == ('<p>C, C</p>', 2)
+    assert rewrite('<p>a&nbsp;b</p>', 'a\xa0b', 'c') == ('<p>c</p>', 1)
+
+
+def test_new_text_is_escaped():
+    assert rewrite('<p>首页</p>', '首页', '<主页> & "更多"') == ('<p>&lt;主页&gt; &amp; &quot;更多&quot;</p>', 1)
+
+
+def test_missing_target_makes_no_edits():
+    index = DocumentIndex('<p>首页</p><img alt="主页">')
+    assert plan_text_rewrites(index, '主页', '首页') == ([], 0)
+
+
+def test_strip_quotes():
+    assert strip_quotes('“首页”') == '首页'
+    assert strip_quotes("'主页'") == '主页'
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+import requests
+
+from benchmark import Scenario, run_scenario
+from mock_llm_server import (ARK_CHAT_PATH, QIANFAN_CHAT_PATH, QIANFAN_TOKEN_PATH, Cassette, MockBehavior,
+                             MockLLMServer, request_key, synthetic_html)
+
+FAST = MockBehavior(latency=0.0, jitter=0.0, chars_per_second=0)
+
+
+@pytest.fixture
+def server():
+    with MockLLMServer(default=FAST, responder=lambda provider, prompt: f"{provider}:{prompt}", seed=1) as mock:
+        yield mock
+
+
+def chat(server, path, content, **extra):
+    body = dict(messages=[{"role": "user", "content": content}], **extra)
+    return requests.post(server.base_url + path, json=body, timeout=5)
+
+
+def test_synthetic_html_size_is_close_to_target():
+    html = synthetic_html(8000)
+    assert html.startswith("<!DOCTYPE html>") and html.endswith("</html>")
+    assert 8000 <= len(html) < 9000
+    assert synthetic_html(8000) == html
+
+
+def test_qianfan_and_ark_responses(server):
+    token = requests.post(server.base_url + QIANFAN_TOKEN_PATH, timeout=5).json()
+    assert token['access_token'] == 'mock-token'
+    assert chat(server, QIANFAN_CHAT_PATH, '你好').json()['result'] == 'qianfan:你好'
+    ark = chat(server, ARK_CHAT_PATH, '你好', model='m').json()
+    assert ark['choices'][0]['message']['content'] == 'ark:你好'
+    assert server.stats['qianfan']['requests'] == 1
+
+
+def test_streamed_ark_response(server):
+    server.default = MockBehavior(latency=0.0, jitter=0.0, chars_per_second=0, chunk_chars=2)
+    response = chat(server, ARK_CHAT_PATH, 'abcd', stream=True)
+    events = [line[6:] for line in response.iter_lines(decode_unicode=True) if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    text = "".join(json.loads(e)['choices'][0]['delta']['content'] for e in events[:-1])
+    assert text == 'ark:abcd'
+
+
+def test_simulated_errors(server):
+    failing = MockBehavior(latency=0.0, jitter=0.0, error_rate=1.0)
+    server.behaviors.update(qianfan=failing, ark=failing)
+    assert chat(server, QIANFAN_CHAT_PATH, 'x').json()['error_code'] == 18
+    assert chat(server, ARK_CHAT_PATH, 'x').status_code == 429
+
+
+def test_cassette_replays_recorded_chunks(tmp_path):
+    messages = [{"role": "user", "content": "录制过的"}]
+    path = tmp_path / 'cassette.json'
+    path.write_text(json.dumps({'version': 1, 'interactions': {
+        request_key('qianfan', messages, False): [{
+            'provider': 'qianfan', 'stream': False, 'status': 200, 'content_type': 'application/json',
+            'chunks': [[0.0, '{"result": '], [0.01, '"回放"}']]}],
+    }}), encoding='utf-8')
+    cassette = Cassette(str(path), speed=0, strict=True)
+    with MockLLMServer(default=FAST, cassette=cassette) as mock:
+        assert chat(mock, QIANFAN_CHAT_PATH, '录制过的').json() == {'result': '回放'}
+        assert chat(mock, QIANFAN_CHAT_PATH, '没录制').status_code == 404
+    assert mock.stats['qianfan'] == {'requests': 2, 'cassette_hits': 1, 'cassette_misses': 1}
+
+
+def test_run_scenario_records_latencies_and_errors():
+    def setup():
+        def op(i):
+            if i % 5 == 4:
+                raise RuntimeError('失败')
+        return op
+
+    result = run_scenario(Scenario('demo', setup), iterations=10, concurrency=2, memory_iterations=1)
+    summary = result.summary()
+    assert summary['count'] == 10
+    assert summary['errors'] == 2
+    assert summary['error_samples'][0] == 'RuntimeError: 失败'
+    assert summary['throughput'] > 0
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from patch import Patch, PatchConflict, apply_splices, merge_splices
+
+
+def apply_sequentially(source, splices):
+    """从后往前逐个替换，作为对照结果"""
+    for start, end, text in sorted(splices, reverse=True):
+        source = source[:start] + text + source[end:]
+    return source
+
+
+def test_apply_keeps_untouched_source():
+    source = "<p>一</p><p>二</p><p>三</p>"
+    splices = [(source.index("三"), source.index("三") + 1, "3"), (3, 4, "1")]
+    assert apply_splices(source, splices) == "<p>1</p><p>二</p><p>3</p>"
+
+
+def test_adjacent_splices_are_joined_in_order():
+    assert merge_splices([(2, 4, "b"), (0, 2, "a")]) == [(0, 4, "ab")]
+    # 同一位置的多个插入按添加顺序拼接，并排在该位置的替换之前
+    assert merge_splices([(1, 1, "x"), (1, 3, "r"), (1, 1, "y")]) == [(1, 3, "xyr")]
+
+
+def test_nested_splice_keeps_outer():
+    assert merge_splices([(2, 3, "inner"), (0, 5, "outer")]) == [(0, 5, "outer")]
+    # 范围相同时保留最后添加的
+    assert merge_splices([(0, 5, "first"), (0, 5, "second")]) == [(0, 5, "second")]
+
+
+@pytest.mark.parametrize("splices", [
+    [(0, 3, "a"), (2, 5, "b")],
+    [(2, 5, "b"), (0, 3, "a")],
+    [(1, 4, "a"), (3, 3, ""), (2, 6, "b")],
+])
+def test_partial_overlap_raises(splices):
+    with pytest.raises(PatchConflict):
+        merge_splices(splices)
+    with pytest.raises(ValueError):
+        apply_splices("0123456789", splices)
+
+
+def test_invalid_ranges_raise():
+    with pytest.raises(PatchConflict):
+        merge_splices([(3, 2, "x")])
+    with pytest.raises(PatchConflict):
+        apply_splices("abc", [(2, 4, "x")])
+
+
+def test_random_disjoint_splices_match_sequential_apply():
+    rng = random.Random(0)
+    for _ in range(300):
+        source = "".join(rng.choice("ab<>/") for _ in range(rng.randint(0, 40)))
+        cuts = sorted(rng.sample(range(len(source) + 1), min(len(source) + 1, rng.randint(0, 8))))
+        splices = []
+        for i in range(0, len(cuts) - 1, 2):
+            start = cuts[i]
+            end = rng.choice([start, cuts[i + 1]])
+            splices.append((start, end, rng.choice(["", "x", "yy", "<b>"])))
+        rng.shuffle(splices)
+        assert apply_splices(source, splices) == apply_sequentially(source, splices)
+
+
+def test_patch_collects_and_caches():
+    patch = Patch("hello world")
+    assert patch.apply() == "hello world"
+    patch.replace(0, 5, "hi")
+    patch.insert(11, "!")
+    patch.delete(5, 6)
+    assert len(patch) == 3
+    splices = patch.splices
+    assert patch.splices is splices
+    assert patch.apply() == "hiworld!"
+    patch.insert(0, ">")
+    assert patch.splices is not splices
+    assert patch.apply() == ">hiworld!"
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from rate_limit import RateLimiter, RateLimits
+
+
+def test_burst_is_available_immediately():
+    limiter = RateLimiter(rate=5, burst=3)
+    start = time.monotonic()
+    assert all(limiter.acquire(timeout=0) for _ in range(3))
+    assert time.monotonic() - start < 0.05
+    assert not limiter.acquire(timeout=0)
+
+
+def test_tokens_refill_at_rate():
+    limiter = RateLimiter(rate=50, burst=1)
+    assert limiter.acquire()
+    start = time.monotonic()
+    assert limiter.acquire(timeout=1)
+    elapsed = time.monotonic() - start
+    assert 0.01 <= elapsed < 0.2
+    assert limiter.waited > 0
+
+
+def test_timeout_shorter_than_refill_fails():
+    limiter = RateLimiter(rate=1, burst=1)
+    assert limiter.acquire()
+    assert not limiter.acquire(timeout=0.1)
+
+
+def test_shared_between_threads():
+    limiter = RateLimiter(rate=100, burst=2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(limiter.acquire(timeout=0)))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 2
+
+
+def test_invalid_rate():
+    with pytest.raises(ValueError):
+        RateLimiter(rate=0)
+
+
+def test_limits_by_name():
+    limits = RateLimits({'spark': 1})
+    assert limits.acquire('spark', timeout=0)
+    assert not limits.acquire('spark', timeout=0)
+    # 未配置的后端不限流
+    assert all(limits.acquire('doubao', timeout=0) for _ in range(10))
+    limits.set('doubao', 1, burst=2)
+    assert limits.acquire('doubao', timeout=0) and limits.acquire('doubao', timeout=0)
+    assert not limits.acquire('doubao', timeout=0)
@@ -0,0 +1,132 @@
+import json
+import socket
+import threading
+
+import pytest
+
+from recognition_server import RecognitionServer, serve_tcp
+
+
+class EchoRecognizer:
+    """把收到的字节数作为结果，便于检查数据是否按采样对齐"""
+
+    def __init__(self, rate, gate=None, fail_on_finish=False):
+        self.sizes = []
+        self.gate = gate
+        self.fail_on_finish = fail_on_finish
+
+    def AcceptWaveform(self, data):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.sizes.append(len(data))
+        return False
+
+    def PartialResult(self):
+        return json.dumps({'partial': ''})
+
+    def Result(self):
+        return self.FinalResult()
+
+    def FinalResult(self):
+        if self.fail_on_finish:
+            raise RuntimeError('boom')
+        return json.dumps({'text': ','.join(map(str, self.sizes))})
+
+
+def make_server(**kwargs):
+    recognizers = []
+    options = {key: kwargs.pop(key) for key in ('gate', 'fail_on_finish') if key in kwargs}
+
+    def factory(rate):
+        recognizer = EchoRecognizer(rate, **options)
+        recognizers.append(recognizer)
+        return recognizer
+
+    return RecognitionServer(recognizer_factory=factory, **kwargs), recognizers
+
+
+def test_streams_are_recognized_independently():
+    server, recognizers = make_server(workers=2)
+    finals = {}
+    ids = [server.open_stream(on_final=lambda text, i=i: finals.setdefault(i, text)) for i in range(3)]
+    for i, stream_id in enumerate(ids):
+        for _ in range(i + 1):
+            server.feed(stream_id, b"\0" * 10)
+    stats = [server.close_stream(stream_id, timeout=5) for stream_id in ids]
+    server.shutdown()
+    assert finals == {0: '10', 1: '10,10', 2: '10,10,10'}
+    assert [s['processed_chunks'] for s in stats] == [1, 2, 3]
+    with pytest.raises(KeyError):
+        server.feed(ids[0], b"\0\0")
+
+
+def test_duplicate_stream_id_is_rejected():
+    server, _ = make_server(workers=1)
+    server.open_stream(stream_id='a')
+    with pytest.raises(ValueError):
+        server.open_stream(stream_id='a')
+    server.close_stream('a', timeout=5)
+    server.shutdown()
+
+
+def test_finish_error_does_not_kill_worker(capsys):
+    server, _ = make_server(workers=1, fail_on_finish=True)
+    first = server.open_stream()
+    server.feed(first, b"\0\0")
+    server.close_stream(first, timeout=5)
+    assert '结束识别失败' in capsys.readouterr().out
+
+    # 同一个工作线程仍能处理后续的流
+    second = server.open_stream()
+    server.feed(second, b"\0\0")
+    stats = server.close_stream(second, timeout=5)
+    server.shutdown()
+    assert stats['processed_chunks'] == 1
+
+
+def test_feed_blocks_when_backlog_is_full():
+    gate = threading.Event()
+    server, recognizers = make_server(workers=1, max_pending=2, gate=gate)
+    stream_id = server.open_stream()
+    fed = []
+
+    def producer():
+        for _ in range(6):
+            server.feed(stream_id, b"\0\0")
+            fed.append(1)
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    thread.join(0.3)
+    # 工作线程卡在第一块上，队列里最多积压2块
+    assert thread.is_alive()
+    assert len(fed) <= 3
+    gate.set()
+    thread.join(5)
+    stats = server.close_stream(stream_id, timeout=5)
+    server.shutdown()
+    assert len(fed) == 6
+    assert stats['processed_chunks'] == 6
+
+
+def test_tcp_handler_keeps_samples_aligned():
+    recognition, recognizers = make_server(workers=1)
+    tcp = serve_tcp(recognition, port=0)
+    thread = threading.Thread(target=tcp.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with socket.create_connection(tcp.server_address, timeout=5) as conn:
+            for size in (3, 5, 7, 1):
+                conn.sendall(b"\1" * size)
+                # 等服务端分别收到每一块
+                threading.Event().wait(0.05)
+            conn.shutdown(socket.SHUT_WR)
+            lines = conn.makefile(encoding='utf-8').read().splitlines()
+    finally:
+        tcp.shutdown()
+        tcp.server_close()
+        recognition.shutdown()
+    results = [json.loads(line) for line in lines]
+    assert results[-1] == {'type': 'end', 'text': ''}
+    assert all(size % 2 == 0 for size in recognizers[0].sizes)
+    assert sum(recognizers[0].sizes) == 16
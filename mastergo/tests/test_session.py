@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from session import SessionManager
+
+
+def test_sessions_are_isolated():
+    manager = SessionManager()
+    with manager.session('a') as modifier:
+        modifier.html = '<p>a</p>'
+        modifier.conversation_history_spark.append({"role": "user", "content": "a"})
+    with manager.session('b') as modifier:
+        assert modifier.html != '<p>a</p>'
+        assert len(modifier.conversation_history_spark) == 0
+    assert manager.get_html('a') == '<p>a</p>'
+    assert manager.stats()['sessions'] == 2
+
+
+def test_evicted_session_is_restored_from_disk(tmp_path):
+    manager = SessionManager(max_sessions=1, spill_dir=str(tmp_path))
+    with manager.session('a') as modifier:
+        modifier.html = '<p>a</p>'
+        modifier.conversation_history_qianfan.append({"role": "user", "content": "改标题"})
+    with manager.session('b'):
+        pass
+    assert manager.stats()['evictions'] == 1
+    assert len(list(tmp_path.iterdir())) == 1
+
+    with manager.session('a') as modifier:
+        assert modifier.html == '<p>a</p>'
+        assert modifier.conversation_history_qianfan.to_list() == [{"role": "user", "content": "改标题"}]
+    assert manager.restores == 1
+
+
+def test_active_session_is_not_evicted():
+    manager = SessionManager(max_sessions=1)
+    with manager.session('a') as modifier:
+        modifier.html = '<p>a</p>'
+        with manager.session('b'):
+            # 两个会话都在使用，暂时超过上限
+            assert manager.stats() == {'sessions': 2, 'active': 2, 'evictions': 0, 'restores': 0}
+    assert manager.get_html('a') == '<p>a</p>'
+    assert manager.stats()['evictions'] == 1
+
+
+def test_same_session_calls_are_serialized():
+    manager = SessionManager()
+    inside = []
+    overlap = []
+
+    def work():
+        with manager.session('a'):
+            inside.append(1)
+            overlap.append(len(inside))
+            threading.Event().wait(0.01)
+            inside.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(overlap) == 1
+
+
+def test_close_removes_spilled_state(tmp_path):
+    manager = SessionManager(max_sessions=1, spill_dir=str(tmp_path))
+    with manager.session('a') as modifier:
+        modifier.html = '<p>a</p>'
+    with manager.session('b'):
+        pass
+    manager.close('a')
+    assert list(tmp_path.iterdir()) == []
+    assert manager.get_html('a') != '<p>a</p>'
@@ -0,0 +1,63 @@
+import html as html_lib
+
+from bs4 import BeautifulSoup, Comment, Doctype, NavigableString, Tag
+
+from source_locator import SourceLocator
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>家居 &amp; 生活</title></head>
+<body class="main">
+<!-- 导航 -->
+<nav><a href="/">首页</a><img src="a.png"><br/></nav>
+<p>第一段<b>加粗</b>&lt;结尾&gt;</p>
+<ul><li>未闭合<li>第二项</ul>
+</body></html>"""
+
+
+def test_element_offsets_match_soup():
+    locator = SourceLocator(PAGE)
+    soup = BeautifulSoup(PAGE, 'html.parser')
+    tags = list(soup.find_all(True))
+    assert len(tags) == len(locator.element_spans)
+    for tag in tags:
+        start = locator.source_offset(tag.sourceline, tag.sourcepos)
+        assert locator.element_names[start] == tag.name
+        s, e = locator.element_spans[start]
+        fragment = PAGE[s:e]
+        assert fragment.startswith(f"<{tag.name}")
+        if tag.name not in ('li', 'img', 'br'):
+            assert fragment.endswith(f"</{tag.name}>")
+        # 片段单独解析得到的文字与原元素一致
+        assert BeautifulSoup(fragment, 'html.parser').get_text() == tag.get_text()
+
+
+def test_string_offsets_match_soup():
+    locator = SourceLocator(PAGE)
+    soup = BeautifulSoup(PAGE, 'html.parser')
+    strings = [node for node in soup.descendants if isinstance(node, NavigableString)]
+    assert len(strings) == len(locator.string_spans)
+    for node, (s, e) in zip(strings, locator.string_spans):
+        fragment = PAGE[s:e]
+        if isinstance(node, Comment):
+            assert fragment == f"<!--{node}-->"
+        elif isinstance(node, Doctype):
+            assert fragment == f"<!DOCTYPE {node}>"
+        else:
+            assert html_lib.unescape(fragment) == str(node)
+
+
+def test_chunked_feed_matches_single_pass():
+    whole = SourceLocator(PAGE)
+    chunked = SourceLocator()
+    for i in range(0, len(PAGE), 7):
+        chunked.feed_chunk(PAGE[i:i + 7])
+    assert chunked.finish() == PAGE
+    assert chunked.element_spans == whole.element_spans
+    assert chunked.string_spans == whole.string_spans
+
+
+def test_unbalanced_count():
+    assert SourceLocator("<div><p>a</p></div>").unbalanced == 0
+    # 一个未闭合的li和一个多余的结束标签
+    assert SourceLocator("<ul><li>a</ul></span>").unbalanced == 2
+    assert SourceLocator("<div><p>a").unbalanced == 2
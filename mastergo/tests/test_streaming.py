@@ -0,0 +1,59 @@
+import pytest
+
+from streaming import FenceExtractor, StreamingGeneration
+
+
+def extract(chunks):
+    fence = FenceExtractor()
+    out = "".join(fence.feed(chunk) for chunk in chunks)
+    return out + fence.finish()
+
+
+def test_fence_split_across_chunks():
+    text = "说明文字\n```html\n  <p>你好</p>\n\n```\n后面的说明"
+    expected = "<p>你好</p>"
+    assert extract([text]) == expected
+    # 任意位置切分结果相同
+    for i in range(len(text)):
+        assert extract([text[:i], text[i:]]) == expected
+    assert extract(list(text)) == expected
+
+
+def test_unclosed_fence_and_inline_code():
+    assert extract(["```\n<div>", "内容</div>\n"]) == "<div>内容</div>"
+    assert extract(["```<p>", "x</p>\n<b>y</b>```"]) == "<p>x</p>\n<b>y</b>"
+
+
+def test_generation_replaces_output_only_on_success(tmp_path):
+    output = tmp_path / 'out.html'
+    output.write_text('old', encoding='utf-8')
+
+    generation = StreamingGeneration(str(output))
+    code = "".join(generation.run(["```html\n<html><body>", "<p>新</p></body></html>\n```"]))
+    assert code == "<html><body><p>新</p></body></html>"
+    assert output.read_text(encoding='utf-8') == code
+    assert generation.html == code
+    assert not (tmp_path / 'out.html.partial').exists()
+
+    with pytest.raises(ValueError):
+        list(StreamingGeneration(str(output)).run(["没有代码块"]))
+    assert output.read_text(encoding='utf-8') == code
+    assert not (tmp_path / 'out.html.partial').exists()
+
+
+def test_cancelled_generation_removes_partial_file(tmp_path):
+    output = tmp_path / 'out.html'
+    stream = StreamingGeneration(str(output)).run(["```html\n<p>", "a</p>", "<p>b</p>\n```"])
+    next(stream)
+    assert (tmp_path / 'out.html.partial').exists()
+    stream.close()
+    assert not (tmp_path / 'out.html.partial').exists()
+    assert not output.exists()
+
+
+def test_commit_receives_html_instead_of_rename(tmp_path):
+    committed = []
+    generation = StreamingGeneration(str(tmp_path / 'out.html'), commit=committed.append)
+    list(generation.run(["```html\n<p>x</p>\n```"]))
+    assert committed == ["<p>x</p>"]
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,32 @@
+from document_index import DocumentIndex
+from text_search import AhoCorasick, TextSearchIndex
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    automaton = AhoCorasick(['he', 'she', 'his', 'hers', ''])
+    assert list(automaton.iter_matches('ushers')) == [(4, 'she'), (4, 'he'), (6, 'hers')]
+    assert automaton.find_all('打开空调') == set()
+
+
+def test_aho_corasick_chinese_keywords():
+    automaton = AhoCorasick(['空调', '调温', '打开'])
+    assert automaton.find_all('打开空调温度') == {'打开', '空调', '调温'}
+    assert automaton.find_all('关闭空气') == set()
+
+
+def test_text_search_matches_both_directions_in_document_order():
+    index = TextSearchIndex()
+    index.sync(DocumentIndex('<p>欢迎</p><p>欢迎光临本店</p><p>联系我们</p><p>欢迎</p>'))
+    assert index.texts_containing('欢迎') == {'欢迎', '欢迎光临本店'}
+    assert index.texts_within('把联系我们改成联系方式') == {'联系我们'}
+    assert [str(node) for node in index.match('欢迎')] == ['欢迎', '欢迎光临本店', '欢迎']
+    assert index.texts_containing('不存在') == set()
+
+
+def test_sync_updates_only_changed_texts():
+    index = TextSearchIndex()
+    index.sync(DocumentIndex('<p>旧标题</p><p>正文</p>'))
+    index.sync(DocumentIndex('<p>新标题</p><p>正文</p>'))
+    assert index.texts_containing('标题') == {'新标题'}
+    assert '旧' not in index._postings
+    assert index.texts_containing('') == {'新标题', '正文'}
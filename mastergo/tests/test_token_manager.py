@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+import token_manager
+from token_manager import TokenManager, post_qianfan
+
+
+class Fetcher:
+    def __init__(self, expires_in=3600.0):
+        self.expires_in = expires_in
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f"token-{self.calls}", self.expires_in
+
+
+def test_token_is_cached_until_margin():
+    fetch = Fetcher()
+    tokens = TokenManager(fetch, refresh_margin=60)
+    assert tokens.get_token() == "token-1"
+    assert tokens.get_token() == "token-1"
+    assert fetch.calls == 1
+
+
+def test_expiring_token_is_refreshed_in_background():
+    fetch = Fetcher(expires_in=30)
+    tokens = TokenManager(fetch, refresh_margin=60)
+    assert tokens.get_token() == "token-1"
+    # 仍在有效期内，先返回旧令牌，后台换新
+    assert tokens.get_token() == "token-1"
+    deadline = time.time() + 2
+    while fetch.calls < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert fetch.calls == 2
+
+
+def test_concurrent_callers_fetch_once():
+    fetch = Fetcher()
+    tokens = TokenManager(lambda: (time.sleep(0.05), fetch())[1])
+    threads = [threading.Thread(target=tokens.get_token) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fetch.calls == 1
+
+
+def test_invalidate_only_drops_the_rejected_token():
+    fetch = Fetcher()
+    tokens = TokenManager(fetch)
+    tokens.get_token()
+    tokens.invalidate("token-1")
+    assert tokens.get_token() == "token-2"
+    # 其他线程已经换了新令牌，过期的拒绝不再作废它
+    tokens.invalidate("token-1")
+    assert tokens.get_token() == "token-2"
+
+
+class FakeResponse:
+    def __init__(self, status_code, data, content_type='application/json'):
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type}
+        self._data = data
+        self.closed = False
+
+    def json(self):
+        return self._data
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    def post(self, url, data=None, **kwargs):
+        self.urls.append(url)
+        return self.responses.pop(0)
+
+
+@pytest.mark.parametrize("rejected", [
+    FakeResponse(200, {'error_code': 111, 'error_msg': "Access token expired"}),
+    FakeResponse(401, None, content_type='text/html'),
+])
+def test_rejected_token_is_refreshed_and_retried(monkeypatch, rejected):
+    monkeypatch.setattr(token_manager, 'qianfan_tokens', TokenManager(Fetcher()))
+    client = FakeClient([rejected, FakeResponse(200, {'result': "好的"})])
+    monkeypatch.setattr(token_manager, 'get_client', lambda name: client)
+    response = post_qianfan("{}")
+    assert response.json() == {'result': "好的"}
+    assert [url.rsplit('=', 1)[1] for url in client.urls] == ["token-1", "token-2"]
+    assert rejected.closed
+
+
+def test_other_errors_are_not_retried(monkeypatch):
+    monkeypatch.setattr(token_manager, 'qianfan_tokens', TokenManager(Fetcher()))
+    client = FakeClient([FakeResponse(200, {'error_code': 18, 'error_msg': "qps limit"})])
+    monkeypatch.setattr(token_manager, 'get_client', lambda name: client)
+    assert post_qianfan("{}").json()['error_code'] == 18
+    assert len(client.urls) == 1
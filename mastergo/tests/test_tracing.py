@@ -0,0 +1,91 @@
+import asyncio
+import json
+import threading
+
+from tracing import NOOP_SPAN, JsonlExporter, Metrics, Tracer
+
+
+def test_disabled_tracer_returns_shared_noop_span():
+    tracer = Tracer(enabled=False)
+    with tracer.span('stage') as span:
+        span.set(provider='x')
+        assert not span
+    assert span is NOOP_SPAN
+    assert tracer.recent() == []
+    assert tracer.metrics.to_json() == {'counters': {}, 'histograms': {}}
+
+
+def test_nested_spans_and_metrics():
+    tracer = Tracer(enabled=True)
+    with tracer.span('modify', provider='spark') as outer:
+        with tracer.span('parse', size_bytes=10) as inner:
+            inner.event('fallback', tier='llm')
+    spans = tracer.recent()
+    assert [s['name'] for s in spans] == ['parse', 'modify']
+    assert spans[0]['parent_id'] == outer.span_id
+    assert spans[0]['trace_id'] == outer.trace_id
+    assert spans[0]['events'][0]['name'] == 'fallback'
+
+    metrics = tracer.metrics.to_json()
+    totals = {tuple(sorted(s['labels'].items())): s['value'] for s in metrics['counters']['stage_total']}
+    assert totals[(('provider', 'spark'), ('stage', 'modify'), ('status', 'ok'))] == 1
+    assert metrics['counters']['size_bytes_total'][0]['value'] == 10
+
+
+def test_errors_are_recorded_and_reraised():
+    tracer = Tracer(enabled=True)
+    try:
+        with tracer.span('fail'):
+            raise ValueError('坏了')
+    except ValueError:
+        pass
+    assert tracer.recent()[0]['error'] == 'ValueError: 坏了'
+
+
+def test_prometheus_histogram_buckets_are_cumulative():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe('latency', 0.05, stage='a')
+    metrics.observe('latency', 0.5, stage='a')
+    metrics.observe('latency', 5.0, stage='a')
+    text = metrics.to_prometheus(prefix='')
+    assert 'latency_bucket{stage="a",le="0.1"} 1' in text
+    assert 'latency_bucket{stage="a",le="1"} 2' in text
+    assert 'latency_bucket{stage="a",le="+Inf"} 3' in text
+    assert 'latency_count{stage="a"} 3' in text
+
+
+def test_wrap_and_bind_keep_parent_across_threads():
+    tracer = Tracer(enabled=True)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    async def child():
+        with tracer.span('async_child'):
+            pass
+
+    def worker():
+        with tracer.span('thread_child'):
+            pass
+
+    with tracer.span('parent') as parent:
+        other = threading.Thread(target=tracer.wrap(worker))
+        other.start()
+        other.join()
+        asyncio.run_coroutine_threadsafe(tracer.bind(child()), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+
+    children = {s['name']: s for s in tracer.recent() if s['name'] != 'parent'}
+    assert children['thread_child']['parent_id'] == parent.span_id
+    assert children['async_child']['parent_id'] == parent.span_id
+
+
+def test_jsonl_exporter(tmp_path):
+    path = tmp_path / 'spans.jsonl'
+    tracer = Tracer(enabled=True)
+    tracer.add_exporter(JsonlExporter(str(path)))
+    with tracer.span('stage', provider='qianfan'):
+        pass
+    line = json.loads(path.read_text(encoding='utf-8'))
+    assert line['name'] == 'stage'
+    assert line['attributes'] == {'provider': 'qianfan'}
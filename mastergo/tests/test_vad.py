@@ -0,0 +1,105 @@
+import json
+from array import array
+
+from vad import EnergyVAD, VADGate, frame_features
+from voice_engine import StreamRecognizer
+
+
+FRAME_SAMPLES = 480  # 16kHz下30毫秒
+
+
+def tone(frames=1, amplitude=3000):
+    # 每4个采样换一次符号，过零率约0.25
+    samples = [amplitude if (i // 4) % 2 == 0 else -amplitude for i in range(FRAME_SAMPLES * frames)]
+    return array('h', samples).tobytes()
+
+
+def silence(frames=1):
+    return bytes(FRAME_SAMPLES * 2 * frames)
+
+
+class MarkerVAD:
+    """非零帧视为语音"""
+
+    def is_speech(self, frame):
+        return any(frame)
+
+
+class FakeRecognizer:
+    """每收到一次音频记一个字，只有FinalResult才输出整句"""
+
+    def __init__(self):
+        self.text = []
+        self.accepted = []
+
+    def AcceptWaveform(self, data):
+        self.accepted.append(data)
+        self.text.append('字')
+        return False
+
+    def PartialResult(self):
+        return json.dumps({'partial': ' '.join(self.text)})
+
+    def Result(self):
+        return self.FinalResult()
+
+    def FinalResult(self):
+        text, self.text = ' '.join(self.text), []
+        return json.dumps({'text': text})
+
+
+def test_frame_features():
+    energy, zcr = frame_features(tone())
+    assert energy == 3000
+    assert 0.2 < zcr < 0.3
+    assert frame_features(b"") == (0.0, 0.0)
+
+
+def test_energy_vad_adapts_to_noise_floor():
+    vad = EnergyVAD()
+    assert not vad.is_speech(silence())
+    assert vad.is_speech(tone())
+    assert not vad.is_speech(tone(amplitude=100))
+
+
+def test_gate_keeps_pre_roll_and_hangover():
+    gate = VADGate(MarkerVAD(), pre_roll_ms=60, hangover_ms=60)
+    assert gate.process(silence(3)) == b""
+    out = gate.process(tone())
+    # 两帧预留静音加一帧语音
+    assert out == silence(2) + tone()
+    assert gate.active
+    assert gate.process(silence(3)) == silence(2)
+    assert not gate.active
+    assert gate.stats['passed_frames'] == 5
+    assert gate.stats['skipped_frames'] == 2
+
+
+def test_gate_buffers_partial_frames():
+    gate = VADGate(MarkerVAD(), pre_roll_ms=0, hangover_ms=0)
+    data = tone()
+    assert gate.process(data[:100]) == b""
+    assert gate.process(data[100:]) == data
+    assert gate.flush() == b""
+
+
+def test_final_result_is_emitted_when_speech_ends():
+    finals = []
+    recognizer = FakeRecognizer()
+    stream = StreamRecognizer(recognizer, on_final=finals.append,
+                              vad_gate=VADGate(MarkerVAD(), pre_roll_ms=0, hangover_ms=60))
+    stream.feed(tone())
+    stream.feed(tone())
+    assert finals == []
+    # 拖尾结束时立即输出，不等到下一句开始
+    stream.feed(silence(3))
+    assert finals == ['字字字']
+    stream.feed(silence(10))
+    assert finals == ['字字字']
+    assert stream.stats['skipped_chunks'] == 1
+
+    stream.feed(tone())
+    stream.feed(silence(3))
+    assert finals == ['字字字', '字字']
+    stream.finish()
+    assert finals == ['字字字', '字字']
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+import main
+from voice_device import SpeculativeDispatcher, normalize_utterance
+
+
+class Recorder:
+    def __init__(self, block=None):
+        self.identified = []
+        self.committed = []
+        self.block = block
+
+    def identify(self, text):
+        if self.block is not None:
+            self.block.wait(5)
+        self.identified.append(text)
+        return '设备:' + text
+
+    def commit(self, text, device):
+        self.committed.append((text, device))
+
+
+def test_hit_uses_speculative_result_and_commits_once():
+    recorder = Recorder()
+    dispatcher = SpeculativeDispatcher(recorder.identify, commit=recorder.commit, stable_count=2)
+    dispatcher.on_partial('打开空调')
+    dispatcher.on_partial('打开空调')
+    device = dispatcher.on_final('打开空调。').result(5)
+    dispatcher.shutdown()
+    assert device == '设备:打开空调'
+    assert recorder.identified == ['打开空调']
+    assert recorder.committed == [('打开空调', '设备:打开空调')]
+    assert dispatcher.counts['hits'] == 1
+
+
+def test_missed_speculation_is_never_committed():
+    recorder = Recorder()
+    dispatcher = SpeculativeDispatcher(recorder.identify, commit=recorder.commit, stable_count=2)
+    dispatcher.on_partial('打开空调')
+    dispatcher.on_partial('打开空调')
+    device = dispatcher.on_final('打开空气净化器').result(5)
+    dispatcher.shutdown()
+    assert device == '设备:打开空气净化器'
+    assert dispatcher.counts['misses'] == 1
+    # 提前识别可能已经执行，但只有被采用的结果会被记录
+    assert recorder.committed == [('打开空气净化器', '设备:打开空气净化器')]
+
+
+def test_cancelled_speculation_is_never_identified_or_committed():
+    block = threading.Event()
+    recorder = Recorder(block)
+    dispatcher = SpeculativeDispatcher(recorder.identify, commit=recorder.commit,
+                                       stable_count=1, max_workers=1)
+    # 唯一的线程被阻塞，排队的提前识别被更长的假设取消
+    dispatcher.on_partial('打开客厅')
+    dispatcher.on_partial('打开客厅的灯')
+    dispatcher.on_partial('打开客厅的灯光')
+    assert dispatcher.counts['cancelled'] >= 1
+    future = dispatcher.on_final('打开客厅的灯光')
+    block.set()
+    assert future.result(5) == '设备:打开客厅的灯光'
+    dispatcher.shutdown()
+    assert '打开客厅的灯' not in recorder.identified
+    assert recorder.committed == [('打开客厅的灯光', '设备:打开客厅的灯光')]
+
+
+def test_identify_error_is_not_committed():
+    committed = []
+
+    def fail(text):
+        raise RuntimeError('boom')
+
+    dispatcher = SpeculativeDispatcher(fail, commit=lambda *args: committed.append(args))
+    with pytest.raises(RuntimeError):
+        dispatcher.on_final('打开空调').result(5)
+    dispatcher.shutdown()
+    assert committed == []
+    assert dispatcher.counts['errors'] == 1
+
+
+def test_normalize_utterance():
+    assert normalize_utterance('打开 空调，好吗？') == '打开空调好吗'
+
+
+def test_predict_device_leaves_history_untouched(monkeypatch):
+    sent = []
+    monkeypatch.setattr(main, '_complete_qianfan', lambda payload: sent.append(payload) or '空调')
+    monkeypatch.setattr(main.classifier, 'predict', lambda text: None)
+    main.conversation_history_qianfan.clear()
+
+    assert main.predict_device('帮我处理一下') == '空调'
+    assert len(main.conversation_history_qianfan) == 0
+    assert len(sent) == 1
+
+    main.record_device('帮我处理一下', '空调')
+    assert len(main.conversation_history_qianfan) == 1
+    main.conversation_history_qianfan.clear()
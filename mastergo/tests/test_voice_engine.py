@@ -0,0 +1,90 @@
+import json
+import threading
+
+from voice_engine import PCMStreamSource, RingBuffer, StreamRecognizer, VoiceEngine, clean_text
+
+
+class SentenceRecognizer:
+    """收到全零的块时认为一句话结束，其余块各记一个字"""
+
+    def __init__(self):
+        self.text = []
+
+    def AcceptWaveform(self, data):
+        if not any(data):
+            return True
+        self.text.append('字')
+        return False
+
+    def PartialResult(self):
+        return json.dumps({'partial': ' '.join(self.text)})
+
+    def Result(self):
+        return self.FinalResult()
+
+    def FinalResult(self):
+        text, self.text = ' '.join(self.text), []
+        return json.dumps({'text': text})
+
+
+def test_clean_text():
+    assert clean_text('打 开 空 调') == '打开空调'
+
+
+def test_ring_buffer_wraps_and_drops_when_full():
+    buffer = RingBuffer(8)
+    assert buffer.write(b"abcdef") == 6
+    assert buffer.read(4) == b"abcd"
+    assert buffer.write(b"ghijklmn") == 6
+    assert buffer.dropped == 2
+    assert buffer.read(8) == b"efghijkl"
+    buffer.close()
+    assert buffer.read(4) == b""
+
+
+def test_ring_buffer_write_all_waits_for_reader():
+    buffer = RingBuffer(4)
+    data = bytes(range(64))
+    writer = threading.Thread(target=buffer.write_all, args=(data,))
+    writer.start()
+    received = b""
+    while len(received) < len(data):
+        received += buffer.read(2, timeout=5)
+    writer.join(5)
+    assert received == data
+    assert buffer.dropped == 0
+
+
+def test_ring_buffer_read_times_out():
+    assert RingBuffer(4).read(2, timeout=0.01) == b""
+
+
+def test_pcm_stream_source_rechunks():
+    source = PCMStreamSource([b"\1" * 3, b"\2" * 7])
+    assert source.read(2) == b"\1\1\1\2"
+    assert source.read(4) == b"\2" * 6
+    assert source.read(4) == b""
+
+
+def test_stream_recognizer_partials_and_finals():
+    finals, partials = [], []
+    stream = StreamRecognizer(SentenceRecognizer(), finals.append, partials.append)
+    stream.feed(b"\1\1")
+    stream.feed(b"\1\1")
+    stream.feed(b"\0\0")
+    stream.feed(b"\1\1")
+    stream.finish()
+    assert partials == ['字', '字字', '字']
+    assert finals == ['字字', '字']
+    assert stream.stats['processed_chunks'] == 4
+
+
+def test_voice_engine_recognizes_file_source_without_drops():
+    chunks = [b"\1" * 8000, b"\1" * 8000, b"\0" * 8000, b"\1" * 8000]
+    finals = []
+    engine = VoiceEngine(PCMStreamSource(chunks), recognizer=SentenceRecognizer(),
+                         on_final=finals.append, chunk_frames=4000, buffer_seconds=0.5)
+    engine.run()
+    assert finals == ['字字', '字']
+    assert engine.dropped_bytes == 0
+    assert engine.stats['captured_bytes'] == 32000
@@ -0,0 +1,123 @@
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class AhoCorasick:
+    """多模式串匹配自动机，一次扫描找出文本中出现的全部模式串"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        self._output[state].append(pattern)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def iter_matches(self, text: str) -> Iterable[Tuple[int, str]]:
+        """依次返回(结束位置, 模式串)"""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for pattern in self._output[state]:
+                yield i + 1, pattern
+
+    def find_all(self, text: str) -> Set[str]:
+        """文本中出现过的模式串集合"""
+        return {pattern for _, pattern in self.iter_matches(text)}
+
+
+class TextSearchIndex:
+    """文档文本节点的字符n-gram倒排索引，文档变化时只更新增删的文本"""
+
+    def __init__(self, n: int = 2):
+        self.n = n
+        # n-gram（以及单字）到包含它的文本集合
+        self._postings: Dict[str, Set[str]] = {}
+        # 文本内容到文档中出现该内容的节点列表
+        self._nodes: Dict[str, List] = {}
+        self._order: Dict[int, int] = {}
+        self._source = None
+
+    def _grams(self, text: str) -> Set[str]:
+        grams = set(text)
+        if len(text) >= self.n:
+            grams.update(text[i:i + self.n] for i in range(len(text) - self.n + 1))
+        return grams
+
+    def sync(self, document_index):
+        """与DocumentIndex同步，只为新增的文本建立倒排项，删除已消失的文本"""
+        if self._source is document_index:
+            return
+        nodes: Dict[str, List] = {}
+        for node in document_index.text_nodes:
+            nodes.setdefault(node.strip(), []).append(node)
+
+        for text in self._nodes.keys() - nodes.keys():
+            for gram in self._grams(text):
+                texts = self._postings.get(gram)
+                if texts is not None:
+                    texts.discard(text)
+                    if not texts:
+                        del self._postings[gram]
+        for text in nodes.keys() - self._nodes.keys():
+            for gram in self._grams(text):
+                self._postings.setdefault(gram, set()).add(text)
+
+        self._nodes = nodes
+        self._order = {id(node): i for i, node in enumerate(document_index.text_nodes)}
+        self._source = document_index
+
+    def texts_containing(self, query: str) -> Set[str]:
+        """包含query的文档文本"""
+        if not query:
+            return set(self._nodes)
+        grams = sorted(self._grams(query), key=lambda g: len(self._postings.get(g, ())))
+        candidates = set(self._postings.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not candidates:
+                break
+            candidates &= self._postings.get(gram, set())
+        return {text for text in candidates if query in text}
+
+    def texts_within(self, query: str) -> Set[str]:
+        """被query包含的文档文本，只枚举query的子串，与文档大小无关"""
+        found = set()
+        for i in range(len(query)):
+            for j in range(i + 1, len(query) + 1):
+                if query[i:j] in self._nodes:
+                    found.add(query[i:j])
+        return found
+
+    def match(self, query: str) -> List:
+        """与query互相包含的文本节点，按文档顺序排列"""
+        texts = self.texts_containing(query) | self.texts_within(query)
+        nodes = [node for text in texts for node in self._nodes[text]]
+        return sorted(nodes, key=lambda node: self._order[id(node)])
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from typing import Callable, Optional, Tuple
+from clients import QIANFAN_CHAT_URL, QIANFAN_TOKEN_URL, get_client
+from tracing import tracer
+
+
+class TokenManager:
+    """缓存访问令牌，按过期时间提前在后台刷新，同一时刻只允许一个刷新"""
+
+    def __init__(self, fetch: Callable[[], Tuple[str, float]], refresh_margin: float = 300.0):
+        """
+        Args:
+            fetch: 获取新令牌的函数，返回(令牌, 有效秒数)
+            refresh_margin: 距离过期多少秒时开始后台刷新
+        """
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self.refresh_count = 0
+
+    def get_token(self) -> str:
+        """返回可用令牌，仅在没有有效令牌时阻塞等待刷新"""
+        with tracer.span('token') as span:
+            token = self._get_token()
+            if span:
+                span.set(refresh_count=self.refresh_count)
+            return token
+
+    def _get_token(self) -> str:
+        now = time.time()
+        token = self._token
+        if token and now < self._expires_at - self.refresh_margin:
+            return token
+
+        if token and now < self._expires_at:
+            # 令牌即将过期但仍可用，后台刷新后直接返回旧令牌
+            self._refresh_in_background()
+            return token
+
+        with self._refresh_lock:
+            # 其他线程可能已经完成了刷新
+            if self._token and time.time() < self._expires_at:
+                return self._token
+            self._refresh()
+            return self._token
+
+    def invalidate(self, token: Optional[str] = None):
+        """令牌被服务端拒绝时调用，下次获取会重新请求
+
+        Args:
+            token: 被拒绝的令牌，其他线程已经换成新令牌时不再作废
+        """
+        if token is None or token == self._token:
+            self._expires_at = 0.0
+
+    def _refresh(self):
+        token, expires_in = self._fetch()
+        self._token = token
+        self._expires_at = time.time() + float(expires_in)
+        self.refresh_count += 1
+
+    def _refresh_in_background(self):
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+
+        def worker():
+            try:
+                self._refresh()
+            except Exception as e:
+                print(f"后台刷新令牌失败: {str(e)}")
+            finally:
+                self._refresh_lock.release()
+
+        threading.Thread(target=worker, daemon=True).start()
+
+
+def _fetch_qianfan_token() -> Tuple[str, float]:
+    """请求百度千帆API的访问令牌"""
+    params = {
+        "client_id": os.environ.get("QIANFAN_API_KEY"),
+        "client_secret": os.environ.get("QIANFAN_SECRET_KEY"),
+        "grant_type": "client_credentials"
+    }
+    data = get_client('qianfan').post(QIANFAN_TOKEN_URL, params=params).json()
+    # 千帆令牌默认有效期为30天
+    return data['access_token'], data.get('expires_in', 2592000)
+
+
+qianfan_tokens = TokenManager(_fetch_qianfan_token)
+
+
+# 千帆接口返回这些错误码时说明访问令牌无效或已过期
+QIANFAN_TOKEN_ERROR_CODES = {110, 111}
+
+
+def qianfan_token_rejected(response) -> bool:
+    """千帆接口是否因为访问令牌无效或过期拒绝了请求，不会读取流式回复的内容"""
+    if response.status_code == 401:
+        return True
+    if not response.headers.get('Content-Type', '').startswith('application/json'):
+        return False
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get('error_code') in QIANFAN_TOKEN_ERROR_CODES
+
+
+def post_qianfan(payload: str, **kwargs):
+    """带访问令牌请求千帆对话接口，令牌被拒绝时作废缓存的令牌并换新令牌重试一次"""
+    token = qianfan_tokens.get_token()
+    response = get_client('qianfan').post(f"{QIANFAN_CHAT_URL}?access_token={token}", data=payload, **kwargs)
+    if qianfan_token_rejected(response):
+        response.close()
+        qianfan_tokens.invalidate(token)
+        token = qianfan_tokens.get_token()
+        response = get_client('qianfan').post(f"{QIANFAN_CHAT_URL}?access_token={token}", data=payload, **kwargs)
+    return response
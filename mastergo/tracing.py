@@ -0,0 +1,315 @@
+import bisect
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+
+# 直方图的默认分桶（秒），覆盖本地解析到大模型调用的耗时范围
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 作为指标标签的span属性，其余属性只记录在span中
+LABEL_ATTRS = ('provider', 'tier', 'source', 'cache')
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """按(名称, 标签)聚合的计数器和直方图，可导出为Prometheus文本格式或JSON"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_json(self) -> dict:
+        with self._lock:
+            return {
+                'counters': {
+                    name: [{'labels': dict(labels), 'value': value} for labels, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                'histograms': {
+                    name: [{'labels': dict(labels), 'count': h.count, 'sum': h.sum,
+                            'buckets': dict(zip([str(b) for b in h.buckets] + ['+Inf'],
+                                                itertools.accumulate(h.counts)))}
+                           for labels, h in series.items()]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self, prefix: str = 'mastergo_') -> str:
+        """Prometheus文本格式，直方图的桶为累计计数"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for labels, value in series.items():
+                    lines.append(f"{prefix}{name}{_format_labels(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for labels, h in series.items():
+                    bounds = [f"{b:g}" for b in h.buckets] + ['+Inf']
+                    for bound, total in zip(bounds, itertools.accumulate(h.counts)):
+                        lines.append(f"{prefix}{name}_bucket{_format_labels(labels + (('le', bound),))} {total}")
+                    lines.append(f"{prefix}{name}_sum{_format_labels(labels)} {h.sum:g}")
+                    lines.append(f"{prefix}{name}_count{_format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace("\n", "\\n")
+
+
+_current: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+_ids = itertools.count(1)
+
+
+class Span:
+    """一个处理阶段的耗时和属性，嵌套的span通过parent_id关联"""
+
+    __slots__ = ('tracer', 'name', 'attributes', 'events', 'span_id', 'parent_id', 'trace_id',
+                 'start', 'end', 'error', '_token')
+
+    def __init__(self, tracer: 'Tracer', name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.events: List[Tuple[float, str, Dict[str, Any]]] = []
+        self.span_id = next(_ids)
+        parent = _current.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self.start = 0.0
+        self.end = 0.0
+        self.error: Optional[str] = None
+        self._token = None
+
+    def __bool__(self) -> bool:
+        return True
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def event(self, name: str, **attributes):
+        """记录阶段内的事件，如降级到下一种修改方式"""
+        self.events.append((time.perf_counter() - self.start, name, attributes))
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def __enter__(self) -> 'Span':
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'duration_ms': self.duration * 1000,
+            'attributes': self.attributes,
+            'events': [{'offset_ms': offset * 1000, 'name': name, 'attributes': attrs}
+                       for offset, name, attrs in self.events],
+            'error': self.error,
+        }
+
+
+class _NoopSpan:
+    """关闭追踪时使用的空span，所有操作都不做任何事；布尔值为False，调用方可据此跳过属性计算"""
+
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def event(self, name: str, **attributes):
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """阶段追踪：记录每个阶段的span，并汇总为耗时直方图和计数器
+
+    关闭时span()直接返回共享的空span，开销只有一次属性判断。
+
+    Args:
+        enabled: 是否记录
+        max_spans: 内存中保留的最近span数
+    """
+
+    def __init__(self, enabled: bool = False, max_spans: int = 1000, metrics: Optional[Metrics] = None):
+        self.enabled = enabled
+        self.metrics = metrics or Metrics()
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+        self._exporters: List[Callable[[Span], None]] = []
+
+    def span(self, name: str, **attributes):
+        """创建一个span，配合with使用"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def current(self):
+        """当前正在执行的span，没有时返回空span"""
+        span = _current.get() if self.enabled else None
+        return span if span is not None else NOOP_SPAN
+
+    def traced(self, name: Optional[str] = None) -> Callable:
+        """用span包裹函数的装饰器"""
+        def decorator(fn: Callable) -> Callable:
+            span_name = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with Span(self, span_name, {}):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def bind(self, coro: Awaitable[Any]) -> Awaitable[Any]:
+        """让在其他线程的事件循环中执行的协程仍然挂在当前span之下"""
+        parent = _current.get() if self.enabled else None
+        if parent is None:
+            return coro
+
+        async def run():
+            token = _current.set(parent)
+            try:
+                return await coro
+            finally:
+                _current.reset(token)
+        return run()
+
+    def wrap(self, fn: Callable) -> Callable:
+        """让提交到线程池的函数仍然挂在当前span之下"""
+        if not self.enabled or _current.get() is None:
+            return fn
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+    def add_exporter(self, exporter: Callable[[Span], None]):
+        """每个span结束时调用exporter(span)"""
+        self._exporters.append(exporter)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def _finish(self, span: Span):
+        labels = {k: span.attributes.get(k) for k in LABEL_ATTRS}
+        self.metrics.observe('stage_duration_seconds', span.duration, stage=span.name, **labels)
+        self.metrics.inc('stage_total', stage=span.name, status='error' if span.error else 'ok', **labels)
+        for key, value in span.attributes.items():
+            if key.endswith('_bytes') and isinstance(value, int):
+                self.metrics.inc(f"{key}_total", value, stage=span.name, provider=labels['provider'])
+        self.spans.append(span)
+        for exporter in self._exporters:
+            try:
+                exporter(span)
+            except Exception as e:
+                print(f"导出span失败: {str(e)}")
+
+    def recent(self, limit: Optional[int] = None) -> List[dict]:
+        """最近结束的span，按结束顺序排列"""
+        spans = list(self.spans)
+        return [span.to_dict() for span in (spans[-limit:] if limit else spans)]
+
+
+class JsonlExporter:
+    """把结束的span逐行追加写入JSONL文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+def text_bytes(text: Optional[str]) -> int:
+    return len(text.encode('utf-8')) if text else 0
+
+
+# 设置环境变量 MASTERGO_TRACE=1 开启追踪，MASTERGO_TRACE_FILE 指定span的输出文件
+tracer = Tracer(enabled=os.environ.get("MASTERGO_TRACE", "") not in ("", "0", "false"))
+if os.environ.get("MASTERGO_TRACE_FILE"):
+    tracer.add_exporter(JsonlExporter(os.environ["MASTERGO_TRACE_FILE"]))
@@ -0,0 +1,117 @@
+import math
+from array import array
+from collections import deque
+from typing import Deque, List, Optional
+
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+
+def frame_features(frame: bytes):
+    """返回一帧16位PCM的(均方根能量, 过零率)"""
+    samples = array('h', frame)
+    if not samples:
+        return 0.0, 0.0
+    energy = math.sqrt(sum(s * s for s in samples) / len(samples))
+    crossings = sum(1 for a, b in zip(samples, samples[1:]) if (a >= 0) != (b >= 0))
+    return energy, crossings / len(samples)
+
+
+class EnergyVAD:
+    """基于能量和过零率的语音帧判断，噪声基底随静音帧自适应更新
+
+    Args:
+        min_energy: 能量阈值下限
+        ratio: 能量高于噪声基底多少倍视为语音
+        max_zcr: 过零率上限，超过时视为噪声
+        adapt: 噪声基底的更新系数
+    """
+
+    def __init__(self, min_energy: float = 300.0, ratio: float = 3.0, max_zcr: float = 0.35,
+                 adapt: float = 0.05):
+        self.min_energy = min_energy
+        self.ratio = ratio
+        self.max_zcr = max_zcr
+        self.adapt = adapt
+        self.noise_floor: Optional[float] = None
+
+    def is_speech(self, frame: bytes) -> bool:
+        energy, zcr = frame_features(frame)
+        if self.noise_floor is None:
+            self.noise_floor = energy
+        speech = energy > max(self.min_energy, self.noise_floor * self.ratio) and zcr <= self.max_zcr
+        if not speech:
+            self.noise_floor += (energy - self.noise_floor) * self.adapt
+        return speech
+
+
+class WebRTCVAD:
+    """使用webrtcvad的语音帧判断，帧长必须为10/20/30毫秒"""
+
+    def __init__(self, aggressiveness: int = 2, sample_rate: int = SAMPLE_RATE):
+        import webrtcvad
+        self._vad = webrtcvad.Vad(aggressiveness)
+        self.sample_rate = sample_rate
+
+    def is_speech(self, frame: bytes) -> bool:
+        return self._vad.is_speech(frame, self.sample_rate)
+
+
+class VADGate:
+    """在识别之前过滤静音，只把语音及其前后的少量音频送入识别器
+
+    Args:
+        vad: 提供is_speech(frame)的判断器
+        frame_ms: 判断的帧长
+        pre_roll_ms: 语音开始前保留的音频，避免截掉开头
+        hangover_ms: 语音结束后继续送入的音频，识别器需要尾部静音来判断一句话结束
+    """
+
+    def __init__(self, vad=None, sample_rate: int = SAMPLE_RATE, frame_ms: int = 30,
+                 pre_roll_ms: int = 300, hangover_ms: int = 600):
+        self.vad = vad or EnergyVAD()
+        self.frame_bytes = sample_rate * frame_ms // 1000 * SAMPLE_WIDTH
+        self._pre_roll: Deque[bytes] = deque(maxlen=max(0, pre_roll_ms // frame_ms))
+        self.hangover_frames = max(0, hangover_ms // frame_ms)
+        self._remaining = 0
+        self._pending = b""
+        self.stats = {'frames': 0, 'speech_frames': 0, 'passed_frames': 0, 'skipped_frames': 0}
+
+    @property
+    def active(self) -> bool:
+        """当前是否处于语音段（包括拖尾）"""
+        return self._remaining > 0
+
+    def process(self, chunk: bytes) -> bytes:
+        """输入一段音频，返回应送入识别器的部分（可能为空）"""
+        data = self._pending + chunk
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        out: List[bytes] = []
+
+        for start in range(0, usable, self.frame_bytes):
+            frame = data[start:start + self.frame_bytes]
+            self.stats['frames'] += 1
+            if self.vad.is_speech(frame):
+                self.stats['speech_frames'] += 1
+                if not self.active and self._pre_roll:
+                    out.extend(self._pre_roll)
+                    self.stats['passed_frames'] += len(self._pre_roll)
+                    self.stats['skipped_frames'] -= len(self._pre_roll)
+                    self._pre_roll.clear()
+                self._remaining = self.hangover_frames + 1
+            if self.active:
+                self._remaining -= 1
+                out.append(frame)
+                self.stats['passed_frames'] += 1
+            else:
+                self._pre_roll.append(frame)
+                self.stats['skipped_frames'] += 1
+
+        return b"".join(out)
+
+    def flush(self) -> bytes:
+        """输入结束时返回语音段中尚未成帧的剩余音频"""
+        data, self._pending = self._pending, b""
+        return data if self.active else b""
@@ -0,0 +1,187 @@
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from voice_engine import AudioSource, VoiceEngine
+
+
+_PUNCT_RE = re.compile(r'[\s，。！？、,.!?]')
+
+
+def normalize_utterance(text: str) -> str:
+    return _PUNCT_RE.sub('', text)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class SpeculativeDispatcher:
+    """根据语音识别的中间结果提前识别设备，最终结果到达时确认或重新识别
+
+    连续stable_count个中间结果（识别器每处理一块音频回调一次）的公共前缀视为稳定假设，稳定假设变长时提前提交识别；
+    最终结果与最近的稳定假设一致时直接使用提前得到的结果，否则取消提前识别并重新识别。
+
+    提前识别可能被取消或不被采用，且在多个线程中同时进行，因此identify不能修改对话历史等共享状态，
+    只有被采用的结果才通过commit记录。
+
+    Args:
+        identify: 文本 -> 设备，不修改共享状态，例如main.predict_device
+        on_device: 得到设备时调用 (最终文本, 设备)
+        commit: 采用识别结果时调用 (识别所用的文本, 设备)，例如main.record_device
+        stable_count: 判断稳定所需的连续中间结果数
+        min_chars: 稳定假设至少包含的字数
+    """
+
+    def __init__(self, identify: Callable[[str], str],
+                 on_device: Optional[Callable[[str, str], None]] = None,
+                 stable_count: int = 2, min_chars: int = 4, max_workers: int = 4,
+                 commit: Optional[Callable[[str, str], None]] = None):
+        self.identify = identify
+        self.on_device = on_device
+        self.commit = commit
+        self.stable_count = max(1, stable_count)
+        self.min_chars = min_chars
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='device')
+        self._lock = threading.Lock()
+        self._partials: List[str] = []
+        self._speculation: Optional[Tuple[str, Future]] = None
+        # 从最终结果到达到得出设备的耗时（秒）
+        self.latencies: List[float] = []
+        self.counts = {'speculated': 0, 'hits': 0, 'misses': 0, 'cancelled': 0, 'errors': 0}
+
+    def on_partial(self, text: str):
+        text = normalize_utterance(text)
+        with self._lock:
+            self._partials = (self._partials + [text])[-self.stable_count:]
+            if len(self._partials) < self.stable_count:
+                return
+            stable = self._partials[0]
+            for partial in self._partials[1:]:
+                n = 0
+                while n < min(len(stable), len(partial)) and stable[n] == partial[n]:
+                    n += 1
+                stable = stable[:n]
+            if len(stable) < self.min_chars:
+                return
+            if self._speculation is not None:
+                if self._speculation[0] == stable:
+                    return
+                self._cancel(self._speculation[1])
+            self._speculation = (stable, self._executor.submit(self.identify, stable))
+            self.counts['speculated'] += 1
+
+    def _cancel(self, future: Future):
+        if future.cancel():
+            self.counts['cancelled'] += 1
+
+    def on_final(self, text: str) -> Future:
+        """最终结果到达，返回得出设备的Future"""
+        received = time.perf_counter()
+        key = normalize_utterance(text)
+        with self._lock:
+            speculation, self._speculation = self._speculation, None
+            self._partials = []
+            if speculation is not None and speculation[0] == key:
+                identified, future = speculation
+                self.counts['hits'] += 1
+            else:
+                if speculation is not None:
+                    self._cancel(speculation[1])
+                    self.counts['misses'] += 1
+                identified = text
+                future = self._executor.submit(self.identify, text)
+
+        result: Future = Future()
+
+        def deliver(done: Future):
+            try:
+                device = done.result()
+                if self.commit:
+                    self.commit(identified, device)
+            except Exception as e:
+                self.counts['errors'] += 1
+                result.set_exception(e)
+                return
+            self.latencies.append(time.perf_counter() - received)
+            result.set_result(device)
+            if self.on_device:
+                self.on_device(text, device)
+
+        future.add_done_callback(deliver)
+        return result
+
+    def latency_summary(self) -> dict:
+        """最终结果到设备决策的延迟分布（毫秒）"""
+        return {
+            'count': len(self.latencies),
+            'p50_ms': percentile(self.latencies, 50) * 1000,
+            'p95_ms': percentile(self.latencies, 95) * 1000,
+            'max_ms': max(self.latencies, default=0.0) * 1000,
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+class VoiceDevicePipeline:
+    """语音输入 → 实时识别 → 设备识别的完整流程"""
+
+    def __init__(self, source: AudioSource, identify: Optional[Callable[[str], str]] = None,
+                 on_device: Optional[Callable[[str, str], None]] = None, recognizer=None,
+                 speculative: bool = True, vad_gate=None,
+                 commit: Optional[Callable[[str, str], None]] = None):
+        """
+        Args:
+            identify: 不修改共享状态的设备识别，默认为main.predict_device
+            commit: 采用识别结果时调用，不指定identify时默认为main.record_device
+        """
+        if identify is None:
+            from main import predict_device, record_device
+            identify, commit = predict_device, commit or record_device
+        self.dispatcher = SpeculativeDispatcher(identify, on_device, commit=commit)
+        self.engine = VoiceEngine(
+            source,
+            recognizer=recognizer,
+            on_final=self.dispatcher.on_final,
+            on_partial=self.dispatcher.on_partial if speculative else None,
+            repeat_partials=True,
+            vad_gate=vad_gate,
+        )
+
+    def start(self):
+        self.engine.start()
+
+    def stop(self):
+        self.engine.stop()
+
+    def run(self):
+        """阻塞运行直到音频输入结束，并等待所有设备识别完成"""
+        self.engine.run()
+        self.dispatcher.shutdown()
+
+
+# 麦克风示例
+if __name__ == "__main__":
+    from main import history
+    from vad import VADGate
+    from voice_engine import MicrophoneSource
+
+    def show(text: str, device: str):
+        print(f"{text} -> 需要操作的设备: {device}")
+        history.add(text, device)
+
+    pipeline = VoiceDevicePipeline(MicrophoneSource(), on_device=show, vad_gate=VADGate())
+    print("开始语音控制，按Ctrl+C退出")
+    pipeline.start()
+    try:
+        while True:
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pipeline.stop()
+        pipeline.engine.join()
+        print(pipeline.dispatcher.latency_summary())
@@ -0,0 +1,362 @@
+import json
+import threading
+import time
+import wave
+from typing import Callable, Iterable, Iterator, Optional
+
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16位单声道PCM
+CHUNK_FRAMES = 4000
+MODEL_PATH = 'vosk-model-small-cn-0.22'
+
+
+def clean_text(text: str) -> str:
+    """Vosk中文结果按字之间有空格，去掉空格"""
+    return text.replace(' ', '')
+
+
+class RingBuffer:
+    """单生产者单消费者的字节环形缓冲区
+
+    写入方只修改写指针，读取方只修改读指针，两者之间不加锁。
+    实时输入在缓冲区满时丢弃新数据并计数，而不是阻塞采集线程；文件输入可以用write_all等待空间。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buffer = bytearray(capacity)
+        # 单调递增的读写位置，实际下标为对容量取模
+        self._write_pos = 0
+        self._read_pos = 0
+        self._readable = threading.Event()
+        self._writable = threading.Event()
+        self.dropped = 0
+        self.closed = False
+
+    def available(self) -> int:
+        return self._write_pos - self._read_pos
+
+    def write(self, data: bytes) -> int:
+        """写入数据，返回实际写入的字节数"""
+        free = self.capacity - self.available()
+        if len(data) > free:
+            self.dropped += len(data) - free
+            data = data[:free]
+        if data:
+            start = self._write_pos % self.capacity
+            first = min(len(data), self.capacity - start)
+            self._buffer[start:start + first] = data[:first]
+            self._buffer[:len(data) - first] = data[first:]
+            self._write_pos += len(data)
+            self._readable.set()
+        return len(data)
+
+    def write_all(self, data: bytes):
+        """写入全部数据，空间不足时等待读取方"""
+        view = memoryview(data)
+        while view:
+            free = self.capacity - self.available()
+            if free == 0:
+                self._writable.clear()
+                if self.capacity - self.available() == 0 and not self.closed:
+                    self._writable.wait()
+                if self.closed:
+                    return
+                continue
+            written = self.write(bytes(view[:free]))
+            view = view[written:]
+
+    def read(self, size: int, timeout: Optional[float] = None) -> bytes:
+        """读取size字节，数据不足时等待；缓冲区关闭后返回剩余数据"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self.available() < size and not self.closed:
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                return b""
+            self._readable.clear()
+            # 清除标志后再检查一次，避免错过写入方刚设置的信号
+            if self.available() >= size or self.closed:
+                break
+            self._readable.wait(remaining)
+
+        size = min(size, self.available())
+        start = self._read_pos % self.capacity
+        first = min(size, self.capacity - start)
+        data = bytes(self._buffer[start:start + first]) + bytes(self._buffer[:size - first])
+        self._read_pos += size
+        self._writable.set()
+        return data
+
+    def close(self):
+        self.closed = True
+        self._readable.set()
+        self._writable.set()
+
+
+class AudioSource:
+    """音频输入，read返回16位单声道PCM，输入结束时返回空字节"""
+
+    sample_rate = SAMPLE_RATE
+    # 实时输入不能等待，缓冲区满时丢弃数据；非实时输入等待识别线程读取
+    live = False
+
+    def read(self, frames: int) -> bytes:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MicrophoneSource(AudioSource):
+    """麦克风输入"""
+
+    live = True
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, frames_per_buffer: int = CHUNK_FRAMES):
+        import pyaudio
+        self.sample_rate = sample_rate
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(
+            format=pyaudio.paInt16,  # 16位深度音频设置
+            channels=1,  # 声道,单声道
+            rate=sample_rate,  # 采样率
+            input=True,  # 从麦克风获取数据
+            frames_per_buffer=frames_per_buffer  # 每次读取数据块大小
+        )
+
+    def read(self, frames: int) -> bytes:
+        # 采集线程只负责搬运数据，溢出时丢弃而不是抛出异常
+        return self._stream.read(frames, exception_on_overflow=False)
+
+    def close(self):
+        self._stream.stop_stream()
+        self._stream.close()
+        self._audio.terminate()
+
+
+class PCMStreamSource(AudioSource):
+    """从PCM数据块迭代器读取，可按实时速度输出以模拟麦克风"""
+
+    def __init__(self, chunks: Iterable[bytes], sample_rate: int = SAMPLE_RATE, realtime: bool = False):
+        self.sample_rate = sample_rate
+        self.realtime = realtime
+        self.live = realtime
+        self._chunks: Iterator[bytes] = iter(chunks)
+        self._pending = b""
+        self._started: Optional[float] = None
+        self._emitted = 0
+
+    def read(self, frames: int) -> bytes:
+        size = frames * SAMPLE_WIDTH
+        while len(self._pending) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._pending += chunk
+        data, self._pending = self._pending[:size], self._pending[size:]
+        if self.realtime and data:
+            if self._started is None:
+                self._started = time.monotonic()
+            self._emitted += len(data) // SAMPLE_WIDTH
+            delay = self._started + self._emitted / self.sample_rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return data
+
+
+class PCMFileSource(PCMStreamSource):
+    """读取裸PCM文件（16位单声道）"""
+
+    def __init__(self, path: str, sample_rate: int = SAMPLE_RATE, realtime: bool = False):
+        self._file = open(path, 'rb')
+        super().__init__(iter(lambda: self._file.read(65536), b""), sample_rate, realtime)
+
+    def close(self):
+        self._file.close()
+
+
+class WavFileSource(PCMStreamSource):
+    """读取WAV文件，要求16位单声道"""
+
+    def __init__(self, path: str, realtime: bool = False):
+        self._wav = wave.open(path, 'rb')
+        if self._wav.getsampwidth() != SAMPLE_WIDTH or self._wav.getnchannels() != 1:
+            self._wav.close()
+            raise ValueError("只支持16位单声道WAV文件")
+        super().__init__(iter(lambda: self._wav.readframes(32768), b""), self._wav.getframerate(), realtime)
+
+    def close(self):
+        self._wav.close()
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def load_model(path: str = MODEL_PATH):
+    """加载Vosk模型，同一路径只加载一次"""
+    with _models_lock:
+        if path not in _models:
+            from vosk import Model
+            _models[path] = Model(path)
+        return _models[path]
+
+
+def create_recognizer(sample_rate: int = SAMPLE_RATE, model_path: str = MODEL_PATH):
+    from vosk import KaldiRecognizer
+    return KaldiRecognizer(load_model(model_path), sample_rate)
+
+
+class StreamRecognizer:
+    """一路音频流的识别状态：静音过滤、识别器和结果回调
+
+    Args:
+        recognizer: KaldiRecognizer或接口相同的对象
+        on_final: 一句话识别完成时调用
+        on_partial: 中间结果变化时调用
+        repeat_partials: 为True时每识别一块都回调中间结果，即使没有变化，便于判断结果是否稳定
+        vad_gate: 识别前的静音过滤（vad.VADGate），为None时所有音频都送入识别器
+    """
+
+    def __init__(self, recognizer, on_final: Optional[Callable[[str], None]] = None,
+                 on_partial: Optional[Callable[[str], None]] = None,
+                 repeat_partials: bool = False, vad_gate=None):
+        self.recognizer = recognizer
+        self.on_final = on_final
+        self.on_partial = on_partial
+        self.repeat_partials = repeat_partials
+        self.vad_gate = vad_gate
+        self._last_partial = ""
+        self.stats = {'processed_chunks': 0, 'skipped_chunks': 0, 'finals': 0,
+                      'partials': 0, 'recognize_seconds': 0.0}
+
+    def feed(self, data: bytes):
+        """输入一段音频，静音被过滤时不调用识别器"""
+        if self.vad_gate is None:
+            self.accept(data)
+            return
+        data = self.vad_gate.process(data)
+        if not data:
+            self.stats['skipped_chunks'] += 1
+            return
+        self.accept(data)
+        if not self.vad_gate.active:
+            # 语音段结束后识别器收不到后续的静音，不会自己判断一句话结束，需要立即取出最终结果
+            self._emit_final(json.loads(self.recognizer.FinalResult()).get('text', ''))
+
+    def finish(self):
+        """音频结束，输出最后一句的结果"""
+        if self.vad_gate is not None:
+            tail = self.vad_gate.flush()
+            if tail:
+                self.accept(tail)
+        self._emit_final(json.loads(self.recognizer.FinalResult()).get('text', ''))
+
+    def accept(self, data: bytes):
+        """识别一段音频并触发回调"""
+        start = time.perf_counter()
+        final = self.recognizer.AcceptWaveform(data)
+        self.stats['recognize_seconds'] += time.perf_counter() - start
+        self.stats['processed_chunks'] += 1
+        if final:
+            self._emit_final(json.loads(self.recognizer.Result()).get('text', ''))
+        else:
+            partial = clean_text(json.loads(self.recognizer.PartialResult()).get('partial', ''))
+            if partial and (partial != self._last_partial or self.repeat_partials):
+                self._last_partial = partial
+                self.stats['partials'] += 1
+                if self.on_partial:
+                    self.on_partial(partial)
+
+    def _emit_final(self, text: str):
+        self._last_partial = ""
+        text = clean_text(text)
+        if not text:
+            return
+        self.stats['finals'] += 1
+        if self.on_final:
+            self.on_final(text)
+
+
+class VoiceEngine:
+    """实时语音识别：采集线程把音频写入环形缓冲区，识别线程从中读取并识别
+
+    识别慢时音频在缓冲区中排队，而不会让麦克风输入溢出。
+
+    Args:
+        source: 音频输入
+        recognizer: KaldiRecognizer或接口相同的对象，默认按source的采样率创建
+        on_final: 一句话识别完成时调用
+        on_partial: 中间结果变化时调用
+        repeat_partials: 为True时每识别一块都回调中间结果，即使没有变化，便于判断结果是否稳定
+        vad_gate: 识别前的静音过滤（vad.VADGate），为None时所有音频都送入识别器
+        chunk_frames: 每次读取和识别的帧数
+        buffer_seconds: 缓冲区能容纳的音频时长
+    """
+
+    def __init__(self, source: AudioSource, recognizer=None,
+                 on_final: Optional[Callable[[str], None]] = None,
+                 on_partial: Optional[Callable[[str], None]] = None,
+                 chunk_frames: int = CHUNK_FRAMES, buffer_seconds: float = 10.0,
+                 repeat_partials: bool = False, vad_gate=None):
+        self.source = source
+        self.recognizer = recognizer if recognizer is not None else create_recognizer(source.sample_rate)
+        self.vad_gate = vad_gate
+        self.stream = StreamRecognizer(self.recognizer, on_final, on_partial, repeat_partials, vad_gate)
+        self.chunk_frames = chunk_frames
+        # 缓冲区至少能放下两个识别块，否则读取方等待的数据量可能永远凑不齐
+        self.buffer = RingBuffer(max(int(buffer_seconds * source.sample_rate), 2 * chunk_frames) * SAMPLE_WIDTH)
+        self._stop = threading.Event()
+        self._threads = []
+        self.stats = self.stream.stats
+        self.stats['captured_bytes'] = 0
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._capture, name='voice-capture', daemon=True),
+            threading.Thread(target=self._recognize, name='voice-recognize', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """停止采集，已经缓冲的音频仍会识别完"""
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run(self):
+        """阻塞运行直到音频输入结束"""
+        self.start()
+        self.join()
+
+    def _capture(self):
+        try:
+            while not self._stop.is_set():
+                data = self.source.read(self.chunk_frames)
+                if not data:
+                    break
+                self.stats['captured_bytes'] += len(data)
+                if self.source.live:
+                    self.buffer.write(data)
+                else:
+                    self.buffer.write_all(data)
+        finally:
+            self.buffer.close()
+            self.source.close()
+
+    def _recognize(self):
+        chunk_bytes = self.chunk_frames * SAMPLE_WIDTH
+        while True:
+            data = self.buffer.read(chunk_bytes)
+            if not data:
+                break
+            self.stream.feed(data)
+        self.stream.finish()
+
+    @property
+    def dropped_bytes(self) -> int:
+        return self.buffer.dropped